@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:30:03 krylon>
+#
+# /data/code/python/silo/agent.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.agent
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import logging
+import os
+import re
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Event
+from typing import Final, Optional
+
+from silo import common, protocol
+from silo.client import DEFAULT_TIMEOUT, DEFAULT_WINDOW, Client
+from silo.data import Record
+from silo.extractor.base import BaseExtractor
+from silo.extractor.checkpoint import CheckpointStore
+from silo.extractor.journald import JournaldExtractor
+from silo.extractor.logfile import LogfileExtractor
+from silo.protocol import Codec, ProtocolError
+
+# A batch is sent once it holds this many records, ...
+DEFAULT_MAX_RECORDS: Final[int] = 5000
+# ... or this many bytes of sources and messages, ...
+DEFAULT_MAX_BYTES: Final[int] = 2**20
+# ... or its oldest record has waited this many seconds.
+DEFAULT_MAX_AGE: Final[float] = 5.0
+
+# Number of seconds between looking for new records.
+DEFAULT_INTERVAL: Final[float] = 1.0
+
+# Number of seconds to wait before trying to reach the server again after
+# a failure. The delay doubles with every failure, up to MAX_RETRY.
+DEFAULT_RETRY: Final[float] = 1.0
+MAX_RETRY: Final[float] = 60.0
+
+# How many bytes of batches the spool may hold before the oldest are dropped.
+DEFAULT_SPOOL_LIMIT: Final[int] = 256 * 2**20
+
+spool_head: Final[struct.Struct] = struct.Struct(">BI")
+
+# The names the Spool gives its files, anything else in the folder is left alone.
+spool_pat: Final[re.Pattern] = re.compile(r"^(\d+)\.batch$")
+
+# Spooled files that cannot be read are renamed to this suffix, so they can be inspected.
+SPOOL_BAD: Final[str] = ".bad"
+
+
+@dataclass(slots=True, kw_only=True)
+class Packet:
+    """Packet is a batch of records, compressed and ready to be sent.
+
+    name is the file the Packet is kept in by the Spool, if any.
+    """
+
+    codec: Codec
+    blob: bytes
+    count: int
+    name: str = ""
+
+
+class Batcher:
+    """Batcher collects records until there are enough of them, or they have waited long enough."""
+
+    __slots__ = [
+        "max_records",
+        "max_bytes",
+        "max_age",
+        "records",
+        "size",
+        "since",
+    ]
+
+    max_records: int
+    max_bytes: int
+    max_age: float
+    records: list[Record]
+    size: int
+    since: float
+
+    def __init__(self,
+                 max_records: int = DEFAULT_MAX_RECORDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE) -> None:
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.records = []
+        self.size = 0
+        self.since = 0.0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, r: Record) -> None:
+        """Add a record."""
+        if not self.records:
+            self.since = time.monotonic()
+        self.records.append(r)
+        self.size += len(r.source) + len(r.message)
+
+    def full(self) -> bool:
+        """Return True if the batch is as large as it may get."""
+        return len(self.records) >= self.max_records or self.size >= self.max_bytes
+
+    def due(self) -> bool:
+        """Return True if the batch should be sent."""
+        return self.full() or \
+            (len(self.records) > 0 and time.monotonic() - self.since >= self.max_age)
+
+    def take(self) -> list[Record]:
+        """Return the records collected so far and start over."""
+        records = self.records
+        self.records = []
+        self.size = 0
+        return records
+
+
+class Spool:
+    """Spool keeps Packets on disk while the server cannot be reached.
+
+    Each Packet is written to a file of its own, so a Packet can be removed
+    once the server has acknowledged it. Files are written under a temporary
+    name and renamed, so a crash never leaves half a Packet behind.
+    If the spool grows beyond limit bytes, the oldest Packets are dropped.
+    Files that cannot be read are renamed with the suffix SPOOL_BAD and
+    skipped, and files the Spool did not write are ignored.
+    """
+
+    __slots__ = [
+        "log",
+        "folder",
+        "limit",
+        "names",
+        "sizes",
+        "size",
+        "serial",
+        "dropped",
+    ]
+
+    log: logging.Logger
+    folder: str
+    limit: int
+    names: deque[str]
+    sizes: dict[str, int]
+    size: int
+    serial: int
+    dropped: int
+
+    def __init__(self, folder: str = "", limit: int = DEFAULT_SPOOL_LIMIT) -> None:
+        if folder == "":
+            folder = common.path.spool()
+        os.makedirs(folder, exist_ok=True)
+        self.log = common.get_logger("spool")
+        self.folder = folder
+        self.limit = limit
+        self.names = deque()
+        self.sizes = {}
+        self.size = 0
+        self.serial = 0
+        self.dropped = 0
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".tmp"):
+                os.unlink(os.path.join(folder, name))
+            elif (m := spool_pat.match(name)) is not None:
+                self.names.append(name)
+                self.sizes[name] = os.path.getsize(os.path.join(folder, name))
+                self.size += self.sizes[name]
+                self.serial = max(self.serial, int(m[1]) + 1)
+            elif not name.endswith(SPOOL_BAD):
+                self.log.warning("Ignoring stray file %s in spool %s", name, folder)
+        if self.names:
+            self.log.info("Found %d spooled batches in %s", len(self.names), folder)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def push(self, pkt: Packet) -> None:
+        """Write a Packet to disk."""
+        size: int = spool_head.size + len(pkt.blob)
+        while self.names and self.size + size > self.limit:
+            name = self.names[0]
+            self.log.warning("Spool is full, dropping %s", name)
+            self.remove(name)
+            self.dropped += 1
+        pkt.name = f"{self.serial:016d}.batch"
+        self.serial += 1
+        path: str = os.path.join(self.folder, pkt.name)
+        with open(f"{path}.tmp", "wb") as fh:
+            fh.write(spool_head.pack(pkt.codec, pkt.count))
+            fh.write(pkt.blob)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(f"{path}.tmp", path)
+        self.names.append(pkt.name)
+        self.sizes[pkt.name] = size
+        self.size += size
+
+    def load(self, name: str) -> Optional[Packet]:
+        """Read a Packet from disk.
+
+        If the file is damaged, it is moved out of the way and None is returned.
+        """
+        path: str = os.path.join(self.folder, name)
+        try:
+            with open(path, "rb") as fh:
+                codec, count = spool_head.unpack(fh.read(spool_head.size))
+                return Packet(codec=Codec(codec), blob=fh.read(), count=count, name=name)
+        except (struct.error, ValueError) as err:
+            self.log.warning("Spooled batch %s is damaged, moving it aside: %s", name, err)
+        self.names.remove(name)
+        self.size -= self.sizes.pop(name)
+        try:
+            os.replace(path, path + SPOOL_BAD)
+        except OSError as err:
+            self.log.error("Cannot move damaged batch %s aside: %s", name, err)
+        return None
+
+    def remove(self, name: str) -> None:
+        """Remove a Packet, e.g. because the server has acknowledged it."""
+        if name not in self.sizes:
+            return
+        self.names.remove(name)
+        self.size -= self.sizes.pop(name)
+        try:
+            os.unlink(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            pass
+
+
+@dataclass(slots=True, kw_only=True)
+class AgentStats:
+    """AgentStats counts what an Agent has done."""
+
+    records: int = 0
+    batches: int = 0
+    raw_bytes: int = 0
+    sent_bytes: int = 0
+    spooled: int = 0
+    failures: int = 0
+
+
+class Agent:
+    """Agent collects records from the local extractors and ships them to the server.
+
+    Records are collected into batches, which are sent when they are large
+    enough or old enough, compressed with codec. While the server cannot be
+    reached, batches go to the Spool. Once the server is back, the spool is
+    drained, oldest batch first, with up to window batches in flight.
+
+    Batches are only removed from the spool when the server has acknowledged
+    them. A batch that is on its way when the connection breaks is spooled,
+    so it is sent again. Records that have been read from the extractors,
+    but not batched, yet, are lost if the agent crashes.
+
+    A server that does not answer within timeout seconds is treated like
+    one that cannot be reached.
+    """
+
+    __slots__ = [
+        "log",
+        "addr",
+        "name",
+        "extractors",
+        "begin",
+        "codec",
+        "window",
+        "timeout",
+        "batcher",
+        "spool",
+        "client",
+        "inflight",
+        "retry",
+        "next_try",
+        "stats",
+    ]
+
+    log: logging.Logger
+    addr: tuple[str, int]
+    name: str
+    extractors: list[BaseExtractor]
+    begin: datetime
+    codec: Codec
+    window: int
+    timeout: float
+    batcher: Batcher
+    spool: Spool
+    client: Optional[Client]
+    inflight: deque[Packet]
+    retry: float
+    next_try: float
+    stats: AgentStats
+
+    def __init__(self,
+                 host: str,
+                 port: int = common.DEFAULT_PORT,
+                 extractors: Optional[list[BaseExtractor]] = None,
+                 name: str = "",
+                 codec: Codec = Codec.Zlib,
+                 window: int = DEFAULT_WINDOW,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 batcher: Optional[Batcher] = None,
+                 spool: Optional[Spool] = None,
+                 begin: datetime = datetime.fromtimestamp(0)) -> None:
+        self.log = common.get_logger("agent")
+        self.addr = (host, port)
+        self.name = name
+        self.extractors = extractors or []
+        self.begin = begin
+        self.codec = codec
+        self.window = window
+        self.timeout = timeout
+        self.batcher = batcher if batcher is not None else Batcher()
+        self.spool = spool if spool is not None else Spool()
+        self.client = None
+        self.inflight = deque()
+        self.retry = DEFAULT_RETRY
+        self.next_try = 0.0
+        self.stats = AgentStats()
+        for ex in self.extractors:
+            ex.init()
+
+    def step(self) -> int:
+        """Collect new records, and send or spool the batches that are due.
+
+        Returns the number of records collected.
+        """
+        cnt: int = 0
+        for ex in self.extractors:
+            for batch in ex.batches(self.begin, self.batcher.max_records):
+                cnt += len(batch)
+                for r in batch:
+                    self.batcher.add(r)
+                    if self.batcher.full():
+                        self.flush()
+        if self.batcher.due():
+            self.flush()
+        if self.spool and self.__online():
+            self.__drain()
+        return cnt
+
+    def run(self, stop: Optional[Event] = None, interval: float = DEFAULT_INTERVAL) -> None:
+        """Run until stop is set."""
+        if stop is None:
+            stop = Event()
+        while not stop.is_set():
+            if self.step() == 0:
+                stop.wait(interval)
+
+    def flush(self) -> None:
+        """Send the records collected so far, or spool them if the server is not there."""
+        size: int = self.batcher.size
+        records = self.batcher.take()
+        if not records:
+            return
+        pkt = Packet(codec=self.codec,
+                     blob=protocol.pack_records(records, self.codec),
+                     count=len(records))
+        self.stats.records += len(records)
+        self.stats.batches += 1
+        self.stats.raw_bytes += size
+        if self.spool or not self.__online():
+            # Whatever is spooled already goes first.
+            self.__push(pkt)
+            return
+        try:
+            self.__ship(pkt)
+        except (OSError, ProtocolError) as err:
+            self.__fail(err)
+
+    def close(self) -> None:
+        """Send what is left, wait for the server to acknowledge it, and disconnect."""
+        self.flush()
+        if self.spool and self.__online():
+            self.__drain()
+        if self.client is not None:
+            try:
+                self.client.drain()
+                self.__settle()
+            except (OSError, ProtocolError) as err:
+                self.__fail(err)
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        for ex in self.extractors:
+            ex.close()
+
+    def __online(self) -> bool:
+        """Connect to the server, unless we are connected already or should wait some more."""
+        if self.client is not None:
+            return True
+        if time.monotonic() < self.next_try:
+            return False
+        client = Client(self.addr[0], self.addr[1], self.name, self.window, self.timeout)
+        try:
+            client.connect()
+        except OSError as err:
+            client.close()
+            self.log.info("Cannot reach server at %s:%d: %s", *self.addr, err)
+            self.__backoff()
+            return False
+        self.log.info("Connected to server at %s:%d", *self.addr)
+        self.client = client
+        self.retry = DEFAULT_RETRY
+        return True
+
+    def __backoff(self) -> None:
+        """Wait a little longer before the next attempt to reach the server."""
+        self.stats.failures += 1
+        self.next_try = time.monotonic() + self.retry
+        self.retry = min(self.retry * 2, MAX_RETRY)
+
+    def __push(self, pkt: Packet) -> None:
+        """Put a Packet into the spool."""
+        self.spool.push(pkt)
+        self.stats.spooled += 1
+
+    def __ship(self, pkt: Packet) -> None:
+        """Send a Packet, without waiting for the Ack unless the window is full."""
+        assert self.client is not None
+        self.client.send_packed(pkt.codec, pkt.blob, pkt.count)
+        self.inflight.append(pkt)
+        self.stats.sent_bytes += len(pkt.blob)
+        self.__settle()
+
+    def __settle(self) -> None:
+        """Forget the Packets the server has acknowledged, removing them from the spool."""
+        assert self.client is not None
+        while len(self.inflight) > len(self.client.pending):
+            pkt = self.inflight.popleft()
+            if pkt.name != "":
+                self.spool.remove(pkt.name)
+
+    def __drain(self) -> None:
+        """Send the spooled Packets, oldest first, and wait until the server has them all."""
+        assert self.client is not None
+        self.log.info("Sending %d spooled batches", len(self.spool))
+        try:
+            sent: set[str] = {pkt.name for pkt in self.inflight}
+            for name in list(self.spool.names):
+                if name not in sent and (pkt := self.spool.load(name)) is not None:
+                    self.__ship(pkt)
+            self.client.drain()
+            self.__settle()
+        except (OSError, ProtocolError) as err:
+            self.__fail(err)
+
+    def __fail(self, err: Exception) -> None:
+        """Give up on the connection, spooling the Packets that have not been acknowledged."""
+        self.log.error("Lost connection to server at %s:%d: %s", *self.addr, err)
+        for pkt in self.inflight:
+            if pkt.name == "":
+                self.__push(pkt)
+        self.inflight.clear()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.__backoff()
+
+
+def main() -> None:
+    """Run the agent."""
+    codecs: dict[str, Codec] = {c.name.lower(): c for c in Codec}
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-s", "--server", required=True,
+                      help="The host the Silo server runs on")
+    argp.add_argument("-p", "--port", type=int, default=common.DEFAULT_PORT,
+                      help="The TCP port the server listens on")
+    argp.add_argument("-n", "--name", default="",
+                      help="The name to report to the server, defaults to the host name")
+    argp.add_argument("-j", "--journal", action="store_true",
+                      help="Read the systemd journal")
+    argp.add_argument("-z", "--codec", choices=list(codecs), default="zlib",
+                      help="How to compress the batches")
+    argp.add_argument("files", nargs="*",
+                      help="Log files to read")
+    args = argp.parse_args()
+
+    cp = CheckpointStore()
+    extractors: list[BaseExtractor] = []
+    if args.files:
+        extractors.append(LogfileExtractor(*args.files, checkpoints=cp))
+    if args.journal:
+        extractors.append(JournaldExtractor(cp))
+
+    agent = Agent(args.server,
+                  args.port,
+                  extractors,
+                  name=args.name,
+                  codec=codecs[args.codec])
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:32:32 krylon>
+#
+# /data/code/python/silo/alert.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.alert
+
+Check incoming records against user-defined Rules and raise Alerts.
+
+A Rule matches records by a substring and/or a regular expression on the
+message, and optionally by source and Host. It fires once threshold
+matching records have come in within window seconds.
+
+With a thousand Rules, trying each of them on every record would be far
+too slow, so the RuleEngine indexes them: Each Rule that needs a literal
+string to be present in the message - its substring, or a literal run its
+regular expression cannot match without - is filed under one trigram of
+that string. A regular expression with alternatives may need one of
+several strings instead, then the Rule is filed under a trigram of each.
+For each record, the engine takes the trigrams of the message and only
+looks at the Rules filed under one of those. Rules without a
+usable literal are filed under their source or Host, if they have one.
+The regular expressions of the rest are combined into one, so records
+that match none of them cost a single search.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import logging
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Final, Iterable, Iterator, Optional
+
+from silo import common
+from silo.data import Record, RecordRow
+
+# We look into regular expressions with the parser of the re module, which is
+# private and has changed between versions of Python. If it is not there or
+# does not behave as we expect, Rules are not indexed by their regular
+# expressions and not combined with others, but each of them is still tried
+# on every record that may match.
+try:
+    from re import _constants as sre_constants  # type: ignore[attr-defined]
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:
+    sre_constants = None
+    sre_parse = None
+
+# The length of the substrings rules are indexed by.
+GRAM: Final[int] = 3
+
+# The number of slots a rule's window is divided into. Counts are exact up
+# to the width of one slot.
+DEFAULT_WINDOW_SLOTS: Final[int] = 10
+
+# For rules counted per Host, the number of Hosts whose counters we keep.
+# When there are more, the least recently seen Host is forgotten.
+DEFAULT_MAX_HOSTS: Final[int] = 1024
+
+# The number of recent Alerts a RuleEngine keeps.
+DEFAULT_KEEP_ALERTS: Final[int] = 1000
+
+
+class RuleError(ValueError):
+    """Raised when a Rule is invalid."""
+
+
+@dataclass(slots=True, kw_only=True)
+class Rule:
+    """Rule describes the records to raise an Alert for.
+
+    A record matches if its message contains substring and matches
+    pattern, its source equals source and it comes from the Host with the
+    ID host. Empty values and a host of 0 match anything. ignore_case
+    applies to substring and pattern.
+
+    The Rule fires when threshold matching records arrive within window
+    seconds, going by the timestamps of the records. After firing, the
+    count starts over. If per_host is True, each Host is counted separately.
+    """
+
+    name: str
+    substring: str = ""
+    pattern: str = ""
+    source: str = ""
+    host: int = 0
+    ignore_case: bool = False
+    threshold: int = 1
+    window: float = 60.0
+    per_host: bool = False
+
+
+@dataclass(slots=True, kw_only=True)
+class Alert:
+    """Alert says that a Rule has fired, and which record tipped it over."""
+
+    rule: str
+    host_id: int
+    timestamp: int
+    source: str
+    message: str
+    count: int
+
+
+@dataclass(slots=True, kw_only=True)
+class RuleStats:
+    """RuleStats counts the matches and Alerts of a single Rule."""
+
+    matches: int = 0
+    alerts: int = 0
+
+
+@dataclass(slots=True, kw_only=True)
+class EngineStats:
+    """EngineStats is a snapshot of a RuleEngine's counters.
+
+    candidates is the number of times a Rule had to be checked against a
+    record, i.e. made it past the index.
+    """
+
+    records: int = 0
+    candidates: int = 0
+    matches: int = 0
+    alerts: int = 0
+    rules: dict[str, RuleStats] = field(default_factory=dict)
+
+
+class WindowCounter:
+    """WindowCounter counts events over a sliding window of width seconds.
+
+    The window is split into a fixed number of slots, so the memory used
+    does not depend on the rate of events. Events older than the window are
+    dropped a slot at a time, events that are too old to fall into any slot
+    are not counted at all.
+    """
+
+    __slots__ = [
+        "slot_width",
+        "counts",
+        "current",
+        "total",
+    ]
+
+    slot_width: float
+    counts: list[int]
+    current: int
+    total: int
+
+    def __init__(self, width: float, slots: int = DEFAULT_WINDOW_SLOTS) -> None:
+        if width <= 0 or slots < 1:
+            raise ValueError(f"Invalid window of {width}s in {slots} slots")
+        self.slot_width = width / slots
+        self.counts = [0] * slots
+        self.current = 0
+        self.total = 0
+
+    def add(self, stamp: float, n: int = 1) -> int:
+        """Count n events at time stamp, return the number of events in the window."""
+        slot: int = int(stamp // self.slot_width)
+        size: int = len(self.counts)
+        if slot > self.current:
+            if slot - self.current >= size:
+                self.counts = [0] * size
+                self.total = 0
+            else:
+                for s in range(self.current + 1, slot + 1):
+                    self.total -= self.counts[s % size]
+                    self.counts[s % size] = 0
+            self.current = slot
+        elif slot <= self.current - size:
+            return self.total
+        self.counts[slot % size] += n
+        self.total += n
+        return self.total
+
+    def clear(self) -> None:
+        """Forget all events."""
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+
+
+def _opcode(name: str) -> object:
+    """Return the opcode of the re parser called name, or None if it has none.
+
+    All opcodes are looked up here, since the module is private and may lack some of them.
+    """
+    return getattr(sre_constants, name, None)
+
+
+_LITERAL: Final = _opcode("LITERAL")
+_SUBPATTERN: Final = _opcode("SUBPATTERN")
+_ATOMIC_GROUP: Final = _opcode("ATOMIC_GROUP")
+_ASSERTS: Final[tuple] = (_opcode("ASSERT"), _opcode("ASSERT_NOT"))
+_BRANCH: Final = _opcode("BRANCH")
+_GROUPREFS: Final[tuple] = (_opcode("GROUPREF"), _opcode("GROUPREF_EXISTS"))
+_GROUPREF_EXISTS: Final = _opcode("GROUPREF_EXISTS")
+_REPEATS: Final[tuple] = tuple(op for op in map(_opcode, ("MAX_REPEAT",
+                                                          "MIN_REPEAT",
+                                                          "POSSESSIVE_REPEAT"))
+                               if op is not None)
+
+
+def _walk(items: Iterable) -> Iterator[tuple]:
+    """Yield the nodes of a parsed regular expression, descending into all subpatterns."""
+    for op, av in items:
+        yield op, av
+        if op in _REPEATS:
+            yield from _walk(av[2])
+        elif op is _SUBPATTERN:
+            yield from _walk(av[3])
+        elif op is _ATOMIC_GROUP:
+            yield from _walk(av)
+        elif op in _ASSERTS:
+            yield from _walk(av[1])
+        elif op is _BRANCH:
+            for alt in av[1]:
+                yield from _walk(alt)
+        elif op is _GROUPREF_EXISTS:
+            yield from _walk(av[1])
+            if av[2] is not None:
+                yield from _walk(av[2])
+
+
+def _literal_sets(items: Iterable, sets: list[list[str]]) -> None:
+    """Collect sets of strings of which every match of a parsed expression contains one.
+
+    Runs of literal characters give a set of one. An alternative gives the
+    best set of each branch, merged, as long as every branch has one.
+    Groups and repeats that must match at least once are looked into,
+    character classes and anything optional are not.
+    """
+    run: list[str] = []
+    for op, av in items:
+        if op is _LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            sets.append(["".join(run)])
+            run = []
+        if op is _SUBPATTERN and av[1] == 0 and av[2] == 0:
+            _literal_sets(av[3], sets)
+        elif op in _REPEATS and av[0] >= 1:
+            _literal_sets(av[2], sets)
+        elif op is _BRANCH:
+            merged: list[str] = []
+            for alt in av[1]:
+                best = _best_set(alt)
+                if not best:
+                    break
+                merged.extend(best)
+            else:
+                sets.append(merged)
+    if run:
+        sets.append(["".join(run)])
+
+
+def _best_set(items: Iterable) -> list[str]:
+    """Return the set of strings from _literal_sets whose shortest member is longest."""
+    sets: list[list[str]] = []
+    _literal_sets(items, sets)
+    return max(sets, key=lambda s: (min(len(x) for x in s), -len(s)), default=[])
+
+
+def required_literals(pattern: str, flags: int = 0) -> list[str]:
+    """Return strings of which everything the pattern matches contains at least one.
+
+    Returns an empty list if there are none we can be sure of, or if the
+    parser of the re module does not work the way we expect.
+    """
+    if sre_parse is None:
+        return []
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+        if parsed.state.flags & re.IGNORECASE and not flags & re.IGNORECASE:
+            # An inline flag makes the literals match either case.
+            return []
+        return _best_set(parsed.data)
+    except re.error:
+        return []
+    except Exception as err:  # pylint: disable-msg=W0718
+        common.get_logger("alert").warning("Cannot look for literals in %r: %s", pattern, err)
+        return []
+
+
+def combinable(pattern: str, regex: re.Pattern) -> bool:
+    """Return True if pattern keeps its meaning as one of several alternatives in a regex.
+
+    Group names could clash, and backreferences would point to the wrong group.
+    If we cannot tell, because the parser of the re module does not work the
+    way we expect, the answer is False.
+    """
+    if regex.groupindex or sre_parse is None:
+        return False
+    try:
+        re.compile(f"(?:{pattern})")
+        parsed = sre_parse.parse(pattern, regex.flags)
+        return not any(op in _GROUPREFS
+                       for op, _ in _walk(parsed.data))
+    except re.error:
+        return False
+    except Exception as err:  # pylint: disable-msg=W0718
+        common.get_logger("alert").warning("Cannot look for backreferences in %r: %s",
+                                           pattern, err)
+        return False
+
+
+class _Matcher:
+    """_Matcher holds a compiled Rule and its counters."""
+
+    __slots__ = [
+        "rule",
+        "needle",
+        "regex",
+        "window",
+        "hosts",
+        "max_hosts",
+        "counters",
+    ]
+
+    rule: Rule
+    needle: str
+    regex: Optional[re.Pattern]
+    window: Optional[WindowCounter]
+    hosts: OrderedDict[int, WindowCounter]
+    max_hosts: int
+    counters: RuleStats
+
+    def __init__(self, rule: Rule, max_hosts: int) -> None:
+        if rule.name == "":
+            raise RuleError("Rule has no name")
+        if rule.threshold < 1:
+            raise RuleError(f"Threshold of Rule {rule.name} must be at least 1")
+        if rule.window <= 0:
+            raise RuleError(f"Window of Rule {rule.name} must be positive")
+        self.rule = rule
+        self.needle = rule.substring.lower() if rule.ignore_case else rule.substring
+        self.regex = None
+        if rule.pattern != "":
+            try:
+                self.regex = re.compile(rule.pattern, re.IGNORECASE if rule.ignore_case else 0)
+            except re.error as err:
+                raise RuleError(f"Invalid pattern in Rule {rule.name}: {err}") from err
+        self.window = None if rule.per_host else WindowCounter(rule.window)
+        self.hosts = OrderedDict()
+        self.max_hosts = max_hosts
+        self.counters = RuleStats()
+
+    def literals(self) -> tuple[list[str], bool]:
+        """Return strings of which every matching message contains one, as the index sees it.
+
+        The flag says if the index has to look for them in the lowered
+        message, because the Rule ignores case.
+        """
+        if len(self.needle) >= GRAM or self.regex is None:
+            return ([self.needle] if self.needle else []), self.rule.ignore_case
+        # The pattern may turn on IGNORECASE by itself.
+        folded: bool = bool(self.regex.flags & re.IGNORECASE)
+        lits = required_literals(self.rule.pattern, self.regex.flags & re.IGNORECASE)
+        if folded:
+            # Lowering is only guaranteed to agree with the regex engine's
+            # idea of case for plain ASCII.
+            if not all(lit.isascii() for lit in lits):
+                return [], True
+            lits = [lit.lower() for lit in lits]
+        return lits, folded
+
+    def matches(self, host_id: int, source: str, message: str, lower: str) -> bool:
+        """Return True if a record matches the Rule."""
+        rule = self.rule
+        if rule.host not in (0, host_id):
+            return False
+        if rule.source not in ("", source):
+            return False
+        if self.needle and self.needle not in (lower if rule.ignore_case else message):
+            return False
+        return self.regex is None or self.regex.search(message) is not None
+
+    def count(self, host_id: int, stamp: int) -> int:
+        """Count a match, return the number of matches in the window.
+
+        If it reaches the threshold, the count starts over.
+        """
+        window = self.window
+        if window is None:
+            window = self.hosts.get(host_id)
+            if window is None:
+                window = self.hosts[host_id] = WindowCounter(self.rule.window)
+                if len(self.hosts) > self.max_hosts:
+                    self.hosts.popitem(last=False)
+            else:
+                self.hosts.move_to_end(host_id)
+        cnt: int = window.add(stamp)
+        if cnt >= self.rule.threshold:
+            window.clear()
+        return cnt
+
+
+class _RuleIndex:
+    """_RuleIndex sorts the Matchers of a set of Rules by what to look for before trying them."""
+
+    __slots__ = [
+        "matchers",
+        "grams",
+        "grams_lower",
+        "by_source",
+        "by_host",
+        "combined",
+        "rest",
+        "lower",
+        "shared",
+    ]
+
+    matchers: list[_Matcher]
+    grams: dict[str, list[_Matcher]]
+    grams_lower: dict[str, list[_Matcher]]
+    by_source: dict[str, list[_Matcher]]
+    by_host: dict[int, list[_Matcher]]
+    combined: Optional[re.Pattern]
+    rest: list[_Matcher]
+    lower: bool
+    shared: bool
+
+    def __init__(self, rules: Iterable[Rule], max_hosts: int) -> None:
+        self.matchers = []
+        self.grams = {}
+        self.grams_lower = {}
+        self.by_source = {}
+        self.by_host = {}
+        self.rest = []
+        self.lower = False
+        # True if a Matcher is filed under more than one trigram.
+        self.shared = False
+        names: set[str] = set()
+        patterns: list[str] = []
+        for rule in rules:
+            if rule.name in names:
+                raise RuleError(f"Duplicate Rule name {rule.name}")
+            names.add(rule.name)
+            m = _Matcher(rule, max_hosts)
+            self.matchers.append(m)
+            self.lower = self.lower or rule.ignore_case
+            lits, folded = m.literals()
+            if lits and all(len(lit) >= GRAM for lit in lits):
+                # ASCII literals are looked for in the lowered message even
+                # if case matters, so most records only need one set of
+                # trigrams. That lets a few more Rules past the index.
+                if not folded and all(lit.isascii() for lit in lits):
+                    lits = [lit.lower() for lit in lits]
+                    folded = True
+                self.lower = self.lower or folded
+                table = self.grams_lower if folded else self.grams
+                for lit in lits:
+                    self.__file(table, lit, m)
+                self.shared = self.shared or len(lits) > 1
+            elif rule.source != "":
+                self.by_source.setdefault(rule.source, []).append(m)
+            elif rule.host != 0:
+                self.by_host.setdefault(rule.host, []).append(m)
+            elif m.regex is not None and not m.needle and combinable(rule.pattern, m.regex):
+                patterns.append(f"(?i:{rule.pattern})" if rule.ignore_case
+                                else f"(?:{rule.pattern})")
+                self.rest.append(m)
+            else:
+                self.rest.append(m)
+        self.combined = None
+        if patterns and len(patterns) == len(self.rest):
+            self.combined = re.compile("|".join(patterns))
+
+    @staticmethod
+    def __file(table: dict[str, list[_Matcher]], lit: str, m: _Matcher) -> None:
+        """File a Matcher under the trigram of lit that the fewest others share."""
+        best: str = min((lit[i:i + GRAM] for i in range(len(lit) - GRAM + 1)),
+                        key=lambda g: len(table.get(g, ())))
+        filed = table.setdefault(best, [])
+        if m not in filed:
+            filed.append(m)
+
+    def candidates(self, host_id: int, source: str, message: str, lower: str) \
+            -> Iterable[_Matcher]:
+        """Return the Matchers that might match a record."""
+        found: list[_Matcher] = []
+        if self.grams:
+            grams = {message[i:i + GRAM] for i in range(len(message) - GRAM + 1)}
+            for g in self.grams.keys() & grams:
+                found.extend(self.grams[g])
+        if self.grams_lower:
+            grams = {lower[i:i + GRAM] for i in range(len(lower) - GRAM + 1)}
+            for g in self.grams_lower.keys() & grams:
+                found.extend(self.grams_lower[g])
+        if self.shared and len(found) > 1:
+            found = list(dict.fromkeys(found))
+        found.extend(self.by_source.get(source, ()))
+        found.extend(self.by_host.get(host_id, ()))
+        if self.rest and (self.combined is None or self.combined.search(message) is not None):
+            found.extend(self.rest)
+        return found
+
+
+class RuleEngine:
+    """RuleEngine checks records against a set of Rules.
+
+    Alerts are passed to notify, if given, logged, and the most recent ones
+    are kept around, see alerts(). The Rules can be replaced at any time
+    with load(), which starts all counts over.
+
+    Records from several threads are checked one batch at a time. The
+    IngestQueue checks each batch on its writer thread before writing it.
+    """
+
+    __slots__ = [
+        "log",
+        "lock",
+        "index",
+        "notify",
+        "max_hosts",
+        "recent",
+        "counters",
+    ]
+
+    log: logging.Logger
+    lock: Lock
+    index: _RuleIndex
+    notify: Optional[Callable[[Alert], None]]
+    max_hosts: int
+    recent: deque[Alert]
+    counters: EngineStats
+
+    def __init__(self,
+                 rules: Iterable[Rule] = (),
+                 notify: Optional[Callable[[Alert], None]] = None,
+                 max_hosts: int = DEFAULT_MAX_HOSTS,
+                 keep: int = DEFAULT_KEEP_ALERTS) -> None:
+        self.log = common.get_logger("alert")
+        self.lock = Lock()
+        self.notify = notify
+        self.max_hosts = max_hosts
+        self.recent = deque(maxlen=keep)
+        self.counters = EngineStats()
+        self.index = _RuleIndex(rules, max_hosts)
+
+    def __len__(self) -> int:
+        return len(self.index.matchers)
+
+    def load(self, rules: Iterable[Rule]) -> None:
+        """Replace the Rules.
+
+        Raises RuleError and keeps the old Rules if any of the new ones is invalid.
+        """
+        index = _RuleIndex(rules, self.max_hosts)
+        with self.lock:
+            self.index = index
+
+    def check(self, host_id: int, stamp: int, source: str, message: str) -> list[Alert]:
+        """Check a single record, return the Alerts it raised."""
+        return self.check_rows(((host_id, stamp, source, message), ))
+
+    def check_record(self, rec: Record) -> list[Alert]:
+        """Check a Record, return the Alerts it raised."""
+        return self.check(rec.host_id, int(rec.timestamp.timestamp()), rec.source, rec.message)
+
+    def check_rows(self, rows: Iterable[RecordRow]) -> list[Alert]:
+        """Check records given as (host_id, timestamp, source, message).
+
+        Returns the Alerts they raised.
+        """
+        fired: list[Alert] = []
+        with self.lock:
+            index = self.index
+            counters = self.counters
+            checked: int = 0
+            candidates: int = 0
+            for host_id, stamp, source, message in rows:
+                checked += 1
+                lower: str = message.lower() if index.lower else message
+                for m in index.candidates(host_id, source, message, lower):
+                    candidates += 1
+                    if not m.matches(host_id, source, message, lower):
+                        continue
+                    m.counters.matches += 1
+                    counters.matches += 1
+                    cnt = m.count(host_id, stamp)
+                    if cnt >= m.rule.threshold:
+                        m.counters.alerts += 1
+                        fired.append(Alert(rule=m.rule.name,
+                                           host_id=host_id,
+                                           timestamp=stamp,
+                                           source=source,
+                                           message=message,
+                                           count=cnt))
+            counters.records += checked
+            counters.candidates += candidates
+            counters.alerts += len(fired)
+            self.recent.extend(fired)
+
+        for a in fired:
+            self.log.warning("Rule %s fired for Host %d after %d matches: %s",
+                             a.rule,
+                             a.host_id,
+                             a.count,
+                             a.message)
+            if self.notify is not None:
+                try:
+                    self.notify(a)
+                except Exception as err:  # pylint: disable-msg=W0718
+                    self.log.error("Failed to deliver Alert for Rule %s: %s", a.rule, err)
+        return fired
+
+    def alerts(self) -> list[Alert]:
+        """Return the most recent Alerts, oldest first."""
+        with self.lock:
+            return list(self.recent)
+
+    def stats(self) -> EngineStats:
+        """Return a snapshot of the engine's counters, including those of each Rule."""
+        with self.lock:
+            c = self.counters
+            return EngineStats(records=c.records,
+                               candidates=c.candidates,
+                               matches=c.matches,
+                               alerts=c.alerts,
+                               rules={m.rule.name: RuleStats(matches=m.counters.matches,
+                                                             alerts=m.counters.alerts)
+                                      for m in self.index.matchers})
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 18:41:55 krylon>
+#
+# /data/code/python/silo/bench/__init__.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.__init__
+
+Benchmarks for the performance sensitive parts of Silo. Each module can be
+run on its own, e.g. python3 -m silo.bench.database
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from silo import common
+from silo.data import Record
+
+sources: list[str] = ["named", "smartd", "sshd", "cron", "kernel", "newsyslog"]
+
+
+@contextmanager
+def scratch_dir() -> Iterator[str]:
+    """Point Silo's base directory to a temporary folder for the duration of a benchmark."""
+    folder: str = tempfile.mkdtemp(prefix="silo_bench_")
+    common.set_basedir(folder)
+    try:
+        yield folder
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def fake_records(cnt: int, host_id: int = 1) -> list[Record]:
+    """Generate cnt Records that look vaguely like the real thing."""
+    start: datetime = datetime.now() - timedelta(seconds=cnt)
+    return [Record(host_id=host_id,
+                   timestamp=start + timedelta(seconds=i),
+                   source=sources[i % len(sources)],
+                   message=f"success resolving 'host{i % 997}.example.com/A' after {i} tries")
+            for i in range(cnt)]
+
+
+def report(label: str, cnt: int, elapsed: float) -> None:
+    """Print the throughput of a benchmark run."""
+    rate = cnt / elapsed if elapsed > 0 else float("inf")
+    print(f"{label:<40} {cnt:>10d} in {elapsed:8.3f}s = {rate:>12.0f}/s")
+
+
+class Timer:
+    """Timer measures the wall clock time spent in a with block."""
+
+    __slots__ = ["start", "elapsed"]
+
+    start: float
+    elapsed: float
+
+    def __init__(self) -> None:
+        self.start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def db_path(folder: str, name: str) -> str:
+    """Return the path of a fresh database file in folder."""
+    path: str = os.path.join(folder, f"{name}.db")
+    if os.path.exists(path):
+        os.unlink(path)
+    return path
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
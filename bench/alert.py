@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:17:35 krylon>
+#
+# /data/code/python/silo/bench/alert.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.alert
+
+Measure how many records per second the RuleEngine checks against lots of Rules.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import random
+import re
+import string
+
+from silo.alert import Rule, RuleEngine
+from silo.bench import Timer, report
+from silo.bench.storage import sample_records
+from silo.data import RecordRow
+
+
+def make_rules(cnt: int, rows: list[RecordRow], seed: int = 1) -> list[Rule]:
+    """Make cnt Rules of all kinds.
+
+    A tenth of them look for words that occur in rows, the rest for made up
+    ones, the way most alert rules wait for things that rarely happen.
+    """
+    rng = random.Random(seed)
+    words: list[str] = sorted({w for row in rows for w in re.findall(r"[A-Za-z]{4,}", row[3])})
+    sources: list[str] = sorted({row[2] for row in rows})
+    rules: list[Rule] = []
+    for i in range(cnt):
+        if i % 10 == 0:
+            w1, w2 = rng.choice(words), rng.choice(words)
+        else:
+            w1 = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+            w2 = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+        match i % 5:
+            case 0:
+                rule = Rule(name=f"r{i}", substring=w1)
+            case 1:
+                rule = Rule(name=f"r{i}", substring=w1, ignore_case=True)
+            case 2:
+                rule = Rule(name=f"r{i}", pattern=rf"{w1}.*\b{w2}\b")
+            case 3:
+                rule = Rule(name=f"r{i}", pattern=rf"(?:{w1}|{w2})\s+\d+", ignore_case=True)
+            case _:
+                rule = Rule(name=f"r{i}", substring=w1, source=rng.choice(sources),
+                            threshold=10, window=60, per_host=True)
+        rules.append(rule)
+    return rules
+
+
+def naive(rules: list[Rule], rows: list[RecordRow]) -> int:
+    """Try every Rule on every row, return the number of matches."""
+    compiled = [(r.substring.lower() if r.ignore_case else r.substring,
+                 re.compile(r.pattern, re.IGNORECASE if r.ignore_case else 0)
+                 if r.pattern else None,
+                 r) for r in rules]
+    hits: int = 0
+    for _, _, source, message in rows:
+        lower = message.lower()
+        for needle, regex, r in compiled:
+            if r.source and r.source != source:
+                continue
+            if needle and needle not in (lower if r.ignore_case else message):
+                continue
+            if regex is not None and regex.search(message) is None:
+                continue
+            hits += 1
+    return hits
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=50000,
+                      help="Number of records to check")
+    argp.add_argument("-r", "--rules", type=int, nargs="+", default=[1000, 5000],
+                      help="Numbers of Rules to try")
+    args = argp.parse_args()
+
+    rows: list[RecordRow] = [(1 + i % 8, int(r.timestamp.timestamp()), r.source, r.message)
+                             for i, r in enumerate(sample_records(args.count, 0))]
+    for cnt in args.rules:
+        rules = make_rules(cnt, rows)
+        engine = RuleEngine(rules, keep=1)
+        # Alerts are logged, which would drown out the matching.
+        engine.log.disabled = True
+        with Timer() as t:
+            engine.check_rows(rows)
+        report(f"RuleEngine, {cnt} rules", len(rows), t.elapsed)
+        stats = engine.stats()
+        print(f"{'':<40} {stats.candidates / len(rows):.1f} candidates, "
+              f"{stats.matches / len(rows):.2f} matches per record")
+
+        # Trying every rule is so slow that a sample has to do.
+        sample: list[RecordRow] = rows[:max(len(rows) // 20, 1)]
+        with Timer() as t:
+            hits = naive(rules, sample)
+        report(f"every rule on every record, {cnt} rules", len(sample), t.elapsed)
+        check = RuleEngine(rules, keep=1)
+        check.log.disabled = True
+        check.check_rows(sample)
+        assert check.stats().matches == hits
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:09:50 krylon>
+#
+# /data/code/python/silo/bench/backfill.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.backfill
+
+Compare parsing a large log file in one process to parsing it on a pool of workers.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import glob
+import os
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.database import Database
+from silo.extractor.backfill import BackfillStats, backfill, parse_files
+
+
+def sample_lines() -> list[bytes]:
+    """Return the lines of the sample logs."""
+    folder: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "extractor")
+    lines: list[bytes] = []
+    for path in sorted(glob.glob(os.path.join(folder, "messages.*")) +
+                       glob.glob(os.path.join(folder, "daemon.*"))):
+        with open(path, "rb") as fh:
+            lines.extend(line for line in fh if line.strip())
+    return lines
+
+
+def generate(path: str, size: int) -> None:
+    """Write a syslog file of at least size bytes, made up of the sample logs over and over."""
+    block: bytes = b"".join(sample_lines())
+    written: int = 0
+    with open(path, "wb") as fh:
+        while written < size:
+            fh.write(block)
+            written += len(block)
+
+
+def bench_backfill(path: str, workers: int, to_db: bool) -> None:
+    """Parse the file at path with one and with several worker processes."""
+    mib: float = os.path.getsize(path) / 2**20
+    print(f"Parsing {path} ({mib:.0f} MiB)")
+    for cnt in sorted({1, workers}):
+        stats = BackfillStats()
+        with Timer() as t:
+            for _ in parse_files([path], cnt, stats=stats):
+                pass
+        report(f"parse, {cnt} workers ({mib / t.elapsed:.0f} MiB/s)", stats.records, t.elapsed)
+
+    if to_db:
+        db = Database(db_path(os.path.dirname(path), "backfill"))
+        host = db.host_get_or_add("wintermute")
+        stats = backfill(db, host.host_id, [path], workers)
+        report(f"backfill, {workers} workers", stats.records, stats.elapsed)
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-s", "--size", type=int, default=2048,
+                      help="Size of the generated log file in MiB")
+    argp.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                      help="Number of worker processes")
+    argp.add_argument("-f", "--file", default="",
+                      help="Parse this file instead of generating one")
+    argp.add_argument("-d", "--db", action="store_true",
+                      help="Also import the file into a database")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        path: str = args.file
+        if path == "":
+            path = os.path.join(folder, "messages")
+            with Timer() as t:
+                generate(path, args.size * 2**20)
+            print(f"Generated {args.size} MiB of logs in {t.elapsed:.1f}s")
+        bench_backfill(path, args.workers, args.db)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/bench/columns.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.columns
+
+Compare moving records in and out of the database as Records and as RecordBatches.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import tracemalloc
+from functools import partial
+from typing import Callable, Sized
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.bench.storage import sample_records
+from silo.data import RecordBatch
+from silo.database import Database
+
+
+def bench_columns(folder: str, cnt: int, batch_size: int) -> None:
+    """Insert and fetch the same records both ways."""
+    for label in ("Records", "RecordBatch"):
+        db = Database(db_path(folder, label))
+        host = db.host_get_or_add("bench")
+        records = sample_records(cnt, host.host_id)
+        if label == "Records":
+            with Timer() as t:
+                db.record_add_batch(records, False, batch_size)
+            fetch: Callable[[], Sized] = partial(db.record_get_by_host, host.host_id)
+        else:
+            batch = RecordBatch.from_records(records)
+            with Timer() as t:
+                db.record_add_columns(batch, False, batch_size)
+            fetch = partial(db.record_batch_by_host, host.host_id)
+        report(f"insert {label}", cnt, t.elapsed)
+        del records
+
+        with Timer() as t:
+            got: int = len(fetch())
+        report(f"fetch {label}", got, t.elapsed)
+        tracemalloc.start()
+        fetch()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{'fetch ' + label:<40} peak memory {peak / 2**20:.1f} MiB")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=200000,
+                      help="Number of records to insert")
+    argp.add_argument("-b", "--batch", type=int, default=1000,
+                      help="Batch size")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_columns(folder, args.count, args.batch)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
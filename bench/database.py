@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 18:41:55 krylon>
+#
+# /data/code/python/silo/bench/database.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.database
+
+Compare the throughput of adding Records one at a time to adding them in
+batches.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+
+from silo.bench import Timer, db_path, fake_records, report, scratch_dir
+from silo.data import Host
+from silo.database import BatchWriter, Database
+
+
+def bench_insert(folder: str, cnt: int, batch_size: int) -> None:
+    """Run the insert benchmarks."""
+    db = Database(db_path(folder, "per_row"))
+    host = Host(name="bench")
+    db.host_add(host)
+    records = fake_records(cnt, host.host_id)
+    with Timer() as t:
+        for r in records:
+            db.record_add(r)
+    report("record_add (per row, autocommit)", cnt, t.elapsed)
+
+    db = Database(db_path(folder, "batch_ids"))
+    db.host_add(host)
+    records = fake_records(cnt, host.host_id)
+    with Timer() as t:
+        db.record_add_batch(records, True, batch_size)
+    report("record_add_batch (with IDs)", cnt, t.elapsed)
+
+    db = Database(db_path(folder, "batch_noids"))
+    db.host_add(host)
+    records = fake_records(cnt, host.host_id)
+    with Timer() as t:
+        db.record_add_batch(records, False, batch_size)
+    report("record_add_batch (without IDs)", cnt, t.elapsed)
+
+    db = Database(db_path(folder, "writer"))
+    db.host_add(host)
+    records = fake_records(cnt, host.host_id)
+    with Timer() as t:
+        with BatchWriter(db, batch_size) as w:
+            for r in records:
+                w.add(r)
+    report(f"BatchWriter (batch size {batch_size})", cnt, t.elapsed)
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=20000,
+                      help="Number of records to insert")
+    argp.add_argument("-b", "--batch", type=int, default=1000,
+                      help="Batch size")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_insert(folder, args.count, args.batch)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:00:52 krylon>
+#
+# /data/code/python/silo/bench/dedup.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.dedup
+
+Compare storing the sample logs as they are and with repeated records collapsed.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+from typing import Optional
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.bench.storage import sample_records, table_bytes
+from silo.data import RecordRow
+from silo.database import Database
+from silo.dedup import Deduplicator
+
+
+def bench_dedup(folder: str, cnt: int, batch_size: int, windows: list[int]) -> None:
+    """Insert the same records without and with Deduplicators of the given windows."""
+    rows: list[RecordRow] = [(1, int(r.timestamp.timestamp()), r.source, r.message)
+                             for r in sample_records(cnt, 1)]
+    for window in [0] + windows:
+        label: str = f"window {window}s" if window else "no dedup"
+        db = Database(db_path(folder, f"dedup_{window}"))
+        db.host_get_or_add("bench")
+        dedup: Optional[Deduplicator] = Deduplicator(window) if window else None
+        with Timer() as t:
+            db.record_add_rows(rows, batch_size, dedup)
+        report(f"insert, {label}", cnt, t.elapsed)
+        tables, _ = table_bytes(db)
+        stored: int = sum(1 for _ in db.record_iter_by_host(1))
+        print(f"{'':<40} {stored} records stored, {tables / cnt:.1f} bytes/record")
+        with Timer() as t:
+            got: int = sum(1 for _ in db.record_iter_by_host(1, expand=True))
+        report(f"fetch expanded, {label}", got, t.elapsed)
+        assert got == cnt
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=100000,
+                      help="Number of records to insert")
+    argp.add_argument("-b", "--batch", type=int, default=1000,
+                      help="Batch size")
+    argp.add_argument("-w", "--windows", type=int, nargs="+", default=[300, 600, 3600],
+                      help="Windows to try, in seconds")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_dedup(folder, args.count, args.batch, args.windows)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:35:36 krylon>
+#
+# /data/code/python/silo/bench/pool.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.pool
+
+Compare opening a connection per lookup with checking one out of a DBPool.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+from threading import Thread
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.database import Database, DBPool
+
+
+def lookups(pool: DBPool, cnt: int, name: str) -> None:
+    """Look up a Host cnt times, each time on a connection from pool."""
+    for _ in range(cnt):
+        with pool.reader() as db:
+            db.host_get_by_name(name)
+
+
+def bench_pool(folder: str, cnt: int, threads: int, readers: int) -> None:
+    """Look up Hosts on fresh connections, then on pooled ones from several threads."""
+    path: str = db_path(folder, "pool")
+    Database(path).host_get_or_add("bench")
+
+    with Timer() as t:
+        for _ in range(cnt):
+            Database(path).host_get_by_name("bench")
+    report("fresh connection per lookup", cnt, t.elapsed)
+
+    pool = DBPool(path, readers=readers)
+    workers = [Thread(target=lookups, args=(pool, cnt, "bench")) for _ in range(threads)]
+    with Timer() as t:
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    report(f"pooled, {threads} threads, {readers} readers", cnt * threads, t.elapsed)
+    stats = pool.stats()["read"]
+    print(f"{'checkout latency':<40} avg {stats.checkout_avg * 1e6:8.1f}µs "
+          f"max {stats.checkout_max * 1e3:8.3f}ms")
+    print(f"{'pool saturation':<40} {stats.created} opened, peak {stats.peak}/{stats.size}, "
+          f"{stats.waits} of {stats.checkouts} checkouts waited")
+    pool.close()
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=2000,
+                      help="Number of lookups per thread")
+    argp.add_argument("-t", "--threads", type=int, default=8,
+                      help="Number of threads")
+    argp.add_argument("-r", "--readers", type=int, default=4,
+                      help="Number of read-only connections in the pool")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_pool(folder, args.count, args.threads, args.readers)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/bench/reader.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.reader
+
+Compare reading a log file line by line to scanning a memory map of it,
+into Records or a RecordBatch.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import os
+import tracemalloc
+from typing import Callable, Sized
+
+from silo.bench import Timer, report, scratch_dir
+from silo.bench.backfill import generate
+from silo.data import Record, RecordBatch
+from silo.extractor.formats import LineParser
+from silo.extractor.logfile import Tail
+from silo.extractor.mapped import read_file, read_file_batch
+
+
+def read_lines(path: str) -> list[Record]:
+    """Read the file the way Tail does with small files, line by line."""
+    t = Tail(path)
+    t.open()
+    records = t.parse(t.poll())
+    t.close()
+    return records
+
+
+def read_mapped(path: str) -> list[Record]:
+    """Read the file from a memory map."""
+    records, _ = read_file(path, LineParser())
+    return records
+
+
+def read_batch(path: str) -> RecordBatch:
+    """Read the file from a memory map into a RecordBatch."""
+    batch, _ = read_file_batch(path, LineParser())
+    return batch
+
+
+def bench_read(path: str) -> None:
+    """Parse the file at path in different ways."""
+    mib: float = os.path.getsize(path) / 2**20
+    print(f"Parsing {path} ({mib:.0f} MiB)")
+
+    variants: list[tuple[str, Callable[[str], Sized]]] = [
+        ("line by line", read_lines),
+        ("mmap", read_mapped),
+        ("mmap, RecordBatch", read_batch),
+    ]
+    for label, fn in variants:
+        with Timer() as t:
+            cnt: int = len(fn(path))
+        report(f"{label} ({mib / t.elapsed:.0f} MiB/s)", cnt, t.elapsed)
+
+        tracemalloc.start()
+        fn(path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<40} peak memory {peak / 2**20:.1f} MiB")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-s", "--size", type=int, default=64,
+                      help="Size of the generated log file in MiB")
+    argp.add_argument("-f", "--file", default="",
+                      help="Parse this file instead of generating one")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        path: str = args.file
+        if path == "":
+            path = os.path.join(folder, "messages")
+            generate(path, args.size * 2**20)
+        bench_read(path)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:38:35 krylon>
+#
+# /data/code/python/silo/bench/rollup.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.rollup
+
+Compare counting records per minute from the rollups with counting the records themselves.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+from datetime import datetime
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.bench.storage import sample_records
+from silo.database import HOUR, MINUTE, Database, RollupKey
+
+
+def bench_rollup(folder: str, cnt: int, hosts: int) -> None:
+    """Insert records of several Hosts, then build histograms and rankings both ways."""
+    db = Database(db_path(folder, "rollup"))
+    records = sample_records(cnt, 0)
+    ids: list[int] = [db.host_get_or_add(f"host{i:03d}").host_id for i in range(hosts)]
+    for i, r in enumerate(records):
+        r.host_id = ids[i % hosts]
+    with Timer() as t:
+        db.record_add_batch(records, False)
+    report("insert, with rollups", cnt, t.elapsed)
+    begin: datetime = records[0].timestamp
+    end: datetime = records[-1].timestamp
+    del records
+
+    with Timer() as t:
+        hist = db.rollup_histogram(begin, end, MINUTE)
+    report("histogram per minute from rollups", len(hist), t.elapsed)
+
+    t1: int = int(begin.timestamp())
+    t2: int = int(end.timestamp())
+    cur = db.db.cursor()
+    with Timer() as t:
+        raw: list[tuple[int, int]] = []
+        for part in db.partition_list():
+            cur.execute(f"""
+            SELECT timestamp - timestamp % {MINUTE}, COUNT(*)
+            FROM {part.name}
+            WHERE timestamp BETWEEN ? AND ?
+            GROUP BY 1
+            """, (t1, t2))
+            raw.extend(cur.fetchall())
+    report("histogram per minute from records", len(raw), t.elapsed)
+    assert sum(c for _, c in raw) == sum(c for _, c in hist)
+
+    with Timer() as t:
+        top = db.rollup_top(RollupKey.Source, begin, end, width=HOUR)
+    report("top sources from rollups", len(top), t.elapsed)
+    with Timer() as t:
+        raw = []
+        for part in db.partition_list():
+            cur.execute(f"""
+            SELECT source_id, COUNT(*)
+            FROM {part.name}
+            WHERE timestamp BETWEEN ? AND ?
+            GROUP BY 1
+            """, (t1, t2))
+            raw.extend(cur.fetchall())
+    report("top sources from records", len(raw), t.elapsed)
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=500000,
+                      help="Number of records to insert")
+    argp.add_argument("-H", "--hosts", type=int, default=20,
+                      help="Number of Hosts")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_rollup(folder, args.count, args.hosts)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
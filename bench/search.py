@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 18:58:29 krylon>
+#
+# /data/code/python/silo/bench/search.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.search
+
+Compare full text search to scanning the record table with LIKE.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+
+from silo.bench import Timer, db_path, fake_records, scratch_dir
+from silo.data import Host
+from silo.database import Database
+
+
+def bench_search(folder: str, cnt: int, rounds: int) -> None:
+    """Fill a database with cnt records and time some searches."""
+    db = Database(db_path(folder, "search"))
+    host = Host(name="bench")
+    db.host_add(host)
+    db.record_add_batch(fake_records(cnt, host.host_id), False)
+
+    # A term that matches a handful of records, one that matches none,
+    # and one that matches all of them.
+    parts = [p.name for p in db.partition_list()]
+    for term in ("host42", "nosuchword", "tries"):
+        with Timer() as t:
+            for _ in range(rounds):
+                hits: list = []
+                for part in parts:
+                    cur = db.db.execute(f"SELECT id FROM {part} WHERE message LIKE ? LIMIT 100",
+                                        (f"%{term}%", ))
+                    hits.extend(cur.fetchall())
+                    if len(hits) >= 100:
+                        break
+        print(f"{'LIKE':<24} {term:<12} {t.elapsed / rounds * 1000:10.3f} ms/query")
+
+        for by_rank in (True, False):
+            with Timer() as t:
+                for _ in range(rounds):
+                    db.record_search(term, by_rank=by_rank)
+            label: str = "record_search (rank)" if by_rank else "record_search (recent)"
+            print(f"{label:<24} {term:<12} {t.elapsed / rounds * 1000:10.3f} ms/query")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=200000,
+                      help="Number of records in the database")
+    argp.add_argument("-r", "--rounds", type=int, default=20,
+                      help="Number of times each search is run")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_search(folder, args.count, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
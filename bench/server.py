@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 18:48:06 krylon>
+#
+# /data/code/python/silo/bench/server.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.server
+
+Measure how many records per second agents can push to the server over the
+loopback interface, for different batch sizes and pipeline windows, with the
+threaded and the asyncio server, optionally while a crowd of idle agents
+holds connections open.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+from threading import Event, Thread
+from typing import Callable
+
+from silo import protocol
+from silo.bench import Timer, fake_records, report, scratch_dir
+from silo.client import Client
+from silo.server import AsyncServer, Server
+
+
+def send_all(port: int, name: str, cnt: int, batch: int, window: int) -> None:
+    """Send cnt records to the server in batches of the given size."""
+    records = fake_records(cnt)
+    with Client("127.0.0.1", port, name, window) as c:
+        for i in range(0, cnt, batch):
+            c.send(records[i:i+batch])
+
+
+def start_threaded(path: str) -> tuple[int, Callable[[], None]]:
+    """Start a threaded Server, return its port and a function to stop it."""
+    srv = Server(("127.0.0.1", 0), path)
+    Thread(target=srv.serve_forever, daemon=True).start()
+
+    def stop() -> None:
+        srv.shutdown()
+        srv.server_close()
+
+    return srv.server_address[1], stop
+
+
+def start_async(path: str) -> tuple[int, Callable[[], None]]:
+    """Start an AsyncServer on its own event loop thread.
+
+    Return its port and a function to stop it.
+    """
+    loop = asyncio.new_event_loop()
+    srv = AsyncServer(("127.0.0.1", 0), path)
+    ready = Event()
+
+    def run() -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(srv.start())
+        ready.set()
+        loop.run_forever()
+
+    Thread(target=run, daemon=True).start()
+    ready.wait()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(srv.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return srv.port, stop
+
+
+def open_idle(port: int, cnt: int) -> list[socket.socket]:
+    """Open cnt connections that say Hello and then nothing at all."""
+    conns: list[socket.socket] = []
+    for n in range(cnt):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(protocol.encode_hello(f"idle{n:05d}"))
+        conns.append(sock)
+    return conns
+
+
+def bench_ingest(folder: str, mode: str, cnt: int, agents: int, batch: int,
+                 window: int, idle: int) -> None:
+    """Run one round of the benchmark against a fresh server."""
+    path: str = os.path.join(folder, f"{mode}_{batch}_{window}_{idle}.db")
+    if mode == "async":
+        port, stop = start_async(path)
+    else:
+        port, stop = start_threaded(path)
+    per_agent: int = cnt // agents
+    conns = open_idle(port, idle)
+    try:
+        with Timer() as t:
+            senders = [Thread(target=send_all,
+                              args=(port, f"agent{n:02d}", per_agent, batch, window))
+                       for n in range(agents)]
+            for s in senders:
+                s.start()
+            for s in senders:
+                s.join()
+            for c in conns:
+                c.close()
+            stop()
+        report(f"{mode}, {idle} idle, {agents} agent(s), batch {batch}, window {window}",
+               per_agent * agents,
+               t.elapsed)
+    finally:
+        for c in conns:
+            c.close()
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=20000,
+                      help="Number of records to send")
+    argp.add_argument("-a", "--agents", type=int, default=4,
+                      help="Number of agents sending in parallel")
+    argp.add_argument("-i", "--idle", type=int, default=0,
+                      help="Number of idle connections to keep open during the run")
+    argp.add_argument("-m", "--mode", choices=("threaded", "async", "both"), default="both",
+                      help="Which server to benchmark")
+    args = argp.parse_args()
+
+    # Each idle connection costs us a file descriptor on both ends.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want: int = 2 * args.idle + 256
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(want, hard), hard))
+
+    modes = ("threaded", "async") if args.mode == "both" else (args.mode, )
+    with scratch_dir() as folder:
+        for mode in modes:
+            # One record per batch and waiting for every Ack is what
+            # line-at-a-time shipping would look like.
+            for batch, window in ((1, 1), (100, 1), (500, 16)):
+                bench_ingest(folder, mode, args.count, args.agents, batch, window, args.idle)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:15:10 krylon>
+#
+# /data/code/python/silo/bench/storage.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.storage
+
+Compare the size and insert throughput of plain and compact storage.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import glob
+import os
+from datetime import datetime, timedelta
+
+from silo.bench import Timer, db_path, fake_records, report, scratch_dir
+from silo.data import Record
+from silo.database import Database
+from silo.extractor.formats import line_pat
+
+
+def sample_records(cnt: int, host_id: int) -> list[Record]:
+    """Return cnt Records made from the sample logs that come with the extractors."""
+    folder: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "extractor")
+    lines: list[tuple[str, str]] = []
+    for path in sorted(glob.glob(os.path.join(folder, "messages.*")) +
+                       glob.glob(os.path.join(folder, "daemon.*"))):
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                m = line_pat.match(line.rstrip("\n"))
+                if m is not None:
+                    lines.append((m[3], m[4]))
+    start: datetime = datetime.now() - timedelta(seconds=cnt)
+    return [Record(host_id=host_id,
+                   timestamp=start + timedelta(seconds=i),
+                   source=lines[i % len(lines)][0],
+                   message=lines[i % len(lines)][1])
+            for i in range(cnt)]
+
+
+# Words to build digit-free messages from.
+WORDS: list[str] = """
+accepted agent alpha bad broken cache client closed connection daemon denied device
+disk error failed filter found gateway host invalid kernel link lost missing mount
+network offline peer queue refused remote reset resolver route server service session
+socket stale timeout unknown upstream user warning zone
+""".split()
+
+
+def wordy_records(cnt: int, host_id: int) -> list[Record]:
+    """Return cnt Records whose messages contain no digits and are all different.
+
+    Each message spells out its index in words, so none of them has a
+    parameter to split off, the worst case for compact storage.
+    """
+    start: datetime = datetime.now() - timedelta(seconds=cnt)
+    records: list[Record] = []
+    for i in range(cnt):
+        words: list[str] = []
+        n: int = i
+        for _ in range(5):
+            n, idx = divmod(n, len(WORDS))
+            words.append(WORDS[idx])
+        records.append(Record(host_id=host_id,
+                              timestamp=start + timedelta(seconds=i),
+                              source=WORDS[i % 7],
+                              message=" ".join(words)))
+    return records
+
+
+def table_bytes(db: Database) -> tuple[int, int]:
+    """Return the bytes used by the record partitions and their lookup tables,
+    and those used by the whole database file."""
+    cur = db.db.cursor()
+    cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    cur.execute("""
+    SELECT SUM(pgsize) FROM dbstat
+    WHERE name IN ('source', 'template')
+       OR name IN (SELECT name FROM record_partition)
+       OR name IN (SELECT name FROM sqlite_master
+                   WHERE type = 'index'
+                     AND tbl_name IN (SELECT name FROM record_partition))
+    """)
+    tables: int = cur.fetchone()[0]
+    return tables, os.path.getsize(db.path)
+
+
+def bench_storage(folder: str, cnt: int, batch_size: int) -> None:
+    """Insert the same Records in plain and compact mode and compare."""
+    for kind, gen in (("fake", fake_records),
+                      ("sample", sample_records),
+                      ("wordy", wordy_records)):
+        for compact in (False, True):
+            label: str = f"{kind}, {'compact' if compact else 'plain'}"
+            db = Database(db_path(folder, f"{kind}_{compact}"), compact=compact)
+            host = db.host_get_or_add("bench")
+            records = gen(cnt, host.host_id)
+            with Timer() as t:
+                db.record_add_batch(records, False, batch_size)
+            report(label, cnt, t.elapsed)
+            tables, total = table_bytes(db)
+            templates: int = db.db.execute("SELECT COUNT(*) FROM template").fetchone()[0]
+            print(f"{'':<40} {tables / cnt:10.1f} bytes/record in tables and indices, "
+                  f"{total / cnt:.1f} bytes/record in total")
+            print(f"{'':<40} {templates:10d} templates, "
+                  f"{len(db.templates.ids)} of them cached")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=100000,
+                      help="Number of records to insert")
+    argp.add_argument("-b", "--batch", type=int, default=1000,
+                      help="Batch size")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_storage(folder, args.count, args.batch)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
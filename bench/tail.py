@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:56:13 krylon>
+#
+# /data/code/python/silo/bench/tail.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.tail
+
+Compare ingest with viewers polling the database and viewers subscribed to a TailHub.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from threading import Event, Thread
+
+from silo.bench import Timer, db_path, report, scratch_dir
+from silo.bench.storage import sample_records
+from silo.data import RecordRow
+from silo.database import Database
+from silo.ingest import IngestQueue
+from silo.tail import Subscription, TailFilter, TailHub
+
+
+def poll(path: str, begin: datetime, interval: float, stop: Event, counts: list[int]) -> None:
+    """Fetch new records every interval seconds, the way a viewer without a TailHub would."""
+    db = Database(path)
+    queries: int = 0
+    fetched: int = 0
+    end: datetime = datetime.now() + timedelta(days=1)
+    while not stop.wait(interval):
+        records = db.record_get_by_period(begin, end)
+        queries += 1
+        fetched += len(records)
+        if records:
+            begin = max(r.timestamp for r in records) + timedelta(seconds=1)
+    db.close()
+    counts.append(queries)
+    counts.append(fetched)
+
+
+def drain(sub: Subscription, stop: Event) -> None:
+    """Pick up records from a Subscription until told to stop, like a viewer that keeps up."""
+    while not stop.is_set():
+        sub.get(0.1)
+
+
+def bench_tail(folder: str, cnt: int, viewers: int, interval: float) -> None:
+    """Ingest the same records with no viewers, polling viewers and subscribed ones."""
+    records = sample_records(cnt, 1)
+    rows: list[RecordRow] = [(1, int(r.timestamp.timestamp()), r.source, r.message)
+                             for r in records]
+    begin: datetime = records[0].timestamp - timedelta(seconds=1)
+    del records
+    for mode in ("no viewers", "polling", "tail"):
+        path: str = db_path(folder, mode.replace(" ", "_"))
+        Database(path).host_get_or_add("bench")
+        hub = TailHub()
+        hub.start()
+        stop = Event()
+        counts: list[int] = []
+        threads: list[Thread] = []
+        subs: list[Subscription] = []
+        if mode == "polling":
+            threads = [Thread(target=poll, args=(path, begin, interval, stop, counts))
+                       for _ in range(viewers)]
+        elif mode == "tail":
+            # Half of the viewers keep up, the others never look.
+            for i in range(viewers):
+                sub = hub.subscribe(TailFilter(substring="" if i % 4 else "error"))
+                subs.append(sub)
+                if i % 2 == 0:
+                    threads.append(Thread(target=drain, args=(sub, stop)))
+        for th in threads:
+            th.start()
+
+        ingest = IngestQueue(path, tail=hub)
+        ingest.start()
+        with Timer() as t:
+            for i in range(0, len(rows), 500):
+                ingest.put_rows(rows[i:i + 500])
+            ingest.stop()
+        report(f"ingest, {mode}", len(rows), t.elapsed)
+        stop.set()
+        hub.stop()
+        for th in threads:
+            th.join()
+        if mode == "polling":
+            print(f"{'':<40} {sum(counts[0::2])} queries fetched {sum(counts[1::2])} records")
+        elif mode == "tail":
+            stats = hub.stats()
+            print(f"{'':<40} {stats.delivered} records delivered, {stats.dropped} dropped, "
+                  f"{stats.lost} lost")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=200000,
+                      help="Number of records to ingest")
+    argp.add_argument("-v", "--viewers", type=int, default=8,
+                      help="Number of viewers")
+    argp.add_argument("-i", "--interval", type=float, default=0.1,
+                      help="Seconds between two queries of a polling viewer")
+    args = argp.parse_args()
+
+    with scratch_dir() as folder:
+        bench_tail(folder, args.count, args.viewers, args.interval)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
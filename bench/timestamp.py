@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:07:27 krylon>
+#
+# /data/code/python/silo/bench/timestamp.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.timestamp
+
+Compare parsing syslog timestamps with dateutil to SyslogTimestamp.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import glob
+import os
+
+from dateutil import parser
+
+from silo.bench import Timer, report
+from silo.extractor.formats import line_pat
+from silo.extractor.timestamp import SyslogTimestamp
+
+
+def sample_stamps(cnt: int) -> list[str]:
+    """Return cnt timestamps from the sample logs, in the order they appear there."""
+    folder: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "extractor")
+    stamps: list[str] = []
+    for path in sorted(glob.glob(os.path.join(folder, "messages.*")) +
+                       glob.glob(os.path.join(folder, "daemon.*"))):
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                m = line_pat.match(line)
+                if m is not None:
+                    stamps.append(m[1])
+    return [stamps[i % len(stamps)] for i in range(cnt)]
+
+
+def bench_parse(cnt: int) -> None:
+    """Parse cnt timestamps in different ways."""
+    stamps = sample_stamps(cnt)
+
+    with Timer() as t:
+        for s in stamps:
+            parser.parse(s)
+    report("dateutil.parser.parse", cnt, t.elapsed)
+
+    with Timer() as t:
+        clock = SyslogTimestamp()
+        for s in stamps:
+            clock.parse(s)
+    report("SyslogTimestamp", cnt, t.elapsed)
+
+    # Every timestamp differs from the one before, so the memo never helps.
+    unique = [f"Aug {1 + i // 86400 % 28:2d} {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+              for i in range(cnt)]
+    with Timer() as t:
+        clock = SyslogTimestamp()
+        for s in unique:
+            clock.parse(s)
+    report("SyslogTimestamp (no repeats)", cnt, t.elapsed)
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=200000,
+                      help="Number of timestamps to parse")
+    args = argp.parse_args()
+    bench_parse(args.count)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
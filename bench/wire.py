@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:26:01 krylon>
+#
+# /data/code/python/silo/bench/wire.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.bench.wire
+
+Compare the size and cost of the ways records can be sent to the server.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import json
+import zlib
+from typing import Callable
+
+from silo import encoding, protocol
+from silo.bench import Timer, report
+from silo.bench.storage import sample_records
+from silo.data import Record, RecordRow
+from silo.protocol import Codec
+
+
+def bench_wire(cnt: int, batch_size: int) -> None:
+    """Encode and decode cnt records in different ways."""
+    records: list[Record] = sample_records(cnt, 1)
+    batches: list[list[Record]] = [records[i:i + batch_size]
+                                   for i in range(0, cnt, batch_size)]
+    raw: int = sum(len(r.source) + len(r.message) for r in records)
+    print(f"{cnt} records, {raw / cnt:.1f} bytes of source and message each")
+
+    def single() -> list[bytes]:
+        return [protocol.encode_batch(i, [r]) for i, r in enumerate(records)]
+
+    def plain() -> list[bytes]:
+        return [protocol.encode_batch(i, b) for i, b in enumerate(batches)]
+
+    def packed(codec: Codec) -> Callable[[], list[bytes]]:
+        def encode() -> list[bytes]:
+            return [protocol.encode_packed(i, codec, protocol.pack_records(b, codec))
+                    for i, b in enumerate(batches)]
+        return encode
+
+    variants: list[tuple[str, Callable[[], list[bytes]]]] = [
+        ("one record per batch", single),
+        (f"batches of {batch_size}", plain),
+        (f"batches of {batch_size}, zlib", packed(Codec.Zlib)),
+        (f"batches of {batch_size}, lzma", packed(Codec.LZMA)),
+    ]
+    for label, encode in variants:
+        with Timer() as t:
+            frames = encode()
+        report(f"encode {label}", cnt, t.elapsed)
+        with Timer() as t:
+            for fr in frames:
+                if fr[4] == protocol.FrameType.Packed:
+                    protocol.decode_packed(fr[protocol.header.size:])
+                else:
+                    protocol.decode_batch(fr[protocol.header.size:])
+        report(f"decode {label}", cnt, t.elapsed)
+        size: int = sum(len(fr) for fr in frames)
+        print(f"{label:<40} {size / cnt:10.1f} bytes/record on the wire")
+
+
+def bench_encoding(cnt: int, batch_size: int) -> None:
+    """Compare the binary encoding of silo.encoding to JSON, without compression.
+
+    Decoding ends with rows ready for the database in both cases.
+    """
+    records: list[Record] = sample_records(cnt, 1)
+    batches: list[list[Record]] = [records[i:i + batch_size]
+                                   for i in range(0, cnt, batch_size)]
+
+    def json_encode(b: list[Record]) -> bytes:
+        return json.dumps([(int(r.timestamp.timestamp()), r.source, r.message) for r in b],
+                          ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    def json_decode(blob: bytes) -> list[RecordRow]:
+        return protocol.wire_to_rows(json.loads(blob), 1)
+
+    variants: list[tuple[str, Callable[[list[Record]], bytes], Callable[[bytes], list]]] = [
+        ("JSON", json_encode, json_decode),
+        ("binary", encoding.encode, lambda blob: encoding.decode(blob, 1)),
+    ]
+    for label, enc, dec in variants:
+        with Timer() as t:
+            blobs = [enc(b) for b in batches]
+        report(f"encode {label}", cnt, t.elapsed)
+        with Timer() as t:
+            for blob in blobs:
+                dec(blob)
+        report(f"decode {label}", cnt, t.elapsed)
+        size: int = sum(len(blob) for blob in blobs)
+        packed: int = sum(len(zlib.compress(blob)) for blob in blobs)
+        print(f"{label:<40} {size / cnt:10.1f} bytes/record, {packed / cnt:.1f} with zlib")
+
+
+def main() -> None:
+    """Parse the command line and run the benchmark."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-n", "--count", type=int, default=100000,
+                      help="Number of records to encode")
+    argp.add_argument("-b", "--batch-size", type=int, default=1000,
+                      help="Number of records per batch")
+    args = argp.parse_args()
+    bench_encoding(args.count, args.batch_size)
+    bench_wire(args.count, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:29:36 krylon>
+#
+# /data/code/python/silo/client.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.client
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import socket
+from collections import deque
+from typing import BinaryIO, Final, Iterator, Optional
+
+from silo import common, protocol
+from silo.data import Record
+from silo.encoding import NamedRow
+from silo.protocol import Codec, FrameType, ProtocolError
+
+DEFAULT_WINDOW: Final[int] = 16
+
+# Number of seconds to wait for the server to accept a connection.
+CONNECT_TIMEOUT: Final[float] = 10.0
+
+# Number of seconds to wait for the server to take or send a frame before
+# we give up on the connection.
+DEFAULT_TIMEOUT: Final[float] = 60.0
+
+# A tail subscription sits idle between records, but the server sends an
+# empty batch every few seconds, so this is a lot longer than that.
+TAIL_TIMEOUT: Final[float] = 60.0
+
+
+class Client:
+    """Client sends Records to a Silo server.
+
+    Up to window Batches may be in flight at any time before send() waits
+    for the server to acknowledge the oldest one.
+
+    If the server does not take a Batch or send an Ack within timeout
+    seconds, socket.timeout (an OSError) is raised, and the Client should be
+    closed, since the connection is in an unknown state.
+    """
+
+    __slots__ = [
+        "addr",
+        "name",
+        "window",
+        "timeout",
+        "sock",
+        "rfile",
+        "seq",
+        "pending",
+        "acked",
+    ]
+
+    addr: tuple[str, int]
+    name: str
+    window: int
+    timeout: float
+    sock: Optional[socket.socket]
+    rfile: Optional[BinaryIO]
+    seq: int
+    pending: deque[tuple[int, int]]
+    acked: int
+
+    def __init__(self,
+                 host: str,
+                 port: int = common.DEFAULT_PORT,
+                 name: str = "",
+                 window: int = DEFAULT_WINDOW,
+                 timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.addr = (host, port)
+        self.name = name or socket.gethostname()
+        self.window = max(window, 1)
+        self.timeout = timeout
+        self.sock = None
+        self.rfile = None
+        self.seq = 0
+        self.pending = deque()
+        self.acked = 0
+
+    def __enter__(self) -> "Client":
+        self.connect()
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        if ex_type is None:
+            self.drain()
+        self.close()
+        return False
+
+    def connect(self) -> None:
+        """Connect to the server and introduce ourselves."""
+        self.sock = socket.create_connection(self.addr, min(self.timeout, CONNECT_TIMEOUT))
+        self.sock.settimeout(self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+        self.sock.sendall(protocol.encode_hello(self.name))
+
+    def close(self) -> None:
+        """Close the connection. Batches that have not been acknowledged are forgotten."""
+        if self.rfile is not None:
+            self.rfile.close()
+            self.rfile = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.pending.clear()
+
+    def send(self, records: list[Record]) -> int:
+        """Send a Batch of Records and return its sequence number."""
+        assert self.sock is not None
+        while len(self.pending) >= self.window:
+            self.__wait_ack()
+        self.seq += 1
+        self.sock.sendall(protocol.encode_batch(self.seq, records))
+        self.pending.append((self.seq, len(records)))
+        return self.seq
+
+    def send_packed(self, codec: Codec, blob: bytes, count: int) -> int:
+        """Send count Records compressed by protocol.pack_records, return the sequence number."""
+        assert self.sock is not None
+        while len(self.pending) >= self.window:
+            self.__wait_ack()
+        self.seq += 1
+        self.sock.sendall(protocol.encode_packed(self.seq, codec, blob))
+        self.pending.append((self.seq, count))
+        return self.seq
+
+    def drain(self) -> None:
+        """Wait until the server has acknowledged all Batches we sent."""
+        while self.pending:
+            self.__wait_ack()
+
+    def __wait_ack(self) -> None:
+        """Wait for the Ack of the oldest Batch in flight."""
+        assert self.rfile is not None
+        fr = protocol.read_frame(self.rfile)
+        if fr is None:
+            raise ConnectionError("Server closed the connection")
+        ftype, payload = fr
+        if ftype == FrameType.Error:
+            raise ProtocolError(payload.decode("utf-8", "replace"))
+        if ftype != FrameType.Ack:
+            raise ProtocolError(f"Expected Ack, got {ftype.name}")
+        seq, cnt = protocol.decode_ack(payload)
+        expect, expect_cnt = self.pending.popleft()
+        if seq != expect or cnt != expect_cnt:
+            raise ProtocolError(f"Got Ack for batch {seq}/{cnt}, expected {expect}/{expect_cnt}")
+        self.acked += cnt
+
+
+class TailClient:
+    """TailClient follows the records a Silo server receives, like tail -f.
+
+    Only records matching the filter - a host name, a source and a substring
+    the message must contain, any of them left empty to match everything -
+    are sent. dropped counts the records the server had to drop because we
+    did not keep up. If the server goes silent for timeout seconds,
+    socket.timeout is raised.
+    """
+
+    __slots__ = [
+        "addr",
+        "host",
+        "source",
+        "substring",
+        "backlog",
+        "timeout",
+        "sock",
+        "rfile",
+        "dropped",
+    ]
+
+    addr: tuple[str, int]
+    host: str
+    source: str
+    substring: str
+    backlog: int
+    timeout: float
+    sock: Optional[socket.socket]
+    rfile: Optional[BinaryIO]
+    dropped: int
+
+    def __init__(self,
+                 server: str,
+                 port: int = common.DEFAULT_PORT,
+                 host: str = "",
+                 source: str = "",
+                 substring: str = "",
+                 backlog: int = 0,
+                 timeout: float = TAIL_TIMEOUT) -> None:
+        self.addr = (server, port)
+        self.host = host
+        self.source = source
+        self.substring = substring
+        self.backlog = backlog
+        self.timeout = timeout
+        self.sock = None
+        self.rfile = None
+        self.dropped = 0
+
+    def __enter__(self) -> "TailClient":
+        self.connect()
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        self.close()
+        return False
+
+    def connect(self) -> None:
+        """Connect to the server and subscribe."""
+        self.sock = socket.create_connection(self.addr, min(self.timeout, CONNECT_TIMEOUT))
+        self.sock.settimeout(self.timeout)
+        self.rfile = self.sock.makefile("rb")
+        self.sock.sendall(protocol.encode_subscribe(self.host,
+                                                    self.source,
+                                                    self.substring,
+                                                    self.backlog))
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self.rfile is not None:
+            self.rfile.close()
+            self.rfile = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def batches(self) -> Iterator[list[NamedRow]]:
+        """Yield records as (host name, timestamp, source, message) as the server sends them.
+
+        The server sends an empty batch every few seconds when nothing
+        matches. The iterator ends when the server hangs up.
+        """
+        assert self.rfile is not None
+        while (fr := protocol.read_frame(self.rfile)) is not None:
+            ftype, payload = fr
+            if ftype == FrameType.Error:
+                raise ProtocolError(payload.decode("utf-8", "replace"))
+            if ftype != FrameType.Tail:
+                raise ProtocolError(f"Expected Tail, got {ftype.name}")
+            self.dropped, rows = protocol.decode_tail(payload)
+            yield rows
+
+    def records(self) -> Iterator[NamedRow]:
+        """Yield records one by one, see batches()."""
+        for rows in self.batches():
+            yield from rows
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
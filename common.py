@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 20:22:03 krylon>
+# Time-stamp: <2026-10-18 19:21:34 krylon>
 #
 # /data/code/python/silo/common.py
 # created on 09. 08. 2024
@@ -57,6 +57,14 @@ class Path:
         """Return the path to the log file"""
         return os.path.join(self.__base, f"{APP_NAME.lower()}.log")
 
+    def checkpoint(self) -> str:
+        """Return the path to the file the extractors keep their checkpoints in"""
+        return os.path.join(self.__base, f"{APP_NAME.lower()}.checkpoint")
+
+    def spool(self) -> str:
+        """Return the path to the folder the agent keeps unsent batches in"""
+        return os.path.join(self.__base, "spool")
+
 
 path: Path = Path(os.path.expanduser(f"~/.{APP_NAME.lower()}.d"))
 
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-10 22:42:37 krylon>
+# Time-stamp: <2026-10-18 20:12:48 krylon>
 #
 # /data/code/python/silo/data.py
 # created on 09. 08. 2024
@@ -16,8 +16,10 @@ silo.data
 (c) 2024 Benjamin Walkenhorst
 """
 
+from array import array
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Final, Iterable, Iterator
 
 
 @dataclass(slots=True, kw_only=True)
@@ -31,13 +33,174 @@ class Host:
 
 @dataclass(slots=True, kw_only=True)
 class Record:
-    """Record represents a single log record."""
+    """Record represents a single log record.
+
+    repeats counts the identical records that were collapsed into this one
+    on ingest, see silo.dedup.
+    """
 
     record_id: int = 0
     host_id: int = 0
     timestamp: datetime
     source: str
     message: str
+    repeats: int = 0
+
+
+# A Record as it goes into the database: (host_id, timestamp, source, message),
+# the timestamp given in seconds since the epoch. Decoders hand these to the
+# database directly, so they don't need to build a Record for every line.
+RecordRow = tuple[int, int, str, str]
+
+# The range of timestamps the database can store, SQLite's integers are 64 bit.
+STAMP_MIN: Final[int] = -2**63
+STAMP_MAX: Final[int] = 2**63 - 1
+
+
+class RecordBatch:
+    """RecordBatch holds many records column by column.
+
+    Timestamps, in seconds since the epoch, host IDs and record IDs live in
+    arrays, sources are interned and referred to by their index in sources,
+    only the messages are a list of strings. So a batch costs a handful of
+    objects plus one string per message, where a list of Records costs
+    a Record and a datetime per line.
+
+    Records are only built when somebody asks for them, e.g. by indexing
+    or iterating over the batch.
+    """
+
+    __slots__ = [
+        "ids",
+        "stamps",
+        "hosts",
+        "source_idx",
+        "sources",
+        "source_map",
+        "messages",
+    ]
+
+    ids: array
+    stamps: array
+    hosts: array
+    source_idx: array
+    sources: list[str]
+    source_map: dict[str, int]
+    messages: list[str]
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.stamps = array("q")
+        self.hosts = array("q")
+        self.source_idx = array("I")
+        self.sources = []
+        self.source_map = {}
+        self.messages = []
+
+    @classmethod
+    def from_records(cls, records: Iterable[Record]) -> "RecordBatch":
+        """Build a batch from Records."""
+        batch = cls()
+        for r in records:
+            batch.append(r)
+        return batch
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[RecordRow]) -> "RecordBatch":
+        """Build a batch from (host_id, timestamp, source, message) tuples."""
+        batch = cls()
+        for host_id, stamp, source, message in rows:
+            batch.add(host_id, stamp, source, message)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __getitem__(self, idx: int) -> Record:
+        return Record(record_id=self.ids[idx],
+                      host_id=self.hosts[idx],
+                      timestamp=datetime.fromtimestamp(self.stamps[idx]),
+                      source=self.sources[self.source_idx[idx]],
+                      message=self.messages[idx])
+
+    def __iter__(self) -> Iterator[Record]:
+        last: int = 0
+        stamp: datetime = datetime.fromtimestamp(0)
+        for i, rid in enumerate(self.ids):
+            if self.stamps[i] != last:
+                last = self.stamps[i]
+                stamp = datetime.fromtimestamp(last)
+            yield Record(record_id=rid,
+                         host_id=self.hosts[i],
+                         timestamp=stamp,
+                         source=self.sources[self.source_idx[i]],
+                         message=self.messages[i])
+
+    def intern(self, source: str) -> int:
+        """Return the index of source in the batch's source table, adding it if needed."""
+        idx = self.source_map.get(source)
+        if idx is None:
+            idx = self.source_map[source] = len(self.sources)
+            self.sources.append(source)
+        return idx
+
+    def add(self, host_id: int, stamp: int, source: str, message: str, record_id: int = 0) -> None:
+        """Add a record to the batch."""
+        self.ids.append(record_id)
+        self.stamps.append(stamp)
+        self.hosts.append(host_id)
+        self.source_idx.append(self.intern(source))
+        self.messages.append(message)
+
+    def append(self, rec: Record) -> None:
+        """Add a Record to the batch."""
+        self.add(rec.host_id,
+                 int(rec.timestamp.timestamp()),
+                 rec.source,
+                 rec.message,
+                 rec.record_id)
+
+    def extend(self, other: "RecordBatch") -> None:
+        """Add all records of another batch."""
+        self.ids.extend(other.ids)
+        self.stamps.extend(other.stamps)
+        self.hosts.extend(other.hosts)
+        remap: list[int] = [self.intern(s) for s in other.sources]
+        self.source_idx.extend(remap[i] for i in other.source_idx)
+        self.messages.extend(other.messages)
+
+    def source(self, idx: int) -> str:
+        """Return the source of the record at idx."""
+        return self.sources[self.source_idx[idx]]
+
+    def set_host(self, host_id: int) -> None:
+        """Assign all records to the given Host."""
+        self.hosts = array("q", [host_id]) * len(self)
+
+    def select(self, indices: Iterable[int]) -> "RecordBatch":
+        """Return a new batch holding the records at the given indices, in that order."""
+        batch = RecordBatch()
+        for i in indices:
+            batch.add(self.hosts[i],
+                      self.stamps[i],
+                      self.sources[self.source_idx[i]],
+                      self.messages[i],
+                      self.ids[i])
+        return batch
+
+    def since(self, stamp: int) -> "RecordBatch":
+        """Return the records from stamp on, self if that is all of them."""
+        if all(t >= stamp for t in self.stamps):
+            return self
+        return self.select(i for i, t in enumerate(self.stamps) if t >= stamp)
+
+    def rows(self) -> Iterator[RecordRow]:
+        """Yield the records as (host_id, timestamp, source, message) tuples."""
+        sources = self.sources
+        return zip(self.hosts,
+                   self.stamps,
+                   (sources[i] for i in self.source_idx),
+                   self.messages)
 
 
 # Local Variables: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-13 19:57:04 krylon>
+# Time-stamp: <2026-10-18 20:32:03 krylon>
 #
 # /data/code/python/silo/database.py
 # created on 10. 08. 2024
@@ -17,16 +17,25 @@ silo.database
 """
 
 import logging
+import re
 import sqlite3
-from datetime import datetime
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from enum import Enum, auto
-from threading import Lock, local
-from typing import Final, Optional
+from heapq import heappop, heappush
+from itertools import islice
+from threading import Condition, Lock
+from typing import Callable, Final, Iterable, Iterator, Optional, Union
 
 import krylib
 
 from silo import common
-from silo.data import Host, Record
+from silo.data import Host, Record, RecordBatch, RecordRow
+from silo.dedup import MAX_WINDOW, Deduplicator, Entry, RepeatKey
 
 InitQueries: Final[list[str]] = [
     """
@@ -53,77 +62,970 @@ InitQueries: Final[list[str]] = [
     "CREATE INDEX record_time_idx ON record (timestamp)",
 ]
 
+# Records are stored in partitions, one table per span of time, so old
+# records can be expired by dropping whole tables. Every partition has its
+# own indices and full text index. The partitions are listed in the table
+# record_partition, their time ranges do not overlap.
+#
+# Record IDs are unique across partitions: The IDs of each partition start
+# at the number of days between the epoch and the partition's beginning,
+# shifted left by 32 bits.
+#
+# PartitionLayouts[n] holds the queries that create a partition as of schema
+# version n. Like Migrations, existing layouts are never changed, so that
+# migrations creating partitions get the tables they expect.
+PartitionLayouts: Final[dict[int, list[str]]] = {
+    3: [
+        """
+        CREATE TABLE {part} (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            host_id         INTEGER NOT NULL,
+            timestamp       INTEGER NOT NULL,
+            source          TEXT NOT NULL,
+            message         TEXT NOT NULL,
+            FOREIGN KEY (host_id) REFERENCES host (id)
+                    ON DELETE CASCADE
+                    ON UPDATE RESTRICT
+        ) STRICT
+        """,
+        "CREATE INDEX {part}_host_time_idx ON {part} (host_id, timestamp)",
+        "CREATE INDEX {part}_time_idx ON {part} (timestamp)",
+        """
+        CREATE VIRTUAL TABLE {part}_fts USING fts5(
+            source,
+            message,
+            content='{part}',
+            content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER {part}_fts_add AFTER INSERT ON {part} BEGIN
+            INSERT INTO {part}_fts (rowid, source, message)
+                   VALUES (new.id, new.source, new.message);
+        END
+        """,
+        """
+        CREATE TRIGGER {part}_fts_del AFTER DELETE ON {part} BEGIN
+            INSERT INTO {part}_fts ({part}_fts, rowid, source, message)
+                   VALUES ('delete', old.id, old.source, old.message);
+        END
+        """,
+        """
+        CREATE TRIGGER {part}_fts_upd AFTER UPDATE ON {part} BEGIN
+            INSERT INTO {part}_fts ({part}_fts, rowid, source, message)
+                   VALUES ('delete', old.id, old.source, old.message);
+            INSERT INTO {part}_fts (rowid, source, message)
+                   VALUES (new.id, new.source, new.message);
+        END
+        """,
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('{part}', {base})",
+    ],
+    # The source is interned in the source table. If template_id is NULL,
+    # body is the message. Otherwise, the message is the template's pattern
+    # with the parameters in body filled in, see message_split().
+    # Since the message is not stored as such, the full text index has no
+    # content table to refer to, it is filled by record_add_batch.
+    4: [
+        """
+        CREATE TABLE {part} (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            host_id         INTEGER NOT NULL,
+            timestamp       INTEGER NOT NULL,
+            source_id       INTEGER NOT NULL,
+            template_id     INTEGER,
+            body            TEXT NOT NULL,
+            FOREIGN KEY (host_id) REFERENCES host (id)
+                    ON DELETE CASCADE
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (source_id) REFERENCES source (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (template_id) REFERENCES template (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT
+        ) STRICT
+        """,
+        "CREATE INDEX {part}_host_time_idx ON {part} (host_id, timestamp)",
+        "CREATE INDEX {part}_time_idx ON {part} (timestamp)",
+        """
+        CREATE VIRTUAL TABLE {part}_fts USING fts5(
+            source,
+            message,
+            content=''
+        )
+        """,
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('{part}', {base})",
+    ],
+    # repeats counts the identical records collapsed into this one, see
+    # silo.dedup. repeat_at holds the offset of each of them from timestamp
+    # in seconds, each followed by a space.
+    6: [
+        """
+        CREATE TABLE {part} (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            host_id         INTEGER NOT NULL,
+            timestamp       INTEGER NOT NULL,
+            source_id       INTEGER NOT NULL,
+            template_id     INTEGER,
+            body            TEXT NOT NULL,
+            repeats         INTEGER NOT NULL DEFAULT 0,
+            repeat_at       TEXT NOT NULL DEFAULT '',
+            FOREIGN KEY (host_id) REFERENCES host (id)
+                    ON DELETE CASCADE
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (source_id) REFERENCES source (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (template_id) REFERENCES template (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT
+        ) STRICT
+        """,
+        "CREATE INDEX {part}_host_time_idx ON {part} (host_id, timestamp)",
+        "CREATE INDEX {part}_time_idx ON {part} (timestamp)",
+        """
+        CREATE VIRTUAL TABLE {part}_fts USING fts5(
+            source,
+            message,
+            content=''
+        )
+        """,
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('{part}', {base})",
+    ],
+}
+
+PartitionDropQueries: Final[list[str]] = [
+    "DROP TABLE {part}_fts",
+    "DROP TABLE {part}",
+    "DELETE FROM sqlite_sequence WHERE name = '{part}'",
+    "DELETE FROM record_partition WHERE name = '{part}'",
+]
+
+
+def _split_legacy_records(db: "Database") -> None:
+    """Move the records from the old, unpartitioned record table to partitions."""
+    cur: sqlite3.Cursor = db.db.cursor()
+    cur.execute("SELECT MIN(timestamp) FROM record")
+    stamp: Optional[int] = cur.fetchall()[0][0]
+    while stamp is not None:
+        part = db.partition_get(stamp)
+        cur.execute(f"""
+        INSERT INTO {part.name} (host_id, timestamp, source, message)
+        SELECT host_id, timestamp, source, message
+        FROM record
+        WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp, id
+        """, (part.begin, part.end))
+        cur.execute("SELECT MIN(timestamp) FROM record WHERE timestamp >= ?", (part.end, ))
+        stamp = cur.fetchall()[0][0]
+
+
+def _intern_partitions(db: "Database") -> None:
+    """Convert the partitions to layout 4, with sources interned.
+
+    The messages are stored as they are, compact storage only applies
+    to records added from now on.
+    """
+    cur: sqlite3.Cursor = db.db.cursor()
+    cur.execute(db_queries[QueryID.PartitionGetAll])
+    for name, begin, _ in cur.fetchall():
+        for query in ("DROP TRIGGER {part}_fts_add",
+                      "DROP TRIGGER {part}_fts_del",
+                      "DROP TRIGGER {part}_fts_upd",
+                      "DROP TABLE {part}_fts",
+                      "DROP INDEX {part}_host_time_idx",
+                      "DROP INDEX {part}_time_idx",
+                      "ALTER TABLE {part} RENAME TO {part}_old"):
+            cur.execute(query.format(part=name))
+        for query in PartitionLayouts[4]:
+            cur.execute(query.format(part=name, base=(begin // DAY) << 32))
+        cur.execute(f"""
+        INSERT INTO source (name)
+        SELECT DISTINCT source FROM {name}_old WHERE true
+        ON CONFLICT (name) DO NOTHING
+        """)
+        cur.execute(f"""
+        INSERT INTO {name} (id, host_id, timestamp, source_id, template_id, body)
+        SELECT o.id, o.host_id, o.timestamp, s.id, NULL, o.message
+        FROM {name}_old o
+        INNER JOIN source s ON s.name = o.source
+        """)
+        cur.execute(f"""
+        INSERT INTO {name}_fts (rowid, source, message)
+        SELECT id, source, message FROM {name}_old
+        """)
+        cur.execute(f"DROP TABLE {name}_old")
+
+
+def _fill_rollups(db: "Database") -> None:
+    """Count the records already in the partitions into the rollup tables."""
+    cur: sqlite3.Cursor = db.db.cursor()
+    cur.execute(db_queries[QueryID.PartitionGetAll])
+    for name, _, _ in cur.fetchall():
+        for width, table in RollupTables.items():
+            cur.execute(f"""
+            INSERT INTO {table} (bucket, host_id, source_id, cnt)
+            SELECT timestamp - timestamp % {width}, host_id, source_id, COUNT(*)
+            FROM {name}
+            WHERE true
+            GROUP BY 1, 2, 3
+            ON CONFLICT (bucket, host_id, source_id) DO UPDATE SET cnt = cnt + excluded.cnt
+            """)
+
+
+def _add_repeats(db: "Database") -> None:
+    """Add the columns for collapsed repeats to the partitions, see layout 6."""
+    cur: sqlite3.Cursor = db.db.cursor()
+    cur.execute(db_queries[QueryID.PartitionGetAll])
+    for name, _, _ in cur.fetchall():
+        cur.execute(f"ALTER TABLE {name} ADD COLUMN repeats INTEGER NOT NULL DEFAULT 0")
+        cur.execute(f"ALTER TABLE {name} ADD COLUMN repeat_at TEXT NOT NULL DEFAULT ''")
+
+
+# Migrations[n] holds the steps that bring the schema from version n to
+# version n + 1. A step is either a query or a function that is passed the
+# Database. A fresh database is initialized with InitQueries and then run
+# through all migrations, so the schema of the newest version is the sum of
+# both. The version is stored in PRAGMA user_version, new steps go at the
+# end, and existing steps are never changed.
+Migrations: Final[list[list[Union[str, Callable[["Database"], None]]]]] = [
+    # 0 -> 1: Full text search on record messages
+    [
+        """
+        CREATE VIRTUAL TABLE record_fts USING fts5(
+            source,
+            message,
+            content='record',
+            content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER record_fts_add AFTER INSERT ON record BEGIN
+            INSERT INTO record_fts (rowid, source, message)
+                   VALUES (new.id, new.source, new.message);
+        END
+        """,
+        """
+        CREATE TRIGGER record_fts_del AFTER DELETE ON record BEGIN
+            INSERT INTO record_fts (record_fts, rowid, source, message)
+                   VALUES ('delete', old.id, old.source, old.message);
+        END
+        """,
+        """
+        CREATE TRIGGER record_fts_upd AFTER UPDATE ON record BEGIN
+            INSERT INTO record_fts (record_fts, rowid, source, message)
+                   VALUES ('delete', old.id, old.source, old.message);
+            INSERT INTO record_fts (rowid, source, message)
+                   VALUES (new.id, new.source, new.message);
+        END
+        """,
+        "INSERT INTO record_fts (record_fts) VALUES ('rebuild')",
+    ],
+    # 1 -> 2: Serve "records of host X in period P" and the most recent
+    # record of a host from one index. Since host_id is its first column,
+    # the new index makes the one on host_id alone redundant.
+    [
+        "CREATE INDEX record_host_time_idx ON record (host_id, timestamp)",
+        "DROP INDEX record_host_idx",
+    ],
+    # 2 -> 3: Partition records by time
+    [
+        """
+        CREATE TABLE record_partition (
+            name        TEXT PRIMARY KEY,
+            begin       INTEGER UNIQUE NOT NULL,
+            end         INTEGER NOT NULL,
+            CHECK (begin < end)
+        ) STRICT
+        """,
+        _split_legacy_records,
+        "DROP TABLE record_fts",
+        "DROP TABLE record",
+    ],
+    # 3 -> 4: Intern sources, store messages as templates and parameters
+    [
+        """
+        CREATE TABLE source (
+            id          INTEGER PRIMARY KEY,
+            name        TEXT UNIQUE NOT NULL
+        ) STRICT
+        """,
+        """
+        CREATE TABLE template (
+            id          INTEGER PRIMARY KEY,
+            pattern     TEXT UNIQUE NOT NULL
+        ) STRICT
+        """,
+        _intern_partitions,
+    ],
+    # 4 -> 5: Count records per minute and hour, Host and source
+    [
+        """
+        CREATE TABLE rollup_minute (
+            bucket      INTEGER NOT NULL,
+            host_id     INTEGER NOT NULL,
+            source_id   INTEGER NOT NULL,
+            cnt         INTEGER NOT NULL,
+            PRIMARY KEY (bucket, host_id, source_id),
+            FOREIGN KEY (host_id) REFERENCES host (id)
+                    ON DELETE CASCADE
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (source_id) REFERENCES source (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT
+        ) STRICT, WITHOUT ROWID
+        """,
+        "CREATE INDEX rollup_minute_host_idx ON rollup_minute (host_id, bucket)",
+        """
+        CREATE TABLE rollup_hour (
+            bucket      INTEGER NOT NULL,
+            host_id     INTEGER NOT NULL,
+            source_id   INTEGER NOT NULL,
+            cnt         INTEGER NOT NULL,
+            PRIMARY KEY (bucket, host_id, source_id),
+            FOREIGN KEY (host_id) REFERENCES host (id)
+                    ON DELETE CASCADE
+                    ON UPDATE RESTRICT,
+            FOREIGN KEY (source_id) REFERENCES source (id)
+                    ON DELETE RESTRICT
+                    ON UPDATE RESTRICT
+        ) STRICT, WITHOUT ROWID
+        """,
+        "CREATE INDEX rollup_hour_host_idx ON rollup_hour (host_id, bucket)",
+        _fill_rollups,
+    ],
+    # 5 -> 6: Collapse repeated records
+    [
+        _add_repeats,
+    ],
+]
+
+SchemaVersion: Final[int] = len(Migrations)
+
 OpenLock: Final[Lock] = Lock()
 
+# Default number of rows handed to a single executemany() call, and the
+# default number of seconds a BatchWriter holds on to buffered Records.
+DEFAULT_BATCH_SIZE: Final[int] = 1000
+DEFAULT_FLUSH_INTERVAL: Final[float] = 1.0
+
+# Number of rows fetched from a cursor at a time by the record_iter_* methods.
+DEFAULT_FETCH_SIZE: Final[int] = 500
+
+# Default maximum number of results returned by record_search.
+DEFAULT_SEARCH_LIMIT: Final[int] = 100
+
+# The span of time covered by a partition of the record table, in seconds.
+# It has to be a whole number of days.
+DAY: Final[int] = 86400
+DEFAULT_PARTITION_SPAN: Final[int] = 7 * DAY
+
+# The key used for keyset pagination of record queries: (timestamp, record ID)
+PageKey = tuple[int, int]
+
+# The number of records is counted per Host and source in buckets of a
+# minute and of an hour, as they are added. RollupTables maps the width of
+# a bucket in seconds to the table holding the counts. Each bucket is
+# keyed by the timestamp it begins at.
+MINUTE: Final[int] = 60
+HOUR: Final[int] = 3600
+RollupTables: Final[dict[int, str]] = {
+    MINUTE: "rollup_minute",
+    HOUR: "rollup_hour",
+}
+
+# Default number of entries returned by rollup_top.
+DEFAULT_TOP_LIMIT: Final[int] = 10
+
+# A bucket of a histogram: (beginning of the bucket, number of records)
+HistogramBin = tuple[int, int]
+
+# Default bounds for a DBPool: the number of read-only and read-write
+# connections, how many seconds an unused connection stays open, and how
+# many seconds a checkout waits for a connection before it gives up.
+DEFAULT_POOL_READERS: Final[int] = 4
+DEFAULT_POOL_WRITERS: Final[int] = 1
+DEFAULT_POOL_IDLE: Final[float] = 300.0
+DEFAULT_POOL_TIMEOUT: Final[float] = 30.0
+
+# The default number of strings a Lexicon keeps in memory.
+DEFAULT_LEXICON_SIZE: Final[int] = 10000
+
+
+@dataclass(slots=True, kw_only=True)
+class Pragmas:
+    """Pragmas holds the settings applied to every connection Database opens.
+
+    The defaults suit a server: With WAL, synchronous = NORMAL cannot
+    corrupt the database, it only risks losing the last transactions on a
+    power failure. cache_size is given in KiB if negative, like SQLite does.
+    busy_timeout is in milliseconds. statements is the number of prepared
+    statements the sqlite3 module keeps per connection - since each partition
+    has its own copy of each query, the default of 128 is not much.
+    """
+
+    synchronous: str = "NORMAL"
+    cache_size: int = -65536
+    mmap_size: int = 256 * 2**20
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+    statements: int = 1024
+
+    def queries(self) -> list[str]:
+        """Return the PRAGMA statements to apply the settings.
+
+        Raises ValueError for settings SQLite does not know.
+        """
+        synchronous: str = self.synchronous.upper()
+        if synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid value for synchronous: {self.synchronous}")
+        temp_store: str = self.temp_store.upper()
+        if temp_store not in ("DEFAULT", "FILE", "MEMORY"):
+            raise ValueError(f"Invalid value for temp_store: {self.temp_store}")
+        return [
+            f"PRAGMA synchronous = {synchronous}",
+            f"PRAGMA cache_size = {int(self.cache_size)}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA temp_store = {temp_store}",
+            f"PRAGMA busy_timeout = {int(self.busy_timeout)}",
+        ]
+
+
+# In compact mode, messages are split into a template and parameters.
+# The parameters are quoted strings and anything containing a digit:
+# Process IDs, addresses, counters, sizes, and so on. In the pattern, each
+# parameter is replaced by PARAM_SEP, and the parameters are joined by it.
+PARAM_SEP: Final[str] = "\x1f"
+param_pat: Final[re.Pattern] = re.compile(r"""('[^']*'|"[^"]*"|[^\s'"]*\d[^\s'"]*)""")
+
+
+def message_split(msg: str) -> Optional[tuple[str, str]]:
+    """Split a message into a pattern and its parameters.
+
+    Returns None if the message cannot be split, because it contains
+    PARAM_SEP itself, or if it has no parameters. Such a message would be
+    a template of its own, so it is cheaper to store it as it is.
+    """
+    if PARAM_SEP in msg:
+        return None
+    # Since the pattern has a group, the odd elements are the parameters.
+    parts: list[str] = param_pat.split(msg)
+    if len(parts) == 1:
+        return None
+    return PARAM_SEP.join(parts[0::2]), PARAM_SEP.join(parts[1::2])
+
+
+def message_join(pattern: str, params: str) -> str:
+    """Reassemble a message from the pattern and parameters returned by message_split."""
+    parts: list[str] = pattern.split(PARAM_SEP)
+    if len(parts) == 1:
+        return pattern
+    out: list[str] = [parts[0]]
+    for param, literal in zip(params.split(PARAM_SEP), parts[1:]):
+        out.append(param)
+        out.append(literal)
+    return "".join(out)
+
+
+@dataclass(slots=True, kw_only=True)
+class Partition:
+    """Partition is a table holding the Records of a span of time, from begin up to,
+    but not including, end.
+    """
+
+    name: str
+    begin: int
+    end: int
+
 
 class QueryID(Enum):
     """QueryID identifies database queries."""
 
     HostAdd = auto()
+    HostAddIfMissing = auto()
     HostGetByName = auto()
     HostGetByID = auto()
     HostGetAll = auto()
     HostUpdateLastContact = auto()
+    PartitionAdd = auto()
+    PartitionGetAll = auto()
+    SourceAdd = auto()
+    SourceGetByName = auto()
+    SourceGetByID = auto()
+    TemplateAdd = auto()
+    TemplateGetByPattern = auto()
+    TemplateGetByID = auto()
     RecordAdd = auto()
+    RecordAddBatch = auto()
+    RecordIndex = auto()
+    RecordRepeat = auto()
     RecordGetByHost = auto()
+    RecordGetByHostAfter = auto()
+    RecordGetByHostPeriod = auto()
+    RecordGetByHostPeriodAfter = auto()
     RecordGetByPeriod = auto()
+    RecordGetByPeriodAfter = auto()
     RecordGetMostRecentByHost = auto()
+    RecordSearch = auto()
+    RecordSearchRecent = auto()
+    RollupAdd = auto()
+    RollupExpire = auto()
+    RollupHistogram = auto()
+    RollupHistogramHost = auto()
+    RollupTopHosts = auto()
+    RollupTopSources = auto()
+    RollupTopSourcesHost = auto()
+
+
+class RollupKey(Enum):
+    """RollupKey says what rollup_top ranks."""
 
+    Host = auto()
+    Source = auto()
 
+
+# The Record queries run against a single partition, whose name is
+# substituted for {part}. They return the source and template IDs, which
+# are resolved by the Database's Lexicons.
 db_queries: Final[dict[QueryID, str]] = {
     QueryID.HostAdd: "INSERT INTO host (name) VALUES (?) RETURNING id",
+    QueryID.HostAddIfMissing: "INSERT INTO host (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
     QueryID.HostGetByName: "SELECT id, last_contact FROM host WHERE name = ?",
     QueryID.HostGetByID: "SELECT name, last_contact FROM host WHERE id = ?",
     QueryID.HostGetAll: "SELECT id, name, last_contact FROM host",
     QueryID.HostUpdateLastContact: "UPDATE host SET last_contact = ? WHERE id = ?",
+    QueryID.PartitionAdd: "INSERT INTO record_partition (name, begin, end) VALUES (?, ?, ?)",
+    QueryID.PartitionGetAll: "SELECT name, begin, end FROM record_partition ORDER BY begin",
+    QueryID.SourceAdd: "INSERT INTO source (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+    QueryID.SourceGetByName: "SELECT id FROM source WHERE name = ?",
+    QueryID.SourceGetByID: "SELECT name FROM source WHERE id = ?",
+    QueryID.TemplateAdd: """
+    INSERT INTO template (pattern) VALUES (?) ON CONFLICT (pattern) DO NOTHING
+    """,
+    QueryID.TemplateGetByPattern: "SELECT id FROM template WHERE pattern = ?",
+    QueryID.TemplateGetByID: "SELECT pattern FROM template WHERE id = ?",
     QueryID.RecordAdd: """
-    INSERT INTO record (host_id, timestamp, source, message)
-                VALUES (      ?,         ?,      ?,       ?)
+    INSERT INTO {part} (host_id, timestamp, source_id, template_id, body)
+                VALUES (      ?,         ?,         ?,           ?,    ?)
     RETURNING id""",
-    QueryID.RecordGetByHost: "SELECT id, timestamp, source, message FROM record WHERE host_id = ?",
+    QueryID.RecordAddBatch: """
+    INSERT INTO {part} (host_id, timestamp, source_id, template_id, body)
+                VALUES (      ?,         ?,         ?,           ?,    ?)
+    """,
+    QueryID.RecordIndex: "INSERT INTO {part}_fts (rowid, source, message) VALUES (?, ?, ?)",
+    QueryID.RecordRepeat: """
+    UPDATE {part} SET repeats = repeats + ?, repeat_at = repeat_at || ? WHERE id = ?
+    """,
+    QueryID.RecordGetByHost: """
+    SELECT
+        id,
+        host_id,
+        timestamp,
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
+    WHERE host_id = ?
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
+    QueryID.RecordGetByHostAfter: """
+    SELECT
+        id,
+        host_id,
+        timestamp,
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
+    WHERE host_id = ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
+    QueryID.RecordGetByHostPeriod: """
+    SELECT
+        id,
+        host_id,
+        timestamp,
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
+    WHERE host_id = ? AND timestamp BETWEEN ? AND ?
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
+    QueryID.RecordGetByHostPeriodAfter: """
+    SELECT
+        id,
+        host_id,
+        timestamp,
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
+    WHERE host_id = ? AND timestamp BETWEEN ? AND ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
     QueryID.RecordGetByPeriod: """
     SELECT
         id,
         host_id,
         timestamp,
-        source,
-        message
-    FROM record
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
     WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
+    QueryID.RecordGetByPeriodAfter: """
+    SELECT
+        id,
+        host_id,
+        timestamp,
+        source_id,
+        template_id,
+        body,
+        repeats,
+        repeat_at
+    FROM {part}
+    WHERE timestamp BETWEEN ? AND ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp, id
+    LIMIT ?
+    """,
+    QueryID.RecordGetMostRecentByHost: "SELECT MAX(timestamp) FROM {part} WHERE host_id = ?",
+    QueryID.RecordSearch: """
+    SELECT
+        r.id,
+        r.host_id,
+        r.timestamp,
+        r.source_id,
+        r.template_id,
+        r.body,
+        r.repeats,
+        r.repeat_at,
+        f.rank
+    FROM {part}_fts f
+    INNER JOIN {part} r ON r.id = f.rowid
+    WHERE {part}_fts MATCH ?
+      AND r.timestamp BETWEEN ? AND ?
+      AND (? = 0 OR r.host_id = ?)
+    ORDER BY f.rank
+    LIMIT ?
+    """,
+    QueryID.RecordSearchRecent: """
+    SELECT
+        r.id,
+        r.host_id,
+        r.timestamp,
+        r.source_id,
+        r.template_id,
+        r.body,
+        r.repeats,
+        r.repeat_at
+    FROM {part}_fts f
+    INNER JOIN {part} r ON r.id = f.rowid
+    WHERE {part}_fts MATCH ?
+      AND r.timestamp BETWEEN ? AND ?
+      AND (? = 0 OR r.host_id = ?)
+    ORDER BY f.rowid DESC
+    LIMIT ?
+    """,
+    # The rollup queries run against the table for one bucket width, whose
+    # name is substituted for {table}. A source_id of 0 matches any source.
+    QueryID.RollupAdd: """
+    INSERT INTO {table} (bucket, host_id, source_id, cnt)
+                 VALUES (     ?,       ?,         ?,   ?)
+    ON CONFLICT (bucket, host_id, source_id) DO UPDATE SET cnt = cnt + excluded.cnt
+    """,
+    QueryID.RollupExpire: "DELETE FROM {table} WHERE bucket < ?",
+    QueryID.RollupHistogram: """
+    SELECT bucket, SUM(cnt)
+    FROM {table}
+    WHERE bucket BETWEEN ? AND ?
+      AND (? = 0 OR source_id = ?)
+    GROUP BY bucket
+    ORDER BY bucket
+    """,
+    QueryID.RollupHistogramHost: """
+    SELECT bucket, SUM(cnt)
+    FROM {table}
+    WHERE host_id = ?
+      AND bucket BETWEEN ? AND ?
+      AND (? = 0 OR source_id = ?)
+    GROUP BY bucket
+    ORDER BY bucket
+    """,
+    QueryID.RollupTopHosts: """
+    SELECT h.name, SUM(r.cnt) AS total
+    FROM {table} r
+    INNER JOIN host h ON h.id = r.host_id
+    WHERE r.bucket BETWEEN ? AND ?
+      AND (? = 0 OR r.source_id = ?)
+    GROUP BY r.host_id
+    ORDER BY total DESC, h.name
+    LIMIT ?
+    """,
+    QueryID.RollupTopSources: """
+    SELECT s.name, SUM(r.cnt) AS total
+    FROM {table} r
+    INNER JOIN source s ON s.id = r.source_id
+    WHERE r.bucket BETWEEN ? AND ?
+    GROUP BY r.source_id
+    ORDER BY total DESC, s.name
+    LIMIT ?
+    """,
+    QueryID.RollupTopSourcesHost: """
+    SELECT s.name, SUM(r.cnt) AS total
+    FROM {table} r
+    INNER JOIN source s ON s.id = r.source_id
+    WHERE r.host_id = ?
+      AND r.bucket BETWEEN ? AND ?
+    GROUP BY r.source_id
+    ORDER BY total DESC, s.name
+    LIMIT ?
     """,
-    QueryID.RecordGetMostRecentByHost: "SELECT MAX(timestamp) FROM record WHERE host_id = ?",
 }
 
 
+class Lexicon:
+    """Lexicon maps the strings of a lookup table, i.e. sources or templates, to their IDs.
+
+    Rows are never removed from these tables, so once we know an ID, it
+    stays valid, except when the transaction that added it is rolled back.
+    In that case, the owner has to call clear().
+
+    Only the maxsize strings used most recently are kept in memory, the
+    others are looked up again when they come up.
+    """
+
+    __slots__ = [
+        "q_add",
+        "q_get_id",
+        "q_get_str",
+        "maxsize",
+        "ids",
+        "strings",
+    ]
+
+    q_add: str
+    q_get_id: str
+    q_get_str: str
+    maxsize: int
+    ids: OrderedDict[str, int]
+    strings: OrderedDict[int, str]
+
+    def __init__(self,
+                 q_add: QueryID,
+                 q_get_id: QueryID,
+                 q_get_str: QueryID,
+                 maxsize: int = DEFAULT_LEXICON_SIZE) -> None:
+        self.q_add = db_queries[q_add]
+        self.q_get_id = db_queries[q_get_id]
+        self.q_get_str = db_queries[q_get_str]
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+        self.strings = OrderedDict()
+
+    def intern(self, cur: sqlite3.Cursor, s: str) -> int:
+        """Return the ID of s, adding it to the table if needed."""
+        sid = self.ids.get(s)
+        if sid is None:
+            cur.execute(self.q_add, (s, ))
+            cur.execute(self.q_get_id, (s, ))
+            sid = cur.fetchone()[0]
+            self.__remember(s, sid)
+        else:
+            self.ids.move_to_end(s)
+        return sid
+
+    def lookup(self, cur: sqlite3.Cursor, sid: int) -> str:
+        """Return the string with the given ID."""
+        s = self.strings.get(sid)
+        if s is None:
+            cur.execute(self.q_get_str, (sid, ))
+            s = cur.fetchone()[0]
+            self.__remember(s, sid)
+        else:
+            self.strings.move_to_end(sid)
+        return s
+
+    def __remember(self, s: str, sid: int) -> None:
+        """Cache a string and its ID, push out the ones unused the longest if we have too many."""
+        self.ids[s] = sid
+        self.ids.move_to_end(s)
+        self.strings[sid] = s
+        self.strings.move_to_end(sid)
+        if len(self.ids) > self.maxsize:
+            self.ids.popitem(last=False)
+        if len(self.strings) > self.maxsize:
+            self.strings.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget everything."""
+        self.ids.clear()
+        self.strings.clear()
+
+
 class Database:
-    """Database provides persistence."""
+    """Database provides persistence.
+
+    If compact is True, messages are stored as a template and parameters,
+    see message_split(), so lines that only differ in a few numbers cost a
+    few bytes each. Reading works the same either way, so the mode can be
+    switched at any time.
+    """
 
     __slots__ = [
         "db",
         "log",
         "path",
+        "tx_depth",
+        "span",
+        "parts",
+        "part_begins",
+        "schema_seen",
+        "layout",
+        "compact",
+        "sources",
+        "templates",
     ]
 
     db: sqlite3.Connection
     log: logging.Logger
     path: str
+    tx_depth: int
+    span: int
+    parts: list[Partition]
+    part_begins: list[int]
+    schema_seen: int
+    layout: int
+    compact: bool
+    sources: Lexicon
+    templates: Lexicon
+
+    def __init__(self,
+                 path: str = "",
+                 span: int = DEFAULT_PARTITION_SPAN,
+                 compact: bool = False,
+                 pragmas: Optional[Pragmas] = None,
+                 readonly: bool = False,
+                 shared: bool = False) -> None:
+        """Open the database at path, creating or migrating it as needed.
 
-    def __init__(self, path: str = "") -> None:
+        A readonly connection expects the database to be there and up to
+        date already. If shared is True, the connection may be used by other
+        threads than the one that opened it, one at a time, e.g. in a DBPool.
+        """
+        if pragmas is None:
+            pragmas = Pragmas()
+        setup: list[str] = pragmas.queries()
         if path == "":
             path = common.path.db()
+        if span <= 0 or span % DAY != 0:
+            raise ValueError(f"Partition span must be a positive number of days, not {span}s")
         self.log = common.get_logger("database")
         self.log.debug("Open database at %s", path)
+        self.path = path
+        self.tx_depth = 0
+        self.span = span
+        self.parts = []
+        self.part_begins = []
+        self.schema_seen = -1
+        self.layout = SchemaVersion
+        self.compact = compact
+        self.sources = Lexicon(QueryID.SourceAdd, QueryID.SourceGetByName, QueryID.SourceGetByID)
+        self.templates = Lexicon(QueryID.TemplateAdd,
+                                 QueryID.TemplateGetByPattern,
+                                 QueryID.TemplateGetByID)
+        if readonly:
+            # Nothing to create or migrate, so no need to wait for OpenLock.
+            self.db = sqlite3.connect(f"file:{path}?mode=ro",
+                                      uri=True,
+                                      check_same_thread=not shared,
+                                      cached_statements=pragmas.statements)
+            self.db.isolation_level = None
+            self.__setup(setup)
+            self.__load_partitions()
+            return
+
         with OpenLock:
             exist: bool = krylib.fexist(path)
-            self.db = sqlite3.connect(path)  # pylint: disable-msg=C0103
+            self.db = sqlite3.connect(path,  # pylint: disable-msg=C0103
+                                      check_same_thread=not shared,
+                                      cached_statements=pragmas.statements)
             self.db.isolation_level = None
-
-            cur: sqlite3.Cursor = self.db.cursor()
-            cur.execute("PRAGMA foreign_keys = true")
-            cur.execute("PRAGMA journal_mode = WAL")
-
+            self.__setup(setup)
             if not exist:
                 self.__create_db()
+            self.__migrate()
+            self.__load_partitions()
+
+    def __setup(self, pragmas: list[str]) -> None:
+        """Configure a freshly opened connection, see Pragmas.queries()."""
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute("PRAGMA foreign_keys = true")
+        cur.execute("PRAGMA journal_mode = WAL")
+        for query in pragmas:
+            cur.execute(query)
+        # The journal_mode pragma returns a row. As long as the statement
+        # has not been finished, it blocks schema changes.
+        cur.close()
+
+    def close(self) -> None:
+        """Close the connection."""
+        self.db.close()
+
+    def schema_version(self) -> int:
+        """Return the version of the database schema."""
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute("PRAGMA user_version")
+        rows = cur.fetchall()
+        return rows[0][0]
+
+    def __migrate(self) -> None:
+        """Bring the database schema up to date."""
+        if self.schema_version() >= SchemaVersion:
+            return
+        with self:
+            # Someone else might have gotten here first.
+            version: int = self.schema_version()
+            if version >= SchemaVersion:
+                return
+            cur: sqlite3.Cursor = self.db.cursor()
+            for step in range(version, SchemaVersion):
+                self.log.info("Migrate database schema from version %d to %d",
+                              step,
+                              step + 1)
+                # Partitions created along the way must look like the
+                # following steps expect them to.
+                self.layout = step + 1
+                for query in Migrations[step]:
+                    if callable(query):
+                        query(self)
+                        continue
+                    try:
+                        cur.execute(query)
+                    except sqlite3.OperationalError as err:
+                        self.log.error("Error executing migration query: %s\n%s\n",
+                                       err,
+                                       query)
+                        raise
+            cur.execute(f"PRAGMA user_version = {SchemaVersion}")
+            self.layout = SchemaVersion
 
     def __create_db(self) -> None:
         """Initialize a newly created database."""
@@ -139,12 +1041,146 @@ class Database:
                     raise
 
     def __enter__(self) -> None:
-        """Begin a transaction."""
-        self.db.__enter__()
+        """Begin a transaction.
+
+        Since the connection runs in autocommit mode, we have to issue the
+        BEGIN ourselves. Transactions may be nested, only the outermost one
+        actually begins and commits.
+        """
+        if self.tx_depth == 0 and not self.db.in_transaction:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.tx_depth = 1
+        elif self.tx_depth > 0:
+            self.tx_depth += 1
 
     def __exit__(self, ex_type, ex_val, traceback):
         """Finish a transaction."""
-        return self.db.__exit__(ex_type, ex_val, traceback)
+        if self.tx_depth == 0:
+            return False
+        self.tx_depth -= 1
+        if self.tx_depth == 0:
+            if ex_type is None:
+                self.db.execute("COMMIT")
+            else:
+                self.rollback()
+        return False
+
+    def rollback(self) -> None:
+        """Roll back the open transaction, however deeply nested."""
+        self.tx_depth = 0
+        try:
+            self.db.execute("ROLLBACK")
+        finally:
+            # Whatever we learned during the transaction may be gone.
+            self.sources.clear()
+            self.templates.clear()
+            self.parts = []
+            self.part_begins = []
+            self.schema_seen = -1
+
+    def __load_partitions(self) -> None:
+        """Read the list of partitions from the database."""
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute("PRAGMA schema_version")
+        self.schema_seen = cur.fetchall()[0][0]
+        cur.execute(db_queries[QueryID.PartitionGetAll])
+        self.parts = [Partition(name=row[0], begin=row[1], end=row[2])
+                      for row in cur.fetchall()]
+        self.part_begins = [p.begin for p in self.parts]
+
+    def __refresh_partitions(self) -> None:
+        """Reload the list of partitions if another connection changed the schema.
+
+        Partitions are created and dropped with CREATE and DROP TABLE, so
+        looking at the schema version is enough to tell.
+        """
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute("PRAGMA schema_version")
+        if cur.fetchall()[0][0] != self.schema_seen:
+            self.__load_partitions()
+
+    def __find_partition(self, stamp: int) -> Optional[Partition]:
+        """Return the cached Partition covering stamp, if there is one."""
+        idx: int = bisect_right(self.part_begins, stamp) - 1
+        if idx >= 0 and self.parts[idx].end > stamp:
+            return self.parts[idx]
+        return None
+
+    def __parts_between(self, begin: int, end: int) -> list[Partition]:
+        """Return the Partitions overlapping the period from begin to end (inclusive)."""
+        self.__refresh_partitions()
+        return [p for p in self.parts if p.begin <= end and p.end > begin]
+
+    def partition_list(self) -> list[Partition]:
+        """Return all Partitions, ordered by time."""
+        self.__refresh_partitions()
+        return list(self.parts)
+
+    def partition_get(self, stamp: int) -> Partition:
+        """Return the Partition for Records with the given timestamp, creating it if needed."""
+        part = self.__find_partition(stamp)
+        if part is not None:
+            return part
+        with self:
+            self.__load_partitions()
+            part = self.__find_partition(stamp)
+            if part is not None:
+                return part
+
+            begin: int = stamp - stamp % self.span
+            end: int = begin + self.span
+            # Partitions created with a different span might overlap ours.
+            idx: int = bisect_right(self.part_begins, stamp)
+            if idx > 0:
+                begin = max(begin, self.parts[idx - 1].end)
+            if idx < len(self.parts):
+                end = min(end, self.parts[idx].begin)
+
+            day: datetime = datetime.fromtimestamp(begin, timezone.utc)
+            part = Partition(name=day.strftime("record_%Y%m%d"), begin=begin, end=end)
+            self.log.debug("Create partition %s", part.name)
+            cur: sqlite3.Cursor = self.db.cursor()
+            layout: int = max(v for v in PartitionLayouts if v <= self.layout)
+            for query in PartitionLayouts[layout]:
+                cur.execute(query.format(part=part.name, base=(begin // DAY) << 32))
+            cur.execute(db_queries[QueryID.PartitionAdd], (part.name, begin, end))
+            self.__load_partitions()
+        return part
+
+    def partition_expire(self, before: datetime) -> int:
+        """Drop all Partitions that only hold Records older than before.
+
+        The per-minute counts of the dropped Records go with them, the
+        hourly ones are kept, see rollup_expire.
+        Returns the number of Partitions dropped.
+        """
+        stamp: int = int(before.timestamp())
+        cnt: int = 0
+        with self:
+            self.__load_partitions()
+            cur: sqlite3.Cursor = self.db.cursor()
+            for part in self.parts:
+                if part.end > stamp:
+                    break
+                self.log.info("Drop partition %s", part.name)
+                for query in PartitionDropQueries:
+                    cur.execute(query.format(part=part.name))
+                cur.execute(db_queries[QueryID.RollupExpire].format(table=RollupTables[MINUTE]),
+                            (part.end, ))
+                cnt += 1
+            self.__load_partitions()
+        return cnt
+
+    def rollup_expire(self, before: datetime, width: int = HOUR) -> int:
+        """Delete the counts of buckets of the given width that begin before before.
+
+        Returns the number of rows deleted.
+        """
+        cur: sqlite3.Cursor = self.db.cursor()
+        with self:
+            cur.execute(db_queries[QueryID.RollupExpire].format(table=rollup_table(width)),
+                        (int(before.timestamp()), ))
+            return cur.rowcount
 
     def host_add(self, host: Host) -> None:
         """Add a Host to the database."""
@@ -154,6 +1190,18 @@ class Database:
         row = cur.fetchone()
         host.host_id = row[0]
 
+    def host_get_or_add(self, name: str) -> Host:
+        """Fetch a Host by its name, add it first if it does not exist, yet.
+
+        Unlike host_add, this does not fail if another connection adds the
+        same Host at the same time.
+        """
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute(db_queries[QueryID.HostAddIfMissing], (name, ))
+        host = self.host_get_by_name(name)
+        assert host is not None
+        return host
+
     def host_get_by_name(self, name: str) -> Optional[Host]:
         """Fetch a Host by its name."""
         cur: sqlite3.Cursor = self.db.cursor()
@@ -201,67 +1249,1036 @@ class Database:
                     (int(stamp.timestamp()), h.host_id))
         h.last_contact = stamp
 
+    def host_update_contact_many(self, contacts: Iterable[tuple[int, datetime]]) -> None:
+        """Update the contact timestamps of several Hosts in one transaction.
+
+        contacts is a sequence of (host ID, timestamp) pairs.
+        """
+        with self:
+            cur: sqlite3.Cursor = self.db.cursor()
+            cur.executemany(db_queries[QueryID.HostUpdateLastContact],
+                            ((int(stamp.timestamp()), hid) for hid, stamp in contacts))
+
     def record_add(self, rec: Record) -> None:
         """Add a log record to the database."""
+        stamp: int = int(rec.timestamp.timestamp())
+        part = self.partition_get(stamp)
+        with self:
+            cur: sqlite3.Cursor = self.db.cursor()
+            row: tuple = self.__make_row(cur, (rec.host_id, stamp, rec.source, rec.message))
+            cur.execute(db_queries[QueryID.RecordAdd].format(part=part.name), row)
+            rec.record_id = cur.fetchone()[0]
+            cur.execute(db_queries[QueryID.RecordIndex].format(part=part.name),
+                        (rec.record_id, rec.source, rec.message))
+            self.__rollup(cur, [row])
+
+    def record_add_batch(self,
+                         records: Iterable[Record],
+                         want_ids: bool = True,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Add many log records to the database in a single transaction.
+
+        The records are handed to executemany() in chunks of batch_size.
+        If want_ids is True, the record_id of each Record is filled in
+        afterwards. Since we hold the write lock for the whole transaction,
+        SQLite hands out consecutive rowids, so the IDs of a chunk can be
+        derived from the last one inserted. We need them for the full text
+        index either way.
+
+        Returns the number of records added.
+        """
+        it = iter(records)
+        total: int = 0
+        with self:
+            cur: sqlite3.Cursor = self.db.cursor()
+            while chunk := list(islice(it, batch_size)):
+                rows: list[RecordRow] = [(r.host_id,
+                                          int(r.timestamp.timestamp()),
+                                          r.source,
+                                          r.message) for r in chunk]
+                for indices, first in self.__insert_rows(cur, rows):
+                    if want_ids:
+                        for idx, i in enumerate(indices):
+                            chunk[i].record_id = first + idx
+                total += len(chunk)
+        return total
+
+    def record_add_rows(self,
+                        rows: Iterable[RecordRow],
+                        batch_size: int = DEFAULT_BATCH_SIZE,
+                        dedup: Optional[Deduplicator] = None) -> int:
+        """Add many log records given as (host_id, timestamp, source, message).
+
+        This works like record_add_batch, but without a Record for each row,
+        for callers that get their records in bulk, e.g. from the wire.
+        If dedup is given, records that repeat a recent one are not stored,
+        but counted in the record they repeat. They are counted in the
+        rollups all the same.
+        Returns the number of records added, including the collapsed ones.
+        """
+        it = iter(rows)
+        total: int = 0
+        try:
+            with self:
+                cur: sqlite3.Cursor = self.db.cursor()
+                while chunk := list(islice(it, batch_size)):
+                    if dedup is None:
+                        self.__insert_rows(cur, chunk)
+                    else:
+                        fresh, entries = dedup.split(chunk)
+                        for indices, first in self.__insert_rows(cur, fresh):
+                            for idx, i in enumerate(indices):
+                                entries[i].record_id = first + idx
+                        self.__add_repeats(cur, dedup, dedup.take_repeats())
+                    total += len(chunk)
+        except Exception:
+            # The records dedup remembers may be gone.
+            if dedup is not None:
+                dedup.clear()
+            raise
+        return total
+
+    def __add_repeats(self,
+                      cur: sqlite3.Cursor,
+                      dedup: Deduplicator,
+                      repeats: list[tuple[RepeatKey, Entry, list[int]]]) -> None:
+        """Count repeats in the records they repeat, and in the rollup tables.
+
+        If the partition of a record has been dropped meanwhile, its repeats
+        are dropped as well, and dedup forgets the record.
+        """
+        updates: dict[str, list[tuple[int, str, int]]] = {}
+        counted: list[tuple] = []
+        self.__refresh_partitions()
+        for key, entry, offsets in repeats:
+            part = self.__find_partition(entry.stamp)
+            if part is None:
+                self.log.debug("Dropping %d repeats of a record that has expired", len(offsets))
+                dedup.forget(key, entry)
+                continue
+            host_id, source, _ = key
+            updates.setdefault(part.name, []).append((len(offsets),
+                                                      "".join(f"{off} " for off in offsets),
+                                                      entry.record_id))
+            source_id: int = self.sources.intern(cur, source)
+            counted.extend((host_id, entry.stamp + off, source_id) for off in offsets)
+        for name, args in updates.items():
+            cur.executemany(db_queries[QueryID.RecordRepeat].format(part=name), args)
+        self.__rollup(cur, counted)
+
+    def record_add_columns(self,
+                           batch: RecordBatch,
+                           want_ids: bool = True,
+                           batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Add the records of a RecordBatch, see record_add_batch.
+
+        If want_ids is True, the IDs are filled into batch.ids.
+        Returns the number of records added.
+        """
+        sources: list[str] = batch.sources
+        total: int = 0
+        with self:
+            cur: sqlite3.Cursor = self.db.cursor()
+            for off in range(0, len(batch), batch_size):
+                end: int = off + batch_size
+                rows: list[RecordRow] = list(zip(batch.hosts[off:end],
+                                                 batch.stamps[off:end],
+                                                 [sources[i] for i in batch.source_idx[off:end]],
+                                                 batch.messages[off:end]))
+                for indices, first in self.__insert_rows(cur, rows):
+                    if want_ids:
+                        for idx, i in enumerate(indices):
+                            batch.ids[off + i] = first + idx
+                total += len(rows)
+        return total
+
+    def __insert_rows(self, cur: sqlite3.Cursor, chunk: list[RecordRow]) \
+            -> list[tuple[list[int], int]]:
+        """Insert a chunk of rows and add them to the full text index.
+
+        Returns a list of (indices into chunk, ID of the first one) for each
+        partition the rows went into.
+        """
+        result: list[tuple[list[int], int]] = []
+        for part, indices, rows in self.__split_by_partition(cur, chunk):
+            cur.executemany(db_queries[QueryID.RecordAddBatch].format(part=part), rows)
+            # Ask before anything else is inserted, the rollups would change it
+            # if their tables had rowids.
+            cur.execute("SELECT last_insert_rowid()")
+            first: int = cur.fetchone()[0] - len(indices) + 1
+            self.__rollup(cur, rows)
+            cur.executemany(db_queries[QueryID.RecordIndex].format(part=part),
+                            ((first + idx, chunk[i][2], chunk[i][3])
+                             for idx, i in enumerate(indices)))
+            result.append((indices, first))
+        return result
+
+    def __rollup(self, cur: sqlite3.Cursor, rows: list[tuple]) -> None:
+        """Add rows of (host_id, timestamp, source_id, ...) to the counts in the rollup tables.
+
+        The rows are counted up in memory first, so a chunk of records
+        costs one upsert per bucket, Host and source rather than per record.
+        """
+        for width, table in RollupTables.items():
+            counts: dict[tuple[int, int, int], int] = {}
+            for row in rows:
+                key = (row[1] - row[1] % width, row[0], row[2])
+                counts[key] = counts.get(key, 0) + 1
+            cur.executemany(db_queries[QueryID.RollupAdd].format(table=table),
+                            (key + (cnt, ) for key, cnt in counts.items()))
+
+    def __make_row(self, cur: sqlite3.Cursor, row: RecordRow) -> tuple:
+        """Return the row to insert: host_id, timestamp, source_id, template_id, body."""
+        host_id, stamp, source, message = row
+        source_id: int = self.sources.intern(cur, source)
+        if self.compact:
+            split = message_split(message)
+            if split is not None:
+                return (host_id,
+                        stamp,
+                        source_id,
+                        self.templates.intern(cur, split[0]),
+                        split[1])
+        return (host_id, stamp, source_id, None, message)
+
+    def __split_by_partition(self, cur: sqlite3.Cursor, chunk: list[RecordRow]) \
+            -> list[tuple[str, list[int], list[tuple]]]:
+        """Sort a chunk of rows into their partitions.
+
+        Returns a list of (partition name, indices into chunk, rows to insert).
+        Records usually arrive more or less in order, so we keep the last
+        partition at hand instead of looking it up for every row.
+        """
+        groups: dict[str, tuple[list[int], list[tuple]]] = {}
+        part: Optional[Partition] = None
+        for i, row in enumerate(chunk):
+            stamp: int = row[1]
+            if part is None or not part.begin <= stamp < part.end:
+                part = self.partition_get(stamp)
+            grp = groups.get(part.name)
+            if grp is None:
+                grp = groups[part.name] = ([], [])
+            grp[0].append(i)
+            grp[1].append(self.__make_row(cur, row))
+        return [(name, grp[0], grp[1]) for name, grp in groups.items()]
+
+    def __make_records(self, rows: Iterable[tuple]) -> Iterator[Record]:
+        """Turn rows of (id, host_id, timestamp, source_id, template_id, body, repeats, ...)
+        into Records."""
         cur: sqlite3.Cursor = self.db.cursor()
-        cur.execute(db_queries[QueryID.RecordAdd],
-                    (rec.host_id, int(rec.timestamp.timestamp()), rec.source, rec.message))
-        row = cur.fetchone()
-        rec.record_id = row[0]
+        # Consecutive records often share a timestamp, so we only convert
+        # a timestamp to a datetime when it changes.
+        last_stamp: int = -1
+        stamp: datetime = datetime.fromtimestamp(0)
+        for row in rows:
+            if row[2] != last_stamp:
+                last_stamp = row[2]
+                stamp = datetime.fromtimestamp(last_stamp)
+            msg: str = row[5]
+            if row[4] is not None:
+                msg = message_join(self.templates.lookup(cur, row[4]), msg)
+            yield Record(record_id=row[0],
+                         host_id=row[1],
+                         timestamp=stamp,
+                         source=self.sources.lookup(cur, row[3]),
+                         message=msg,
+                         repeats=row[6])
 
-    def record_get_by_host(self, host: int) -> list[Record]:
-        """Fetch all log records for the given Host."""
+    def __make_batch(self, rows: Iterable[tuple]) -> RecordBatch:
+        """Collect rows of (id, host_id, timestamp, source_id, template_id, body) in a batch."""
         cur: sqlite3.Cursor = self.db.cursor()
-        cur.execute(db_queries[QueryID.RecordGetByHost], (host, ))
-        results: list[Record] = []
-        for row in cur:
-            rec = Record(record_id=row[0],
-                         host_id=host,
-                         timestamp=datetime.fromtimestamp(row[1]),
-                         source=row[2],
-                         message=row[3])
-            results.append(rec)
-        return results
-
-    def record_get_by_period(self, begin: datetime, end: datetime) -> list[Record]:
+        batch = RecordBatch()
+        # Maps source IDs to their index in the batch's own source table.
+        sources: dict[int, int] = {}
+        for row in rows:
+            idx = sources.get(row[3])
+            if idx is None:
+                idx = sources[row[3]] = batch.intern(self.sources.lookup(cur, row[3]))
+            msg: str = row[5]
+            if row[4] is not None:
+                msg = message_join(self.templates.lookup(cur, row[4]), msg)
+            batch.ids.append(row[0])
+            batch.hosts.append(row[1])
+            batch.stamps.append(row[2])
+            batch.source_idx.append(idx)
+            batch.messages.append(msg)
+        return batch
+
+    def __iter_rows(self,
+                    part: str,
+                    query: QueryID,
+                    args: tuple,
+                    chunk: int) -> Iterator[tuple]:
+        """Run a query for records against a partition and yield the rows as they are fetched.
+
+        The query is expected to return the columns id, host_id, timestamp,
+        source_id, template_id, body, repeats and repeat_at, in that order.
+        """
+        cur: sqlite3.Cursor = self.db.cursor()
+        cur.execute(db_queries[query].format(part=part), args)
+        while rows := cur.fetchmany(chunk):
+            yield from rows
+
+    def __iter_partitions(self,
+                          parts: list[Partition],
+                          queries: tuple[QueryID, QueryID],
+                          args: tuple,
+                          limit: Optional[int],
+                          after: Optional[PageKey],
+                          chunk: int) -> Iterator[tuple]:
+        """Run a query against several partitions in turn and chain the resulting rows.
+
+        queries holds the plain query and the one that continues after a
+        page key. The partitions do not overlap, so if each query returns
+        its rows in order, so does the whole chain.
+        """
+        remaining: int = -1 if limit is None else limit
+        for part in parts:
+            if remaining == 0:
+                return
+            if after is not None and part.end <= after[0]:
+                continue
+            if after is None or part.begin > after[0]:
+                it = self.__iter_rows(part.name, queries[0], args + (remaining, ), chunk)
+            else:
+                it = self.__iter_rows(part.name,
+                                      queries[1],
+                                      args + after + (remaining, ),
+                                      chunk)
+            for row in it:
+                yield row
+                remaining -= 1
+
+    def __rows_by_host(self,
+                       host: int,
+                       limit: Optional[int],
+                       after: Optional[PageKey],
+                       chunk: int) -> Iterator[tuple]:
+        """Return the rows of the records of a Host, see record_iter_by_host."""
+        return self.__iter_partitions(self.partition_list(),
+                                      (QueryID.RecordGetByHost, QueryID.RecordGetByHostAfter),
+                                      (host, ),
+                                      limit,
+                                      after,
+                                      chunk)
+
+    def __rows_by_period(self,
+                         begin: datetime,
+                         end: datetime,
+                         limit: Optional[int],
+                         after: Optional[PageKey],
+                         chunk: int) -> Iterator[tuple]:
+        """Return the rows of the records of a period, see record_iter_by_host."""
+        t1: int = int(begin.timestamp())
+        t2: int = int(end.timestamp())
+        return self.__iter_partitions(self.__parts_between(t1, t2),
+                                      (QueryID.RecordGetByPeriod, QueryID.RecordGetByPeriodAfter),
+                                      (t1, t2),
+                                      limit,
+                                      after,
+                                      chunk)
+
+    def __rows_by_host_period(self,
+                              host: int,
+                              begin: datetime,
+                              end: datetime,
+                              limit: Optional[int],
+                              after: Optional[PageKey],
+                              chunk: int) -> Iterator[tuple]:
+        """Return the rows of the records of a Host in a period, see record_iter_by_host."""
+        t1: int = int(begin.timestamp())
+        t2: int = int(end.timestamp())
+        return self.__iter_partitions(self.__parts_between(t1, t2),
+                                      (QueryID.RecordGetByHostPeriod,
+                                       QueryID.RecordGetByHostPeriodAfter),
+                                      (host, t1, t2),
+                                      limit,
+                                      after,
+                                      chunk)
+
+    def record_iter_by_host(self,
+                            host: int,
+                            limit: Optional[int] = None,
+                            after: Optional[PageKey] = None,
+                            chunk: int = DEFAULT_FETCH_SIZE,
+                            expand: bool = False) -> Iterator[Record]:
+        """Iterate over the log records of the given Host, ordered by time.
+
+        At most limit Records are returned. If after is given, only Records
+        that come after the given page key are returned, see page_key().
+        If expand is True, records that were collapsed on ingest, see
+        silo.dedup, are returned one by one, as they came in. The repeats
+        of a record share its ID, so after cannot be used with expand.
+        """
+        if expand:
+            self.__check_expand(after)
+            rows = self.__rows_by_host(host, None, None, chunk)
+            return self.__make_records(islice(_expand_rows(rows, 0, 2**63 - 1), limit))
+        return self.__make_records(self.__rows_by_host(host, limit, after, chunk))
+
+    def __check_expand(self, after: Optional[PageKey]) -> None:
+        """Raise ValueError if a query that expands repeats was given a page key."""
+        if after is not None:
+            raise ValueError("Cannot continue after a page key when expanding repeats")
+
+    def record_iter_by_period(self,
+                              begin: datetime,
+                              end: datetime,
+                              limit: Optional[int] = None,
+                              after: Optional[PageKey] = None,
+                              chunk: int = DEFAULT_FETCH_SIZE,
+                              expand: bool = False) -> Iterator[Record]:
+        """Iterate over the log records of the given period, ordered by time.
+
+        See record_iter_by_host for limit, after and expand.
+        """
+        if expand:
+            self.__check_expand(after)
+            # A record from before the period may have repeats within it.
+            rows = self.__rows_by_period(begin - timedelta(seconds=MAX_WINDOW),
+                                         end,
+                                         None,
+                                         None,
+                                         chunk)
+            return self.__make_records(islice(_expand_rows(rows,
+                                                           int(begin.timestamp()),
+                                                           int(end.timestamp())),
+                                              limit))
+        return self.__make_records(self.__rows_by_period(begin, end, limit, after, chunk))
+
+    def record_iter_by_host_period(self,
+                                   host: int,
+                                   begin: datetime,
+                                   end: datetime,
+                                   limit: Optional[int] = None,
+                                   after: Optional[PageKey] = None,
+                                   chunk: int = DEFAULT_FETCH_SIZE,
+                                   expand: bool = False) -> Iterator[Record]:
+        """Iterate over the log records of the given Host in the given period, ordered by time.
+
+        See record_iter_by_host for limit, after and expand.
+        """
+        if expand:
+            self.__check_expand(after)
+            rows = self.__rows_by_host_period(host,
+                                              begin - timedelta(seconds=MAX_WINDOW),
+                                              end,
+                                              None,
+                                              None,
+                                              chunk)
+            return self.__make_records(islice(_expand_rows(rows,
+                                                           int(begin.timestamp()),
+                                                           int(end.timestamp())),
+                                              limit))
+        return self.__make_records(self.__rows_by_host_period(host,
+                                                              begin,
+                                                              end,
+                                                              limit,
+                                                              after,
+                                                              chunk))
+
+    def record_batch_by_host(self,
+                             host: int,
+                             limit: Optional[int] = None,
+                             after: Optional[PageKey] = None) -> RecordBatch:
+        """Fetch the log records of the given Host into a RecordBatch, ordered by time.
+
+        See record_iter_by_host for limit and after, and batch_page_key().
+        """
+        return self.__make_batch(self.__rows_by_host(host, limit, after, DEFAULT_FETCH_SIZE))
+
+    def record_batch_by_period(self,
+                               begin: datetime,
+                               end: datetime,
+                               limit: Optional[int] = None,
+                               after: Optional[PageKey] = None) -> RecordBatch:
+        """Fetch the log records of the given period into a RecordBatch, ordered by time."""
+        return self.__make_batch(self.__rows_by_period(begin,
+                                                       end,
+                                                       limit,
+                                                       after,
+                                                       DEFAULT_FETCH_SIZE))
+
+    def record_batch_by_host_period(self,
+                                    host: int,
+                                    begin: datetime,
+                                    end: datetime,
+                                    limit: Optional[int] = None,
+                                    after: Optional[PageKey] = None) -> RecordBatch:
+        """Fetch the log records of the given Host and period into a RecordBatch."""
+        return self.__make_batch(self.__rows_by_host_period(host,
+                                                            begin,
+                                                            end,
+                                                            limit,
+                                                            after,
+                                                            DEFAULT_FETCH_SIZE))
+
+    def record_get_by_host(self, host: int, expand: bool = False) -> list[Record]:
+        """Fetch all log records for the given Host, see record_iter_by_host for expand."""
+        return list(self.record_iter_by_host(host, expand=expand))
+
+    def record_get_by_period(self,
+                             begin: datetime,
+                             end: datetime,
+                             expand: bool = False) -> list[Record]:
         """Fetch all Records for the given period."""
+        return list(self.record_iter_by_period(begin, end, expand=expand))
+
+    def record_get_by_host_period(self,
+                                  host: int,
+                                  begin: datetime,
+                                  end: datetime,
+                                  expand: bool = False) -> list[Record]:
+        """Fetch all Records of the given Host in the given period."""
+        return list(self.record_iter_by_host_period(host, begin, end, expand=expand))
+
+    def query_plan(self, qid: QueryID, args: tuple, part: str = "") -> list[str]:
+        """Return the details of SQLite's query plan for the given query.
+
+        Record queries are planned for the given partition, or the most
+        recent one if part is empty.
+        """
+        if part == "":
+            parts = self.partition_list()
+            if parts:
+                part = parts[-1].name
         cur: sqlite3.Cursor = self.db.cursor()
-        cur.execute(db_queries[QueryID.RecordGetByPeriod],
-                    (int(begin.timestamp()), int(end.timestamp())))
-        results: list[Record] = []
-        for row in cur:
-            rec: Record = Record(record_id=row[0],
-                                 host_id=row[1],
-                                 timestamp=datetime.fromtimestamp(row[2]),
-                                 source=row[3],
-                                 message=row[4])
-            results.append(rec)
-        return results
+        cur.execute("EXPLAIN QUERY PLAN " + db_queries[qid].format(part=part), args)
+        return [row[3] for row in cur]
+
+    def record_search(self,
+                      query: str,
+                      host: Optional[int] = None,
+                      begin: Optional[datetime] = None,
+                      end: Optional[datetime] = None,
+                      limit: int = DEFAULT_SEARCH_LIMIT,
+                      by_rank: bool = True) -> list[Record]:
+        """Search the source and message of log records.
+
+        query uses the FTS5 query syntax, e.g. 'named AND "no valid signature"'
+        or 'message: resolv*'. The results may be restricted to a Host and/or
+        a period. They are ordered by relevance, best match first, unless
+        by_rank is False, in which case the most recently added records come
+        first. Ranking means scoring every match, so for terms that occur in
+        lots of records, the latter is a lot faster.
+        """
+        t1: int = 0 if begin is None else int(begin.timestamp())
+        t2: int = 2**63 - 1 if end is None else int(end.timestamp())
+        hid: int = 0 if host is None else host
+        args: tuple = (query, t1, t2, hid, hid, limit)
+        parts = self.__parts_between(t1, t2)
+        cur: sqlite3.Cursor = self.db.cursor()
+        rows: list[tuple] = []
+        if by_rank:
+            # Each partition ranks its matches on its own, we merge the
+            # best of each.
+            for part in parts:
+                cur.execute(db_queries[QueryID.RecordSearch].format(part=part.name), args)
+                rows.extend(cur.fetchall())
+            rows.sort(key=lambda row: row[8])
+        else:
+            for part in reversed(parts):
+                cur.execute(db_queries[QueryID.RecordSearchRecent].format(part=part.name),
+                            args)
+                rows.extend(cur.fetchall())
+                if len(rows) >= limit:
+                    break
+        return list(self.__make_records(rows[:limit]))
 
     def record_get_most_recent_by_host(self, host_id: int) -> Optional[datetime]:
         """Get the most recent timestamp of any log records by the given Host."""
         cur: sqlite3.Cursor = self.db.cursor()
-        cur.execute(db_queries[QueryID.RecordGetMostRecentByHost], (host_id, ))
-        row = cur.fetchone()
-        if row is not None:
-            return datetime.fromtimestamp(row[0])
+        for part in reversed(self.partition_list()):
+            cur.execute(db_queries[QueryID.RecordGetMostRecentByHost].format(part=part.name),
+                        (host_id, ))
+            row = cur.fetchone()
+            if row is not None and row[0] is not None:
+                return datetime.fromtimestamp(row[0])
         return None
 
+    def __source_id(self, cur: sqlite3.Cursor, source: str) -> Optional[int]:
+        """Return the ID of source without adding it, or None if it is unknown.
+
+        An empty source gives 0, which the rollup queries take to mean any source.
+        """
+        if source == "":
+            return 0
+        sid = self.sources.ids.get(source)
+        if sid is None:
+            cur.execute(db_queries[QueryID.SourceGetByName], (source, ))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            sid = row[0]
+        return sid
+
+    def rollup_histogram(self,
+                         begin: datetime,
+                         end: datetime,
+                         width: int = MINUTE,
+                         host: int = 0,
+                         source: str = "") -> list[HistogramBin]:
+        """Count the records of a period in buckets of width seconds.
+
+        width has to be one of the keys of RollupTables. The counts may be
+        restricted to a Host and/or a source. Every bucket overlapping the
+        period from begin to end (inclusive) is returned, in order, empty
+        ones with a count of 0. The counts come from the rollup tables, so
+        this costs the same no matter how many records there are.
+        """
+        table: str = rollup_table(width)
+        t1: int = int(begin.timestamp())
+        t1 -= t1 % width
+        t2: int = int(end.timestamp())
+        t2 -= t2 % width
+        counts: dict[int, int] = {}
+        cur: sqlite3.Cursor = self.db.cursor()
+        sid = self.__source_id(cur, source)
+        if sid is not None:
+            if host == 0:
+                cur.execute(db_queries[QueryID.RollupHistogram].format(table=table),
+                            (t1, t2, sid, sid))
+            else:
+                cur.execute(db_queries[QueryID.RollupHistogramHost].format(table=table),
+                            (host, t1, t2, sid, sid))
+            counts = dict(cur.fetchall())
+        return [(b, counts.get(b, 0)) for b in range(t1, t2 + 1, width)]
+
+    def rollup_top(self,
+                   key: RollupKey,
+                   begin: datetime,
+                   end: datetime,
+                   limit: int = DEFAULT_TOP_LIMIT,
+                   width: int = HOUR,
+                   host: int = 0,
+                   source: str = "") -> list[tuple[str, int]]:
+        """Return the Hosts or sources with the most records in a period, and their counts.
+
+        The period is widened to whole buckets of width seconds. The ranking
+        of Hosts may be restricted to a source, that of sources to a Host.
+        Returns (name, count) pairs, the busiest first.
+        """
+        table: str = rollup_table(width)
+        t1: int = int(begin.timestamp())
+        t1 -= t1 % width
+        t2: int = int(end.timestamp())
+        cur: sqlite3.Cursor = self.db.cursor()
+        match key:
+            case RollupKey.Host:
+                sid = self.__source_id(cur, source)
+                if sid is None:
+                    return []
+                cur.execute(db_queries[QueryID.RollupTopHosts].format(table=table),
+                            (t1, t2, sid, sid, limit))
+            case RollupKey.Source if host == 0:
+                cur.execute(db_queries[QueryID.RollupTopSources].format(table=table),
+                            (t1, t2, limit))
+            case RollupKey.Source:
+                cur.execute(db_queries[QueryID.RollupTopSourcesHost].format(table=table),
+                            (host, t1, t2, limit))
+        return cur.fetchall()
+
+
+def rollup_table(width: int) -> str:
+    """Return the name of the rollup table with buckets of width seconds.
+
+    Raises ValueError if there is no such table.
+    """
+    table = RollupTables.get(width)
+    if table is None:
+        raise ValueError(f"No rollups with buckets of {width}s, only {list(RollupTables)}")
+    return table
+
+
+def _expand_rows(rows: Iterable[tuple], begin: int, end: int) -> Iterator[tuple]:
+    """Yield record rows ordered by time, with each collapsed repeat as a row of its own.
+
+    The repeats of a row come after it, possibly after the rows following
+    it, so they are held in a heap until no row can come before them.
+    Only rows with a timestamp from begin to end are passed on.
+    """
+    pending: list[tuple[int, int, int, tuple]] = []
+    for row in rows:
+        stamp: int = row[2]
+        while pending and pending[0][0] < stamp:
+            out = heappop(pending)[3]
+            if begin <= out[2] <= end:
+                yield out
+        heappush(pending, (stamp, row[0], 0, row[:6] + (0, "")))
+        if row[6]:
+            for n, off in enumerate(row[7].split(), 1):
+                t: int = stamp + int(off)
+                heappush(pending, (t, row[0], n, (row[0], row[1], t) + row[3:6] + (0, "")))
+    while pending:
+        out = heappop(pending)[3]
+        if begin <= out[2] <= end:
+            yield out
+
+
+def page_key(rec: Record) -> PageKey:
+    """Return the key to pass to the record_iter_* methods to continue after rec."""
+    return (int(rec.timestamp.timestamp()), rec.record_id)
+
+
+def batch_page_key(batch: RecordBatch) -> PageKey:
+    """Return the key to pass to the record_batch_* methods to continue after batch."""
+    return (batch.stamps[-1], batch.ids[-1])
+
+
+class BatchWriter:
+    """BatchWriter buffers Records and writes them to the database in batches.
+
+    A batch is written once batch_size Records have piled up, or when a
+    Record is added more than interval seconds after the oldest buffered
+    one. There is no timer involved, so the owner should call flush()
+    when it runs out of Records to add.
+    """
+
+    __slots__ = [
+        "db",
+        "batch_size",
+        "interval",
+        "want_ids",
+        "buf",
+        "oldest",
+    ]
+
+    db: Database
+    batch_size: int
+    interval: float
+    want_ids: bool
+    buf: list[Record]
+    oldest: float
+
+    def __init__(self,
+                 db: Database,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 interval: float = DEFAULT_FLUSH_INTERVAL,
+                 want_ids: bool = False) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.want_ids = want_ids
+        self.buf = []
+        self.oldest = 0.0
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        if ex_type is None:
+            self.flush()
+        return False
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def add(self, rec: Record) -> int:
+        """Buffer a Record, write the batch if it is due.
+
+        Returns the number of Records written to the database.
+        """
+        if not self.buf:
+            self.oldest = time.monotonic()
+        self.buf.append(rec)
+        if len(self.buf) >= self.batch_size or \
+           time.monotonic() - self.oldest >= self.interval:
+            return self.flush()
+        return 0
+
+    def flush(self) -> int:
+        """Write all buffered Records to the database."""
+        if not self.buf:
+            return 0
+        cnt: int = self.db.record_add_batch(self.buf, self.want_ids, self.batch_size)
+        self.buf = []
+        return cnt
+
+
+class PoolError(Exception):
+    """Raised when a DBPool cannot hand out a connection."""
+
+
+class PoolTimeout(PoolError):
+    """Raised when all connections of a DBPool stay in use for too long."""
+
+
+@dataclass(slots=True, kw_only=True)
+class PoolStats:
+    """PoolStats is a snapshot of the counters of the read-only or read-write side of a DBPool.
+
+    Checkout times include opening a new connection, if one was needed.
+    """
+
+    size: int = 0
+    open: int = 0
+    in_use: int = 0
+    peak: int = 0
+    checkouts: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    created: int = 0
+    evicted: int = 0
+    checkout_total: float = 0.0
+    checkout_max: float = 0.0
+
+    @property
+    def checkout_avg(self) -> float:
+        """Return the average time a checkout took in seconds."""
+        if self.checkouts == 0:
+            return 0.0
+        return self.checkout_total / self.checkouts
+
+    @property
+    def saturation(self) -> float:
+        """Return the share of connections in use, from 0.0 to 1.0."""
+        if self.size == 0:
+            return 0.0
+        return self.in_use / self.size
+
+
+class _ConnectionSet:
+    """_ConnectionSet is one side of a DBPool, a bounded set of connections of the same kind."""
+
+    __slots__ = [
+        "connect",
+        "size",
+        "idle_time",
+        "cond",
+        "idle",
+        "total",
+        "closed",
+        "counters",
+    ]
+
+    connect: Callable[[], Database]
+    size: int
+    idle_time: float
+    cond: Condition
+    idle: list[tuple[Database, float]]
+    total: int
+    closed: bool
+    counters: PoolStats
+
+    def __init__(self, connect: Callable[[], Database], size: int, idle_time: float) -> None:
+        if size < 1:
+            raise ValueError(f"A connection pool needs at least one connection, not {size}")
+        self.connect = connect
+        self.size = size
+        self.idle_time = idle_time
+        self.cond = Condition()
+        # The idle connections and when they were returned, most recent last.
+        self.idle = []
+        # The connections that are open or being opened.
+        self.total = 0
+        self.closed = False
+        self.counters = PoolStats(size=size)
+
+    def checkout(self, timeout: float) -> Database:
+        """Take a connection, opening a new one if there is room and none is idle.
+
+        If all connections are in use, wait up to timeout seconds for one to
+        be returned, then raise PoolTimeout.
+        """
+        t0: float = time.monotonic()
+        waited: bool = False
+        db: Optional[Database] = None
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise PoolError("Connection pool has been closed")
+                self.evict(t0)
+                if self.idle:
+                    db = self.idle.pop()[0]
+                    break
+                if self.total < self.size:
+                    self.total += 1
+                    break
+                remaining: float = t0 + timeout - time.monotonic()
+                if remaining <= 0:
+                    self.counters.timeouts += 1
+                    raise PoolTimeout(f"All {self.size} connections stayed busy for {timeout}s")
+                waited = True
+                self.cond.wait(remaining)
+
+        fresh: bool = db is None
+        if db is None:
+            try:
+                db = self.connect()
+            except BaseException:
+                with self.cond:
+                    self.total -= 1
+                    self.cond.notify()
+                raise
+
+        elapsed: float = time.monotonic() - t0
+        with self.cond:
+            c = self.counters
+            c.checkouts += 1
+            c.in_use += 1
+            c.peak = max(c.peak, c.in_use)
+            c.checkout_total += elapsed
+            c.checkout_max = max(c.checkout_max, elapsed)
+            if waited:
+                c.waits += 1
+            if fresh:
+                c.created += 1
+        return db
+
+    def checkin(self, db: Database) -> None:
+        """Return a connection.
+
+        A transaction left open is rolled back, along with the IDs and
+        partitions the connection learned during it. If that fails, the
+        connection is closed rather than handed out again.
+        """
+        usable: bool = True
+        if db.db.in_transaction:
+            try:
+                db.rollback()
+            except sqlite3.Error:
+                usable = False
+        with self.cond:
+            self.counters.in_use -= 1
+            if usable and not self.closed:
+                self.idle.append((db, time.monotonic()))
+            else:
+                db.close()
+                self.total -= 1
+            self.cond.notify()
+
+    def evict(self, now: float) -> int:
+        """Close the connections that have been idle for idle_time seconds or longer.
+
+        The caller must hold cond. Returns the number of connections closed.
+        """
+        cnt: int = 0
+        while self.idle and now - self.idle[0][1] >= self.idle_time:
+            self.idle.pop(0)[0].close()
+            cnt += 1
+        self.total -= cnt
+        self.counters.evicted += cnt
+        return cnt
+
+    def close(self) -> None:
+        """Close the idle connections, and the others once they are returned."""
+        with self.cond:
+            self.closed = True
+            for db, _ in self.idle:
+                db.close()
+            self.total -= len(self.idle)
+            self.idle = []
+            self.cond.notify_all()
+
+    def stats(self) -> PoolStats:
+        """Return a snapshot of the counters."""
+        with self.cond:
+            c = self.counters
+            return PoolStats(size=self.size,
+                             open=self.total,
+                             in_use=c.in_use,
+                             peak=c.peak,
+                             checkouts=c.checkouts,
+                             waits=c.waits,
+                             timeouts=c.timeouts,
+                             created=c.created,
+                             evicted=c.evicted,
+                             checkout_total=c.checkout_total,
+                             checkout_max=c.checkout_max)
+
 
 class DBPool:
-    """DBPool implements a connection pool to provide per-thread database connections."""
+    """DBPool hands out database connections to any number of threads.
+
+    It keeps two bounded sets of connections: read-only ones for queries,
+    and read-write ones for everything else. Connections are opened as
+    needed and reused, so the setup cost is only paid once per connection.
+    Connections that have not been used for idle seconds are closed.
 
-    pool: local
+    If all connections of a kind are in use, a checkout waits up to timeout
+    seconds for one to be returned, then raises PoolTimeout. stats() tells
+    how long checkouts take and how busy the pool is.
 
-    def __init__(self) -> None:
-        self.pool = local()
+    Connections are checked out with the reader() and writer() context
+    managers, and must not be kept around after the with block.
+    """
+
+    __slots__ = [
+        "path",
+        "timeout",
+        "readers",
+        "writers",
+    ]
+
+    path: str
+    timeout: float
+    readers: _ConnectionSet
+    writers: _ConnectionSet
 
-    def get_db(self) -> Database:
+    def __init__(self,
+                 path: str = "",
+                 readers: int = DEFAULT_POOL_READERS,
+                 writers: int = DEFAULT_POOL_WRITERS,
+                 idle: float = DEFAULT_POOL_IDLE,
+                 timeout: float = DEFAULT_POOL_TIMEOUT,
+                 pragmas: Optional[Pragmas] = None,
+                 compact: bool = False) -> None:
+        if path == "":
+            path = common.path.db()
+        self.path = path
+        self.timeout = timeout
+        self.readers = _ConnectionSet(lambda: Database(path,
+                                                       pragmas=pragmas,
+                                                       readonly=True,
+                                                       shared=True),
+                                      readers,
+                                      idle)
+        self.writers = _ConnectionSet(lambda: Database(path,
+                                                       compact=compact,
+                                                       pragmas=pragmas,
+                                                       shared=True),
+                                      writers,
+                                      idle)
+        # Open a read-write connection right away, so the database exists
+        # and is up to date before the first reader looks at it.
+        with self.writer():
+            pass
+
+    @contextmanager
+    def reader(self, timeout: Optional[float] = None) -> Iterator[Database]:
+        """Check out a read-only connection for the duration of a with block."""
+        db = self.readers.checkout(self.timeout if timeout is None else timeout)
+        try:
+            yield db
+        finally:
+            self.readers.checkin(db)
+
+    @contextmanager
+    def writer(self, timeout: Optional[float] = None) -> Iterator[Database]:
+        """Check out a read-write connection for the duration of a with block."""
+        db = self.writers.checkout(self.timeout if timeout is None else timeout)
         try:
-            return self.pool.db
-        except AttributeError:
-            self.pool.db = Database()
-            return self.pool.db
+            yield db
+        finally:
+            self.writers.checkin(db)
+
+    def evict(self) -> int:
+        """Close all connections that have been idle for too long, return how many."""
+        now: float = time.monotonic()
+        cnt: int = 0
+        for conns in (self.readers, self.writers):
+            with conns.cond:
+                cnt += conns.evict(now)
+        return cnt
+
+    def stats(self) -> dict[str, PoolStats]:
+        """Return snapshots of the counters of the read-only and read-write connections."""
+        return {"read": self.readers.stats(), "write": self.writers.stats()}
+
+    def close(self) -> None:
+        """Close all connections. Connections still in use are closed when they are returned."""
+        self.readers.close()
+        self.writers.close()
 
 # Local Variables: #
 # python-indent: 4 #
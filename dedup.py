@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:18:35 krylon>
+#
+# /data/code/python/silo/dedup.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.dedup
+
+Collapse bursts of identical records into one stored record.
+
+Noisy hosts tend to repeat themselves, e.g. a resolver complaining about
+the same zone every few minutes. A Deduplicator remembers the records it
+has let through recently, keyed by Host, source and message. A record that
+matches one of them within window seconds is not stored again. Instead, the
+record it repeats counts it and remembers when it came in, so queries can
+expand it again, see Database.record_iter_by_host.
+
+The first record of a burst is stored right away, so nothing waits for a
+window to close.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Final
+
+from silo.data import RecordRow
+
+# The largest window we accept, in seconds. Queries that expand repeats look
+# back this far for records whose repeats fall into the period asked for.
+MAX_WINDOW: Final[int] = 3600
+
+# The default window, in seconds.
+DEFAULT_WINDOW: Final[int] = 300
+
+# The default number of distinct records a Deduplicator remembers.
+DEFAULT_MAX_KEYS: Final[int] = 10000
+
+# A record is identified by (host_id, source, message).
+RepeatKey = tuple[int, str, str]
+
+
+@dataclass(slots=True, kw_only=True)
+class DedupStats:
+    """DedupStats is a snapshot of a Deduplicator's counters."""
+
+    keys: int = 0
+    records: int = 0
+    collapsed: int = 0
+    evicted: int = 0
+
+
+class Entry:
+    """Entry is a stored record that later ones may repeat.
+
+    offsets holds the distance in seconds of each repeat from stamp that
+    has not been written to the database yet.
+    """
+
+    __slots__ = [
+        "record_id",
+        "stamp",
+        "offsets",
+    ]
+
+    record_id: int
+    stamp: int
+    offsets: list[int]
+
+    def __init__(self, stamp: int) -> None:
+        self.record_id = 0
+        self.stamp = stamp
+        self.offsets = []
+
+
+class Deduplicator:
+    """Deduplicator decides which records to store and which ones to count.
+
+    It keeps at most max_keys records in an LRU, so it costs bounded memory
+    no matter how many distinct lines come in; a line that has been pushed
+    out is simply stored again the next time. A Deduplicator is meant to be
+    used by the one thread writing records, e.g. an IngestQueue's, and only
+    with one database.
+    """
+
+    __slots__ = [
+        "window",
+        "max_keys",
+        "recent",
+        "dirty",
+        "counters",
+    ]
+
+    window: int
+    max_keys: int
+    recent: OrderedDict[RepeatKey, Entry]
+    dirty: dict[int, tuple[RepeatKey, Entry]]
+    counters: DedupStats
+
+    def __init__(self, window: int = DEFAULT_WINDOW, max_keys: int = DEFAULT_MAX_KEYS) -> None:
+        if not 0 < window <= MAX_WINDOW:
+            raise ValueError(f"Window must be between 1 and {MAX_WINDOW} seconds, not {window}")
+        if max_keys < 1:
+            raise ValueError(f"max_keys must be positive, not {max_keys}")
+        self.window = window
+        self.max_keys = max_keys
+        self.recent = OrderedDict()
+        self.dirty = {}
+        self.counters = DedupStats()
+
+    def split(self, rows: list[RecordRow]) -> tuple[list[RecordRow], list[Entry]]:
+        """Sort out the rows that repeat a recent one.
+
+        Returns the rows to store and an Entry for each of them, whose
+        record_id the caller fills in once they have been inserted. The
+        repeats are held until take_repeats() is called.
+        """
+        fresh: list[RecordRow] = []
+        entries: list[Entry] = []
+        for row in rows:
+            key: RepeatKey = (row[0], row[2], row[3])
+            entry = self.recent.get(key)
+            if entry is not None and 0 <= row[1] - entry.stamp <= self.window:
+                entry.offsets.append(row[1] - entry.stamp)
+                self.dirty[id(entry)] = (key, entry)
+                self.recent.move_to_end(key)
+                self.counters.collapsed += 1
+                continue
+            entry = Entry(row[1])
+            self.recent[key] = entry
+            self.recent.move_to_end(key)
+            if len(self.recent) > self.max_keys:
+                self.recent.popitem(last=False)
+                self.counters.evicted += 1
+            fresh.append(row)
+            entries.append(entry)
+        self.counters.records += len(rows)
+        return fresh, entries
+
+    def take_repeats(self) -> list[tuple[RepeatKey, Entry, list[int]]]:
+        """Return the repeats collected since the last call as (key, Entry, offsets).
+
+        An Entry that has been replaced or pushed out of the LRU in the
+        meantime still gets its repeats.
+        """
+        result: list[tuple[RepeatKey, Entry, list[int]]] = []
+        for key, entry in self.dirty.values():
+            result.append((key, entry, entry.offsets))
+            entry.offsets = []
+        self.dirty = {}
+        return result
+
+    def forget(self, key: RepeatKey, entry: Entry) -> None:
+        """Forget entry, e.g. because the record it stands for has expired.
+
+        The next record with the same key is stored again.
+        """
+        if self.recent.get(key) is entry:
+            del self.recent[key]
+
+    def clear(self) -> None:
+        """Forget everything, e.g. because the records we remember were rolled back."""
+        self.recent.clear()
+        self.dirty = {}
+
+    def stats(self) -> DedupStats:
+        """Return a snapshot of the counters."""
+        c = self.counters
+        return DedupStats(keys=len(self.recent),
+                          records=c.records,
+                          collapsed=c.collapsed,
+                          evicted=c.evicted)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:16:15 krylon>
+#
+# /data/code/python/silo/encoding.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.encoding
+
+A compact binary encoding for batches of records, used for Packed frames
+and thus the agent's spool.
+
+A batch starts with one byte giving the version of the layout. Version 1
+looks like this, all integers being unsigned LEB128 varints:
+
+- The string table: the number of strings, then each string as its length
+  in bytes followed by its UTF-8 encoding. It holds every host name and
+  source that occurs in the batch, once.
+- The number of records.
+- The timestamps, each as the difference to the previous one, zigzag
+  encoded, so records that arrive in order take one byte each. The first
+  one is relative to 0.
+- For each record, the index of its host name in the string table. An empty
+  name means the Host that sent the batch.
+- For each record, the index of its source in the string table.
+- For each record, the length of its message in characters.
+- The number of bytes of the messages, followed by all the messages in a
+  row, in UTF-8.
+
+Storing the fields column by column keeps similar values together, which
+makes the result compress much better, and lets the decoder deal with the
+messages in one go.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+from datetime import datetime
+from itertools import accumulate
+from typing import Callable, Final, Iterable, Mapping, Optional, Sequence
+
+from silo.data import STAMP_MAX, STAMP_MIN, Record, RecordRow
+
+SCHEMA_VERSION: Final[int] = 1
+
+# A varint for a 64 bit value takes at most this many bytes.
+MAX_VARINT_LEN: Final[int] = 10
+
+# Strings may contain lone surrogates, e.g. from undecodable bytes in a log
+# file. The database cannot store them, so the encoder replaces each of them
+# with a question mark, which keeps the message lengths in characters intact.
+# The decoder rejects them.
+ERRORS: Final[str] = "replace"
+
+# A record as the encoder sees it: (host name, timestamp, source, message).
+NamedRow = tuple[str, int, str, str]
+
+
+class EncodingError(ValueError):
+    """Raised when a batch cannot be decoded."""
+
+
+def zigzag(n: int) -> int:
+    """Map a signed integer to an unsigned one, so small negative numbers stay small."""
+    return n << 1 if n >= 0 else (~n << 1) | 1
+
+
+def unzigzag(z: int) -> int:
+    """Undo zigzag()."""
+    return (z >> 1) ^ -(z & 1)
+
+
+def write_varints(out: bytearray, values: Iterable[int]) -> None:
+    """Append the unsigned integers in values to out as varints."""
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7f) | 0x80)
+            v >>= 7
+        out.append(v)
+
+
+def read_varints(data: bytes, pos: int, cnt: int) -> tuple[list[int], int]:
+    """Read cnt varints from data, starting at pos.
+
+    Returns the values and the position after the last one.
+    """
+    values: list[int] = []
+    append = values.append
+    try:
+        for _ in range(cnt):
+            b: int = data[pos]
+            pos += 1
+            if b < 0x80:
+                append(b)
+                continue
+            val: int = b & 0x7f
+            shift: int = 7
+            while True:
+                b = data[pos]
+                pos += 1
+                val |= (b & 0x7f) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+                if shift >= 7 * MAX_VARINT_LEN:
+                    raise EncodingError(f"Varint at offset {pos} is too long")
+            append(val)
+    except IndexError as err:
+        raise EncodingError("Batch is truncated") from err
+    return values, pos
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """Read a single varint from data at pos, return it and the position after it."""
+    values, pos = read_varints(data, pos, 1)
+    return values[0], pos
+
+
+def encode_rows(rows: Iterable[NamedRow], errors: str = ERRORS) -> bytes:
+    """Encode records given as (host name, timestamp, source, message).
+
+    errors is handed to str.encode, it decides what becomes of strings that
+    are not valid Unicode.
+    """
+    table: dict[str, int] = {}
+    stamps: list[int] = []
+    hosts: list[int] = []
+    sources: list[int] = []
+    lengths: list[int] = []
+    messages: list[str] = []
+    last: int = 0
+    for host, stamp, source, message in rows:
+        stamps.append(zigzag(stamp - last))
+        last = stamp
+        idx = table.get(host)
+        if idx is None:
+            idx = table[host] = len(table)
+        hosts.append(idx)
+        idx = table.get(source)
+        if idx is None:
+            idx = table[source] = len(table)
+        sources.append(idx)
+        lengths.append(len(message))
+        messages.append(message)
+
+    out = bytearray((SCHEMA_VERSION,))
+    write_varints(out, (len(table),))
+    for s in table:
+        raw: bytes = s.encode("utf-8", errors)
+        write_varints(out, (len(raw),))
+        out += raw
+    write_varints(out, (len(stamps),))
+    write_varints(out, stamps)
+    write_varints(out, hosts)
+    write_varints(out, sources)
+    write_varints(out, lengths)
+    text: bytes = "".join(messages).encode("utf-8", errors)
+    write_varints(out, (len(text),))
+    out += text
+    return bytes(out)
+
+
+def encode(records: Sequence[Record], hosts: Optional[Mapping[int, str]] = None) -> bytes:
+    """Encode a batch of Records.
+
+    If hosts maps host IDs to names, the Records carry the names of their
+    Hosts, otherwise they belong to whoever sends the batch.
+    """
+    names: Mapping[int, str] = hosts if hosts is not None else {}
+    rows: list[NamedRow] = []
+    last: Optional[datetime] = None
+    stamp: int = 0
+    for r in records:
+        # Consecutive records often share a timestamp.
+        if r.timestamp is not last:
+            last = r.timestamp
+            stamp = int(last.timestamp())
+        rows.append((names.get(r.host_id, ""), stamp, r.source, r.message))
+    return encode_rows(rows)
+
+
+def decode(data: bytes,
+           host_id: int = 0,
+           resolve: Optional[Callable[[str], int]] = None) -> list[RecordRow]:
+    """Decode a batch into rows ready to be inserted into the database.
+
+    Records without a host name get host_id. For the others, resolve is
+    called once per name to look up the ID of the Host.
+    Raises EncodingError if the data is malformed, or if it holds anything
+    the database cannot store, i.e. strings that are not valid UTF-8 or
+    timestamps that do not fit into 64 bits.
+    """
+    if not data:
+        raise EncodingError("Batch is empty")
+    if data[0] != SCHEMA_VERSION:
+        raise EncodingError(f"Unsupported schema version {data[0]}")
+    pos: int = 1
+    size, pos = read_varint(data, pos)
+    if size > len(data):
+        raise EncodingError(f"String table of {size} entries does not fit the batch")
+    table: list[str] = []
+    for _ in range(size):
+        length, pos = read_varint(data, pos)
+        if pos + length > len(data):
+            raise EncodingError("Batch is truncated")
+        try:
+            table.append(str(data[pos:pos + length], "utf-8"))
+        except UnicodeDecodeError as err:
+            raise EncodingError(f"String table is not valid UTF-8: {err}") from err
+        pos += length
+
+    cnt, pos = read_varint(data, pos)
+    # Each record takes at least four bytes.
+    if cnt * 4 > len(data) - pos:
+        raise EncodingError(f"{cnt} records do not fit the batch")
+    deltas, pos = read_varints(data, pos, cnt)
+    host_idx, pos = read_varints(data, pos, cnt)
+    source_idx, pos = read_varints(data, pos, cnt)
+    lengths, pos = read_varints(data, pos, cnt)
+    length, pos = read_varint(data, pos)
+    if pos + length != len(data):
+        raise EncodingError("Batch is truncated or has trailing garbage")
+    try:
+        text: str = str(data[pos:], "utf-8")
+    except UnicodeDecodeError as err:
+        raise EncodingError(f"Messages are not valid UTF-8: {err}") from err
+
+    offsets: list[int] = list(accumulate(lengths, initial=0))
+    if offsets[-1] != len(text):
+        raise EncodingError("Message lengths do not match the text")
+    try:
+        ids: dict[int, int] = {}
+        for idx in set(host_idx):
+            name: str = table[idx]
+            if name == "":
+                ids[idx] = host_id
+            elif resolve is None:
+                raise EncodingError(f"Batch refers to Host {name} by name")
+            else:
+                ids[idx] = resolve(name)
+        hids: list[int] = [ids[i] for i in host_idx]
+        sources: list[str] = [table[i] for i in source_idx]
+    except IndexError as err:
+        raise EncodingError("Reference past the end of the string table") from err
+    stamps: list[int] = list(accumulate(unzigzag(d) for d in deltas))
+    if stamps and not STAMP_MIN <= min(stamps) <= max(stamps) <= STAMP_MAX:
+        raise EncodingError("Timestamp out of range")
+    return list(zip(hids,
+                    stamps,
+                    sources,
+                    [text[a:b] for a, b in zip(offsets, offsets[1:])]))
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
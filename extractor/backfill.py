@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/extractor/backfill.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.backfill
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Final, Iterator, Optional
+
+from silo import common
+from silo.data import RecordBatch
+from silo.database import DEFAULT_BATCH_SIZE, Database
+from silo.extractor.formats import LineParser
+from silo.extractor.mapped import read_file_batch
+
+# The size of the pieces files are cut into for parsing, in bytes.
+DEFAULT_CHUNK_SIZE: Final[int] = 16 * 2**20
+
+# The number of chunks per worker process that may be parsed or waiting
+# to be written at any time.
+CHUNKS_PER_WORKER: Final[int] = 2
+
+
+@dataclass(slots=True, kw_only=True)
+class BackfillStats:
+    """BackfillStats sums up a backfill."""
+
+    files: int = 0
+    chunks: int = 0
+    bytes: int = 0
+    records: int = 0
+    unmatched: int = 0
+    elapsed: float = 0.0
+
+
+def split_ranges(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[tuple[int, int]]:
+    """Cut a file into ranges of about chunk_size bytes that begin and end at line boundaries.
+
+    Returns a list of (begin, end) offsets, end being exclusive.
+    """
+    size: int = os.path.getsize(path)
+    ranges: list[tuple[int, int]] = []
+    begin: int = 0
+    with open(path, "rb") as fh:
+        while begin < size:
+            end: int = begin + chunk_size
+            if end >= size:
+                end = size
+            else:
+                fh.seek(end)
+                fh.readline()
+                end = fh.tell()
+            ranges.append((begin, end))
+            begin = end
+    return ranges
+
+
+def parse_range(path: str, begin: int, end: int) -> tuple[RecordBatch, int]:
+    """Parse the lines of a file between the offsets begin and end.
+
+    This runs in the worker processes. The Records are returned as a
+    RecordBatch, which is cheap to send back, since its columns pickle as
+    plain arrays, along with the number of lines that could not be parsed.
+    """
+    p = LineParser()
+    batch, _ = read_file_batch(path, p, begin, end)
+    return batch, p.stats.unmatched
+
+
+def parse_files(files: list[str],
+                workers: int = 0,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                stats: Optional[BackfillStats] = None) -> Iterator[RecordBatch]:
+    """Parse files on a pool of worker processes, yield the results chunk by chunk.
+
+    The chunks are yielded as they are done, not necessarily in order.
+    Only a few chunks per worker are in flight at any time, so if the
+    consumer falls behind, the workers wait for it.
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if stats is None:
+        stats = BackfillStats()
+    todo: list[tuple[str, int, int]] = []
+    for path in files:
+        todo.extend((path, b, e) for b, e in split_ranges(path, chunk_size))
+        stats.files += 1
+    todo.reverse()
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending: set[Future] = set()
+        while todo or pending:
+            while todo and len(pending) < workers * CHUNKS_PER_WORKER:
+                path, begin, end = todo.pop()
+                pending.add(pool.submit(parse_range, path, begin, end))
+                stats.bytes += end - begin
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                batch, unmatched = fut.result()
+                stats.chunks += 1
+                stats.records += len(batch)
+                stats.unmatched += unmatched
+                yield batch
+
+
+def backfill(db: Database,
+             host_id: int,
+             files: list[str],
+             workers: int = 0,
+             chunk_size: int = DEFAULT_CHUNK_SIZE,
+             batch_size: int = DEFAULT_BATCH_SIZE) -> BackfillStats:
+    """Import log files into the database for the given Host.
+
+    The files are parsed in parallel, but only the calling process writes
+    to the database.
+    """
+    stats = BackfillStats()
+    t0: float = time.perf_counter()
+    for batch in parse_files(files, workers, chunk_size, stats):
+        batch.set_host(host_id)
+        db.record_add_columns(batch, False, batch_size)
+    stats.elapsed = time.perf_counter() - t0
+    return stats
+
+
+def main() -> None:
+    """Import log files from the command line."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-H", "--host", required=True,
+                      help="The name of the Host the logs come from")
+    argp.add_argument("-d", "--db", default="",
+                      help="The path of the database")
+    argp.add_argument("-w", "--workers", type=int, default=0,
+                      help="Number of worker processes, defaults to the number of CPUs")
+    argp.add_argument("-c", "--compact", action="store_true",
+                      help="Store messages as templates and parameters")
+    argp.add_argument("files", nargs="+",
+                      help="The log files to import")
+    args = argp.parse_args()
+
+    log = common.get_logger("backfill")
+    db = Database(args.db, compact=args.compact)
+    host = db.host_get_or_add(args.host)
+    stats = backfill(db, host.host_id, args.files, args.workers)
+    log.info("Imported %d records (%d lines not understood) from %d files in %.1f seconds",
+             stats.records,
+             stats.unmatched,
+             stats.files,
+             stats.elapsed)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 18:18:25 krylon>
+# Time-stamp: <2026-10-18 19:32:21 krylon>
 #
 # /data/code/python/silo/extractor/base.py
 # created on 09. 08. 2024
@@ -16,22 +16,65 @@ silo.base
 (c) 2024 Benjamin Walkenhorst
 """
 
+import asyncio
 from abc import ABC, abstractmethod
 from datetime import datetime
+from typing import AsyncIterator, Final, Iterator
 
-from silo.data import Record
+from silo.data import Record, RecordBatch
+
+# The default number of Records an extractor hands out at a time.
+DEFAULT_BATCH_SIZE: Final[int] = 1000
 
 
 class BaseExtractor(ABC):
-    """Abstract base class for log extractors."""
+    """Abstract base class for log extractors.
+
+    Extractors hand out Records in batches of bounded size, so reading a
+    large backlog does not take more memory than a small one. Extractors
+    that keep checkpoints consider a batch done once the next one is
+    requested. If the consumer stops early, the last batch it got will be
+    read again next time.
+    """
 
     @abstractmethod
     def init(self) -> None:
         """Open the log."""
 
     @abstractmethod
+    def batches(self, begin: datetime, size: int = DEFAULT_BATCH_SIZE) -> Iterator[list[Record]]:
+        """Yield the Records from begin on, at most size at a time."""
+
+    def columns(self, begin: datetime, size: int = DEFAULT_BATCH_SIZE) -> Iterator[RecordBatch]:
+        """Yield the same Records as batches(), as RecordBatches.
+
+        Extractors that can fill a RecordBatch without building Records
+        first should override this.
+        """
+        for batch in self.batches(begin, size):
+            yield RecordBatch.from_records(batch)
+
+    async def abatches(self,
+                       begin: datetime,
+                       size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[list[Record]]:
+        """Yield the same as batches(), reading on a worker thread to keep the event loop going."""
+        it = self.batches(begin, size)
+        try:
+            while (batch := await asyncio.to_thread(next, it, None)) is not None:
+                yield batch
+        finally:
+            it.close()
+
     def read(self, begin: datetime) -> list[Record]:
-        """Read the log."""
+        """Read the log.
+
+        This collects all Records in one list, no matter how many there are.
+        Prefer batches() for anything that might be large.
+        """
+        records: list[Record] = []
+        for batch in self.batches(begin):
+            records.extend(batch)
+        return records
 
     @abstractmethod
     def close(self) -> None:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:04:40 krylon>
+#
+# /data/code/python/silo/extractor/checkpoint.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.checkpoint
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import json
+import logging
+import os
+from threading import Lock
+from typing import Any, Optional
+
+from silo import common
+
+
+class CheckpointStore:
+    """CheckpointStore remembers how far the extractors have read, so they can pick up
+    where they left off after a restart.
+
+    Each extractor keeps its position under a key of its own, e.g. the path of
+    a log file. The positions are kept in a JSON file, which is replaced as a
+    whole on save(), so a crash never leaves a half-written file behind.
+    """
+
+    __slots__ = [
+        "log",
+        "path",
+        "lock",
+        "data",
+    ]
+
+    log: logging.Logger
+    path: str
+    lock: Lock
+    data: dict[str, Any]
+
+    def __init__(self, path: str = "") -> None:
+        if path == "":
+            path = common.path.checkpoint()
+        self.log = common.get_logger("checkpoint")
+        self.path = path
+        self.lock = Lock()
+        self.data = {}
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                self.data = json.load(fh)
+        except FileNotFoundError:
+            pass
+        except ValueError as err:
+            self.log.error("Cannot load checkpoints from %s, starting over: %s",
+                           path,
+                           err)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the checkpoint stored under key, if any."""
+        with self.lock:
+            return self.data.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a checkpoint. It is not written to disk until save() is called."""
+        with self.lock:
+            self.data[key] = value
+
+    def save(self) -> None:
+        """Write all checkpoints to disk."""
+        tmp: str = f"{self.path}.tmp"
+        with self.lock:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self.data, fh)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
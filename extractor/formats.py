@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:28:28 krylon>
+#
+# /data/code/python/silo/extractor/formats.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.formats
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import json
+import mmap
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Final, Optional, Union
+
+from silo.data import Record, RecordBatch
+from silo.extractor.timestamp import IsoTimestamp, SyslogTimestamp, months
+
+# Classic BSD syslog, e.g.
+# Aug  9 00:00:04 wintermute named[951]: success resolving ...
+line_pat: Final[re.Pattern] = re.compile(
+    r"""^(\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2}) \s+ # timestamp
+    (\S+) \s+ # hostname
+    ([^\s\[:]+)(?:\[\d+\])?: \s+ # source
+    (.*)$""",
+    re.I | re.X)
+
+# The bytes versions of the patterns are used to find lines in a buffer,
+# so they must never match across a line break.
+line_bpat: Final[re.Pattern] = re.compile(
+    rb"""^(\w{3}[ \t]+\d{1,2}[ \t]\d{2}:\d{2}:\d{2}) [ \t]+ # timestamp
+    (\S+) [ \t]+ # hostname
+    ([^\s\[:]+)(?:\[\d+\])?: [ \t]+ # source
+    ([^\r\n]*)\r?$""",
+    re.I | re.X | re.M)
+
+# The same, with an ISO 8601 timestamp, as written by e.g. rsyslog's
+# RSYSLOG_FileFormat:
+# 2024-08-09T00:00:04.123456+02:00 wintermute named[951]: success resolving ...
+iso_pat: Final[re.Pattern] = re.compile(
+    r"""^(\d{4}-\d{2}-\d{2}T\S+) \s+ # timestamp
+    (\S+) \s+ # hostname
+    ([^\s\[:]+)(?:\[\d+\])?: \s+ # source
+    (.*)$""",
+    re.X)
+
+iso_bpat: Final[re.Pattern] = re.compile(
+    rb"""^(\d{4}-\d{2}-\d{2}T\S+) [ \t]+ # timestamp
+    (\S+) [ \t]+ # hostname
+    ([^\s\[:]+)(?:\[\d+\])?: [ \t]+ # source
+    ([^\r\n]*)\r?$""",
+    re.X | re.M)
+
+# RFC 5424:
+# <165>1 2024-08-09T00:00:04.003Z wintermute named 951 - [meta x="1"] success resolving ...
+rfc5424_pat: Final[re.Pattern] = re.compile(
+    r"""^<\d{1,3}>1 \s
+    (\S+) \s # timestamp
+    (\S+) \s # hostname
+    (\S+) \s # app name
+    \S+ \s # process ID
+    \S+ \s # message ID
+    (?:-|(?:\[(?:[^\]\\]|\\.)*\])+) # structured data
+    (?:\s(.*))?$""",
+    re.X)
+
+# The keys we look for in JSON logs, in order of preference.
+json_time_keys: Final[tuple[str, ...]] = ("timestamp", "@timestamp", "time", "ts")
+json_source_keys: Final[tuple[str, ...]] = ("source", "app", "logger", "ident",
+                                            "SYSLOG_IDENTIFIER")
+json_message_keys: Final[tuple[str, ...]] = ("message", "msg", "MESSAGE")
+
+# Numeric timestamps in JSON logs are seconds since the epoch, or, from this
+# value on, which would be in the year 5138 otherwise, milliseconds.
+JSON_MILLIS: Final[int] = 10**11
+
+# Anything LineParser can match lines in without copying them, e.g. an mmap.
+Buffer = Union[bytes, bytearray, mmap.mmap]
+
+# Where LineParser.scan puts the records it finds.
+RecordSink = Union[list[Record], RecordBatch]
+
+# Number of matching lines LineParser looks at before it settles on a format.
+DETECT_LINES: Final[int] = 16
+
+# How bytes that are not valid UTF-8 are decoded, see the codecs module.
+DEFAULT_ERRORS: Final[str] = "replace"
+
+# What converting a timestamp that looks right, but isn't, may raise, e.g.
+# datetime.fromtimestamp for a value too far out. A line that runs into one
+# of these counts as not matched.
+PARSE_ERRORS: Final[tuple[type[Exception], ...]] = (ValueError, OverflowError, OSError)
+
+
+class LineFormat(ABC):
+    """LineFormat turns lines of a particular log format into Records.
+
+    accepts() should be cheap, it only looks at a few characters to rule
+    out lines that cannot possibly be of this format. parse() does the
+    actual work.
+
+    Formats that can be recognized by a regex alone may also set bpat, a
+    bytes pattern, and override parse_match() and parse_row(). LineParser
+    then finds lines in a buffer without decoding them, and only decodes
+    the fields of the lines that match. The default implementations decode
+    the whole line and hand it to parse().
+    """
+
+    name: str = ""
+    bpat: Optional[re.Pattern] = None
+
+    @abstractmethod
+    def accepts(self, line: str) -> bool:
+        """Return False if the line is certainly not in this format."""
+
+    @abstractmethod
+    def parse(self, line: str, p: "LineParser") -> Optional[Record]:
+        """Parse a line, return None if it does not match.
+
+        p is the LineParser for the file the line came from, it holds the
+        state for parsing timestamps.
+        """
+
+    def parse_match(self, m: re.Match, p: "LineParser") -> Optional[Record]:
+        """Build a Record from a match of bpat."""
+        return self.parse(m[0].decode("utf-8", p.errors).rstrip("\r"), p)
+
+    def parse_row(self, m: re.Match, p: "LineParser") -> Optional[tuple[int, str, str]]:
+        """Return the timestamp in seconds since the epoch, source and message for a match of bpat.
+
+        This is parse_match() for a RecordBatch, it skips the Record and the datetime.
+        """
+        r = self.parse_match(m, p)
+        if r is None:
+            return None
+        return int(r.timestamp.timestamp()), r.source, r.message
+
+
+class BSDSyslog(LineFormat):
+    """BSDSyslog is the classic syslog format, as defined by RFC 3164."""
+
+    name = "bsd"
+    bpat = line_bpat
+
+    def accepts(self, line: str) -> bool:
+        return line[:3] in months and line[3:4] == " "
+
+    def parse(self, line: str, p: "LineParser") -> Optional[Record]:
+        m = line_pat.match(line)
+        if m is None:
+            return None
+        timestamp, _, source, message = m.groups()
+        return Record(timestamp=p.syslog_clock.parse(timestamp),
+                      source=source,
+                      message=message)
+
+    def parse_match(self, m: re.Match, p: "LineParser") -> Optional[Record]:
+        timestamp, _, source, message = m.groups()
+        return Record(timestamp=p.syslog_clock.parse(timestamp.decode("ascii")),
+                      source=source.decode("utf-8", p.errors),
+                      message=message.decode("utf-8", p.errors))
+
+    def parse_row(self, m: re.Match, p: "LineParser") -> Optional[tuple[int, str, str]]:
+        timestamp, _, source, message = m.groups()
+        return (p.syslog_clock.epoch(timestamp.decode("ascii")),
+                source.decode("utf-8", p.errors),
+                message.decode("utf-8", p.errors))
+
+
+class ISOSyslog(LineFormat):
+    """ISOSyslog is the classic syslog format with a precise ISO 8601 timestamp."""
+
+    name = "iso"
+    bpat = iso_bpat
+
+    def accepts(self, line: str) -> bool:
+        return line[4:5] == "-" and line[10:11] == "T" and line[:4].isdigit()
+
+    def parse(self, line: str, p: "LineParser") -> Optional[Record]:
+        m = iso_pat.match(line)
+        if m is None:
+            return None
+        timestamp, _, source, message = m.groups()
+        return Record(timestamp=p.iso_clock.parse(timestamp),
+                      source=source,
+                      message=message)
+
+    def parse_match(self, m: re.Match, p: "LineParser") -> Optional[Record]:
+        timestamp, _, source, message = m.groups()
+        return Record(timestamp=p.iso_clock.parse(timestamp.decode("ascii", p.errors)),
+                      source=source.decode("utf-8", p.errors),
+                      message=message.decode("utf-8", p.errors))
+
+    def parse_row(self, m: re.Match, p: "LineParser") -> Optional[tuple[int, str, str]]:
+        timestamp, _, source, message = m.groups()
+        return (p.iso_clock.epoch(timestamp.decode("ascii", p.errors)),
+                source.decode("utf-8", p.errors),
+                message.decode("utf-8", p.errors))
+
+
+class RFC5424(LineFormat):
+    """RFC5424 is the newer syslog format."""
+
+    name = "rfc5424"
+
+    def accepts(self, line: str) -> bool:
+        return line[:1] == "<" and ">1 " in line[2:8]
+
+    def parse(self, line: str, p: "LineParser") -> Optional[Record]:
+        m = rfc5424_pat.match(line)
+        if m is None or m[1] == "-":
+            return None
+        message: str = m[4] or ""
+        if message.startswith("\ufeff"):
+            message = message[1:]
+        return Record(timestamp=p.iso_clock.parse(m[1]),
+                      source=m[3],
+                      message=message)
+
+
+class JSONLines(LineFormat):
+    """JSONLines is one JSON object per line, as written by many applications.
+
+    The timestamp may be a string in ISO 8601 format, or a number of seconds
+    or milliseconds since the epoch, see JSON_MILLIS.
+    """
+
+    name = "json"
+
+    def accepts(self, line: str) -> bool:
+        return line[:1] == "{"
+
+    def parse(self, line: str, p: "LineParser") -> Optional[Record]:
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict):
+            return None
+        stamp = next((obj[k] for k in json_time_keys if k in obj), None)
+        message = next((obj[k] for k in json_message_keys if k in obj), None)
+        if stamp is None or message is None:
+            return None
+        timestamp: datetime
+        if isinstance(stamp, bool):
+            return None
+        if isinstance(stamp, (int, float)):
+            if abs(stamp) >= JSON_MILLIS:
+                stamp /= 1000
+            try:
+                timestamp = datetime.fromtimestamp(stamp)
+            except (ValueError, OverflowError, OSError):
+                # Too far out to be a point in time we could store.
+                return None
+        else:
+            timestamp = p.iso_clock.parse(str(stamp))
+        return Record(timestamp=timestamp,
+                      source=str(next((obj[k] for k in json_source_keys if k in obj), "")),
+                      message=str(message))
+
+
+# The formats LineParser knows about, in the order they are tried.
+registry: Final[list[LineFormat]] = [
+    BSDSyslog(),
+    ISOSyslog(),
+    RFC5424(),
+    JSONLines(),
+]
+
+
+def register(fmt: LineFormat) -> None:
+    """Add a format to the registry, replacing any format of the same name."""
+    for idx, f in enumerate(registry):
+        if f.name == fmt.name:
+            registry[idx] = fmt
+            return
+    registry.append(fmt)
+
+
+@dataclass(slots=True, kw_only=True)
+class ParseStats:
+    """ParseStats counts the lines a LineParser has seen."""
+
+    format: str = ""
+    matched: int = 0
+    unmatched: int = 0
+
+
+class LineParser:
+    """LineParser parses the lines of a single file, figuring out their format as it goes.
+
+    Until DETECT_LINES lines have been parsed, each line is tried against
+    the formats in turn, and the format that parsed the most lines wins.
+    From then on, lines are only handed to the winner. Only if the winner
+    fails do we try the others, so a stray line in another format is not
+    lost. Lines no format can parse are counted.
+
+    Bytes that are not valid UTF-8 are decoded according to errors, which
+    can be any error handler the codecs module knows, except "strict".
+    """
+
+    __slots__ = [
+        "formats",
+        "errors",
+        "syslog_clock",
+        "iso_clock",
+        "fmt",
+        "votes",
+        "stats",
+    ]
+
+    formats: list[LineFormat]
+    errors: str
+    syslog_clock: SyslogTimestamp
+    iso_clock: IsoTimestamp
+    fmt: Optional[LineFormat]
+    votes: dict[str, int]
+    stats: ParseStats
+
+    def __init__(self,
+                 formats: Optional[list[LineFormat]] = None,
+                 errors: str = DEFAULT_ERRORS) -> None:
+        if errors == "strict":
+            raise ValueError("LineParser must not raise on decoding errors")
+        self.formats = registry if formats is None else formats
+        self.errors = errors
+        self.syslog_clock = SyslogTimestamp()
+        self.iso_clock = IsoTimestamp()
+        self.fmt = None
+        self.votes = {}
+        self.stats = ParseStats()
+
+    def reset(self) -> None:
+        """Start over with detecting the format, e.g. because the file has been replaced."""
+        self.fmt = None
+        self.votes = {}
+        self.stats.format = ""
+
+    def parse(self, line: str) -> Optional[Record]:
+        """Parse a line."""
+        r: Optional[Record] = None
+        fmt = self.fmt
+        if fmt is not None:
+            if fmt.accepts(line):
+                r = self.__try(fmt, line)
+            if r is None:
+                r = self.__try_all(line, fmt)[0]
+        else:
+            r, fmt = self.__try_all(line, None)
+            if fmt is not None:
+                self.votes[fmt.name] = self.votes.get(fmt.name, 0) + 1
+                if sum(self.votes.values()) >= DETECT_LINES:
+                    winner: str = max(self.votes, key=lambda k: self.votes[k])
+                    self.fmt = next(f for f in self.formats if f.name == winner)
+                    self.stats.format = winner
+
+        if r is None:
+            self.stats.unmatched += 1
+        else:
+            self.stats.matched += 1
+        return r
+
+    def parse_bytes(self, line: bytes) -> Optional[Record]:
+        """Parse a line that has not been decoded, yet, without the line break."""
+        fmt = self.fmt
+        if fmt is not None and fmt.bpat is not None:
+            m = fmt.bpat.match(line)
+            if m is not None and (r := self.__try_match(fmt, m)) is not None:
+                return r
+        return self.parse(line.decode("utf-8", self.errors))
+
+    def scan(self,
+             buf: Buffer,
+             begin: int,
+             end: int,
+             final: bool = False,
+             limit: int = 0) -> tuple[list[Record], int]:
+        """Parse the lines in buf between the offsets begin and end.
+
+        begin must be at the start of a line. A line that is not terminated
+        by end is left alone, unless final is True, e.g. because end is the
+        end of a file nobody is writing to anymore. If limit is positive, we
+        stop after that many Records.
+
+        Once the format is known, and if it has a bytes pattern, the regex
+        engine walks the buffer from match to match, so we neither split
+        the buffer into lines nor decode anything but the fields we keep.
+        Only the lines between the matches are looked at one by one.
+
+        Returns the Records and the offset right after the last line parsed.
+        """
+        records: list[Record] = []
+        return records, self.__scan(buf, begin, end, final, limit, records)
+
+    def scan_batch(self,
+                   buf: Buffer,
+                   begin: int,
+                   end: int,
+                   final: bool = False,
+                   limit: int = 0) -> tuple[RecordBatch, int]:
+        """Parse the lines in buf between the offsets begin and end into a RecordBatch.
+
+        This works like scan(), but the lines matched by the bytes pattern
+        go straight into the batch, without a Record or datetime for each.
+        """
+        batch = RecordBatch()
+        return batch, self.__scan(buf, begin, end, final, limit, batch)
+
+    def __scan(self,
+               buf: Buffer,
+               begin: int,
+               end: int,
+               final: bool,
+               limit: int,
+               out: RecordSink) -> int:
+        """Do the work for scan() and scan_batch(), return the offset to continue at."""
+        if not final:
+            end = buf.rfind(b"\n", begin, end) + 1
+            if end <= begin:
+                return begin
+        if limit <= 0:
+            limit = end - begin + 1
+        pos: int = begin
+        while pos < end and len(out) < limit and (self.fmt is None or self.fmt.bpat is None):
+            pos = self.__scan_line(buf, pos, end, out)
+        if pos < end and len(out) < limit:
+            fmt = self.fmt
+            assert fmt is not None and fmt.bpat is not None
+            add = out.add if isinstance(out, RecordBatch) else None
+            build = fmt.parse_match if add is None else fmt.parse_row
+            append = out.append
+            matched: int = 0
+            # len() of a RecordBatch is a method call, so we keep count.
+            cnt: int = len(out)
+            for m in fmt.bpat.finditer(buf, pos, end):
+                start: int = m.start()
+                if pos < start:
+                    while pos < start and cnt < limit:
+                        pos = self.__scan_line(buf, pos, start, out)
+                        cnt = len(out)
+                    if pos < start:
+                        break
+                if cnt >= limit:
+                    break
+                pos = m.end() + 1
+                try:
+                    r = build(m, self)
+                except PARSE_ERRORS:
+                    r = None
+                if r is not None:
+                    matched += 1
+                    cnt += 1
+                    if add is not None:
+                        add(0, *r)
+                    else:
+                        append(r)
+                elif (rec := self.parse(m[0].decode("utf-8", self.errors))) is not None:
+                    cnt += 1
+                    append(rec)
+            self.stats.matched += matched
+            while pos < end and len(out) < limit:
+                pos = self.__scan_line(buf, pos, end, out)
+        return min(pos, end)
+
+    def __scan_line(self, buf: Buffer, pos: int, end: int, out: RecordSink) -> int:
+        """Parse the line starting at pos, return the offset of the next line."""
+        nl: int = buf.find(b"\n", pos, end)
+        if nl < 0:
+            nl = end
+        r = self.parse(bytes(buf[pos:nl]).decode("utf-8", self.errors).rstrip("\r"))
+        if r is not None:
+            out.append(r)
+        return nl + 1
+
+    def __try_match(self, fmt: LineFormat, m: re.Match) -> Optional[Record]:
+        """Build a Record from a match of the bytes pattern of fmt."""
+        try:
+            r = fmt.parse_match(m, self)
+        except PARSE_ERRORS:
+            return None
+        if r is not None:
+            self.stats.matched += 1
+        return r
+
+    def __try(self, fmt: LineFormat, line: str) -> Optional[Record]:
+        """Parse a line with the given format."""
+        try:
+            return fmt.parse(line, self)
+        except PARSE_ERRORS:
+            # A timestamp that looked right, but wasn't.
+            return None
+
+    def __try_all(self,
+                  line: str,
+                  skip: Optional[LineFormat]) -> tuple[Optional[Record], Optional[LineFormat]]:
+        """Try the formats other than skip, return the Record and the format that parsed it."""
+        for fmt in self.formats:
+            if fmt is skip or not fmt.accepts(line):
+                continue
+            r = self.__try(fmt, line)
+            if r is not None:
+                return r, fmt
+        return None, None
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
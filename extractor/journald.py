@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 18:48:51 krylon>
+# Time-stamp: <2026-10-18 19:18:34 krylon>
 #
 # /data/code/python/silo/extractor/journald.py
 # created on 09. 08. 2024
@@ -16,41 +16,187 @@ silo.extractor.journald
 (c) 2024 Benjamin Walkenhorst
 """
 
+import logging
 from datetime import datetime
+from itertools import islice
+from threading import Event
+from typing import Any, Final, Iterator, Optional, Sequence
 
-from systemd.journal import Reader
-
+from silo import common
 from silo.data import Record
-from silo.extractor.base import BaseExtractor
+from silo.extractor.base import DEFAULT_BATCH_SIZE, BaseExtractor
+from silo.extractor.checkpoint import CheckpointStore
+
+try:
+    from systemd import journal
+except ImportError:
+    # Not every system we collect logs from runs systemd.
+    journal = None
+
+# The key the position in the journal is saved under in the CheckpointStore.
+CHECKPOINT_KEY: Final[str] = "journald"
+
+# Number of seconds follow() waits for the journal to change before it
+# checks if it should stop.
+DEFAULT_WAIT: Final[float] = 1.0
+
+Entry = dict[str, Any]
 
 
 class JournaldExtractor(BaseExtractor):
-    """JournaldExtractor reads journald log files."""
+    """JournaldExtractor reads journald log files.
+
+    Instead of walking the journal from the beginning, we seek to where we
+    left off, using the cursor saved in the CheckpointStore, if one is
+    given, or to the first entry at or after the requested time.
+
+    units and priority are handed to journald as matches, so entries we
+    are not interested in are skipped before they reach Python. Entries of
+    any of the units are returned, as long as their priority is priority
+    or more urgent, i.e. numerically lower.
+
+    reader is meant for testing, by default a systemd.journal.Reader is
+    created in init().
+    """
 
     __slots__ = [
+        "log",
         "rdr",
+        "checkpoints",
+        "units",
+        "priority",
+        "cursor",
+        "fresh",
     ]
 
-    rdr: Reader
+    log: logging.Logger
+    rdr: Any
+    checkpoints: Optional[CheckpointStore]
+    units: list[str]
+    priority: Optional[int]
+    cursor: str
+    fresh: bool
 
-    def __init__(self) -> None:
-        self.rdr = Reader()
+    def __init__(self,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 units: Sequence[str] = (),
+                 priority: Optional[int] = None,
+                 reader: Any = None) -> None:
+        self.log = common.get_logger("journald")
+        self.rdr = reader
+        self.checkpoints = checkpoints
+        self.units = list(units)
+        self.priority = priority
+        self.cursor = ""
+        self.fresh = True
 
     def init(self) -> None:
         """Prepare the Extractor for reading."""
+        if self.rdr is None:
+            if journal is None:
+                raise RuntimeError("The systemd Python bindings are not installed")
+            self.rdr = journal.Reader()
+        for unit in self.units:
+            self.rdr.add_match(_SYSTEMD_UNIT=unit)
+        if self.priority is not None:
+            for level in range(self.priority + 1):
+                self.rdr.add_match(PRIORITY=str(level))
+        self.fresh = True
+        if self.checkpoints is not None:
+            cp = self.checkpoints.get(CHECKPOINT_KEY)
+            if cp is not None:
+                self.cursor = cp["cursor"]
+
+    def __seek(self, begin: Optional[datetime]) -> Optional[Entry]:
+        """Move to the first entry we have not seen, at or after begin.
+
+        With a saved cursor, we continue after it, unless that would take us
+        to entries before begin. Without one, we go straight to begin, or
+        the end of the journal if begin is None.
+        If the seek already took us to the first entry, it is returned.
+        """
+        if self.cursor != "":
+            self.rdr.seek_cursor(self.cursor)
+            entry: Entry = self.rdr.get_next()
+            if entry and entry["__CURSOR"] == self.cursor:
+                entry = self.rdr.get_next()
+            elif entry:
+                self.log.info("Cannot find the last entry we read, it may have been vacuumed")
+            if not entry or begin is None or entry["__REALTIME_TIMESTAMP"] >= begin:
+                return entry or None
+        if begin is None:
+            self.rdr.seek_tail()
+            self.rdr.get_previous()
+        else:
+            self.rdr.seek_realtime(begin)
+        return None
+
+    def __entries(self, begin: Optional[datetime]) -> Iterator[Record]:
+        """Yield the Records for the entries we have not seen, yet."""
+        entry: Optional[Entry] = None
+        if self.fresh:
+            entry = self.__seek(begin)
+            self.fresh = False
+        if not entry:
+            entry = self.rdr.get_next()
+        while entry:
+            self.cursor = entry["__CURSOR"]
+            yield self.__record(entry)
+            entry = self.rdr.get_next()
+
+    @staticmethod
+    def __record(entry: Entry) -> Record:
+        """Turn a journal entry into a Record."""
+        message = entry.get("MESSAGE", "")
+        if isinstance(message, bytes):
+            # The bindings hand us the raw bytes if they are not valid UTF-8.
+            message = message.decode("utf-8", "replace")
+        return Record(
+            timestamp=entry["__REALTIME_TIMESTAMP"],
+            message=str(message),
+            source=str(entry.get("SYSLOG_IDENTIFIER") or entry.get("_COMM", "")),
+        )
+
+    def __save(self) -> None:
+        """Save the cursor of the last entry we read."""
+        if self.checkpoints is None or self.cursor == "":
+            return
+        self.checkpoints.set(CHECKPOINT_KEY, {"cursor": self.cursor})
+        self.checkpoints.save()
+
+    def batches(self, begin: datetime, size: int = DEFAULT_BATCH_SIZE) -> Iterator[list[Record]]:
+        """Read the log, from the last checkpoint or begin, whichever is later."""
+        entries = self.__entries(begin)
+        while batch := list(islice(entries, size)):
+            yield batch
+            self.__save()
+
+    def follow(self,
+               stop: Optional[Event] = None,
+               wait: float = DEFAULT_WAIT) -> Iterator[Record]:
+        """Yield the Records added to the journal, until stop is set.
+
+        Without a checkpoint, we start at the end of the journal. Between
+        batches, we sleep until journald tells us something has changed.
+        """
+        if stop is None:
+            stop = Event()
+        while not stop.is_set():
+            cnt: int = 0
+            for r in self.__entries(None):
+                cnt += 1
+                yield r
+            if cnt > 0:
+                self.__save()
+            else:
+                self.rdr.wait(wait)
 
-    def read(self, begin: datetime) -> list[Record]:
-        """Read the log."""
-        l: list[Record] = []
-        for raw in self.rdr:
-            if raw["__REALTIME_TIMESTAMP"] >= begin:
-                rec = Record(
-                    timestamp=raw["__REALTIME_TIMESTAMP"],
-                    message=raw["MESSAGE"],
-                    source=raw["_COMM"],
-                )
-                l.append(rec)
-        return l
+    def close(self) -> None:
+        """Save our position and close the journal."""
+        self.__save()
+        if self.rdr is not None:
+            self.rdr.close()
+            self.rdr = None
 
 # Local Variables: #
 # python-indent: 4 #
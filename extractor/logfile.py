@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 20:09:43 krylon>
+# Time-stamp: <2026-10-18 19:32:21 krylon>
 #
 # /data/code/python/silo/extractor/logfile.py
 # created on 11. 08. 2024
@@ -16,63 +16,402 @@ silo.extractor.syslog
 (c) 2024 Benjamin Walkenhorst
 """
 
-import io
-import re
+import glob
+import logging
+import os
 from datetime import datetime
-from typing import Final
+from threading import Event
+from typing import BinaryIO, Final, Iterator, Optional
 
-from dateutil import parser
+from silo import common
+from silo.data import Record, RecordBatch
+from silo.extractor.base import DEFAULT_BATCH_SIZE, BaseExtractor
+from silo.extractor.checkpoint import CheckpointStore
+from silo.extractor.formats import LineParser, ParseStats
+from silo.extractor.mapped import map_file
 
-from silo.data import Record
-from silo.extractor.base import BaseExtractor
+# Number of seconds follow() waits before looking for new lines again.
+DEFAULT_POLL_INTERVAL: Final[float] = 1.0
 
-line_pat: Final[re.Pattern] = re.compile(
-    r"""^(\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2}) \s+ # timestamp
-    (\w+) \s+ # hostname
-    (\w+)(?:\[\d+\])?: \s+ # source
-    (.*)$""",
-    re.I | re.X)
+# If at least this many bytes are waiting to be read, Tail maps the file
+# into memory instead of reading it line by line.
+MMAP_THRESHOLD: Final[int] = 2**20
+
+
+class Tail:
+    """Tail reads a log file line by line, keeping track of the byte offset.
+
+    The file is identified by its inode, so when it is rotated, i.e. renamed
+    and replaced by a new file, we can tell. In that case, we read what is left
+    of the old file before we continue with the new one. If the file shrinks,
+    it has been truncated, and we start over from the beginning.
+
+    Only complete lines are returned. A line that is still being written is
+    left for the next call.
+    """
+
+    __slots__ = [
+        "log",
+        "path",
+        "fh",
+        "inode",
+        "offset",
+        "rotated",
+        "rotated_inode",
+        "rotated_offset",
+        "parser",
+    ]
+
+    log: logging.Logger
+    path: str
+    fh: Optional[BinaryIO]
+    inode: int
+    offset: int
+    rotated: Optional[BinaryIO]
+    rotated_inode: int
+    rotated_offset: int
+    parser: LineParser
+
+    def __init__(self, path: str) -> None:
+        self.log = common.get_logger("logfile")
+        self.path = path
+        self.fh = None
+        self.inode = 0
+        self.offset = 0
+        self.rotated = None
+        self.rotated_inode = 0
+        self.rotated_offset = 0
+        self.parser = LineParser()
+
+    def open(self, inode: int = 0, offset: int = 0, from_end: bool = False) -> None:
+        """Open the file and seek to the given position, if it is still the same file.
+
+        If the file has been rotated since the position was saved, we look for
+        the old file next to it, so the lines that were added to it after the
+        position are read first.
+        Without a position, we start at the beginning, or the end if from_end
+        is True.
+        """
+        try:
+            fh = open(self.path, "rb")  # pylint: disable-msg=R1732
+        except FileNotFoundError:
+            self.log.debug("%s does not exist (yet)", self.path)
+            return
+        st = os.fstat(fh.fileno())
+        self.inode = st.st_ino
+        self.offset = 0
+        if inode == st.st_ino:
+            if offset <= st.st_size:
+                self.offset = offset
+            else:
+                self.log.info("%s has been truncated", self.path)
+        elif inode != 0:
+            self.__open_rotated(inode, offset)
+        elif from_end:
+            self.offset = st.st_size
+        fh.seek(self.offset)
+        self.fh = fh
+
+    def __open_rotated(self, inode: int, offset: int) -> None:
+        """Find the file that used to be at our path, and open it at offset."""
+        for candidate in sorted(glob.glob(glob.escape(self.path) + "?*")):
+            try:
+                if os.stat(candidate).st_ino != inode:
+                    continue
+                self.rotated = open(candidate, "rb")  # pylint: disable-msg=R1732
+                self.rotated.seek(offset)
+                self.rotated_inode = inode
+                self.rotated_offset = offset
+                self.log.info("%s has been rotated to %s", self.path, candidate)
+                return
+            except OSError as err:
+                self.log.error("Cannot read %s: %s", candidate, err)
+        self.log.error("%s has been rotated, cannot find the old file", self.path)
+
+    def __read_rotated(self, limit: int) -> list[bytes]:
+        """Read up to limit lines from the old file, close it once it is used up."""
+        assert self.rotated is not None
+        lines: list[bytes] = []
+        while limit <= 0 or len(lines) < limit:
+            line = self.rotated.readline()
+            if not line:
+                self.rotated.close()
+                self.rotated = None
+                break
+            self.rotated_offset += len(line)
+            lines.append(line)
+        return lines
+
+    def checkpoint(self) -> Optional[dict[str, int]]:
+        """Return the position to continue from after a restart, if we have one."""
+        if self.rotated is not None:
+            return {"inode": self.rotated_inode, "offset": self.rotated_offset}
+        if self.fh is not None:
+            return {"inode": self.inode, "offset": self.offset}
+        return None
+
+    def close(self) -> None:
+        """Close the file."""
+        if self.rotated is not None:
+            self.rotated.close()
+            self.rotated = None
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    def poll(self, limit: int = 0) -> list[bytes]:
+        """Return up to limit lines added to the file since the last call, all if limit is 0.
+
+        We only check for rotation or truncation once we have caught up
+        with the file. In that case, the lines of the new file are left for
+        the next call.
+        """
+        if self.fh is None:
+            # The file did not exist when we last looked.
+            self.open()
+            return [] if self.fh is None else self.__read_lines(limit)
+        lines = self.__read_lines(limit)
+        if 0 < limit <= len(lines):
+            return lines
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # Rotated, but the new file has not been created, yet.
+            return lines
+        if st.st_ino != self.inode:
+            self.log.info("%s has been rotated", self.path)
+            # Whatever is left of the old file will not be completed anymore.
+            rest: bytes = self.fh.read()
+            if rest:
+                lines.append(rest)
+            self.close()
+            self.parser.reset()
+            self.open()
+        elif st.st_size < self.offset:
+            self.log.info("%s has been truncated", self.path)
+            self.offset = self.fh.seek(0)
+            self.parser.reset()
+        return lines
+
+    def read(self, limit: int = 0) -> Optional[list[Record]]:
+        """Return the Records for up to limit new lines, or all of them if limit is 0.
+
+        The result may be empty if none of the lines could be parsed. Once
+        there is nothing left to read, None is returned.
+        """
+        if self.rotated is not None:
+            lines: list[bytes] = self.__read_rotated(limit)
+            if lines:
+                return self.parse(lines)
+        before: tuple[int, int] = (self.inode, self.offset)
+        records = self.read_mapped(limit)
+        if not records:
+            records = self.parse(self.poll(limit))
+        if not records and (self.inode, self.offset) == before:
+            return None
+        return records
+
+    def read_batch(self, limit: int = 0) -> Optional[RecordBatch]:
+        """Return the same as read(), as a RecordBatch.
+
+        A large backlog is parsed straight into the batch, see read_mapped_batch().
+        """
+        if self.rotated is not None:
+            lines: list[bytes] = self.__read_rotated(limit)
+            if lines:
+                return RecordBatch.from_records(self.parse(lines))
+        before: tuple[int, int] = (self.inode, self.offset)
+        batch = self.read_mapped_batch(limit)
+        if not batch:
+            batch = RecordBatch.from_records(self.parse(self.poll(limit)))
+        if not batch and (self.inode, self.offset) == before:
+            return None
+        return batch
+
+    def parse(self, lines: list[bytes]) -> list[Record]:
+        """Parse lines read from the file."""
+        records: list[Record] = []
+        for line in lines:
+            r = self.parser.parse_bytes(line.rstrip(b"\r\n"))
+            if r is not None:
+                records.append(r)
+        return records
+
+    def read_mapped(self, limit: int = 0) -> list[Record]:
+        """Parse a large backlog of complete lines straight from a memory map of the file.
+
+        This saves reading, decoding and copying every line before we even
+        know if it is any good. If there is less than MMAP_THRESHOLD bytes
+        to read, nothing happens, and poll() picks the lines up as usual.
+        If limit is positive, at most that many Records are returned.
+        """
+        size: int = self.__backlog()
+        if size == 0:
+            return []
+        assert self.fh is not None
+        with map_file(self.fh) as buf:
+            records, self.offset = self.parser.scan(buf, self.offset, size, limit=limit)
+        self.fh.seek(self.offset)
+        return records
+
+    def read_mapped_batch(self, limit: int = 0) -> RecordBatch:
+        """Parse a large backlog into a RecordBatch, see read_mapped()."""
+        size: int = self.__backlog()
+        if size == 0:
+            return RecordBatch()
+        assert self.fh is not None
+        with map_file(self.fh) as buf:
+            batch, self.offset = self.parser.scan_batch(buf, self.offset, size, limit=limit)
+        self.fh.seek(self.offset)
+        return batch
+
+    def __backlog(self) -> int:
+        """Return the size of the file if at least MMAP_THRESHOLD bytes wait to be read, else 0."""
+        if self.fh is None:
+            return 0
+        size: int = os.fstat(self.fh.fileno()).st_size
+        if size - self.offset < MMAP_THRESHOLD:
+            return 0
+        return size
+
+    def __read_lines(self, limit: int) -> list[bytes]:
+        """Read up to limit complete lines from the current offset, all of them if limit is 0."""
+        assert self.fh is not None
+        lines: list[bytes] = []
+        while (limit <= 0 or len(lines) < limit) and (line := self.fh.readline()):
+            if not line.endswith(b"\n"):
+                self.fh.seek(self.offset)
+                break
+            self.offset += len(line)
+            lines.append(line)
+        return lines
 
 
 class LogfileExtractor(BaseExtractor):
-    """SyslogExtractor reads from good old-fashioned log files."""
+    """SyslogExtractor reads from good old-fashioned log files.
+
+    If a CheckpointStore is given, the position in each file is saved after
+    each batch, and the next run continues from there.
+    """
 
     __slots__ = [
         "files",
-        "handles",
+        "tails",
+        "checkpoints",
+        "fresh",
     ]
 
     files: list[str]
-    handles: list[io.TextIOBase]
+    tails: list[Tail]
+    checkpoints: Optional[CheckpointStore]
+    fresh: bool
 
-    def __init__(self, *files: str) -> None:
+    def __init__(self, *files: str, checkpoints: Optional[CheckpointStore] = None) -> None:
         super().__init__()
         self.files = list(files)
-        self.handles = []
+        self.tails = []
+        self.checkpoints = checkpoints
+        self.fresh = True
 
     def init(self) -> None:
-        """Open the log file(s)."""
-        handles: list[io.TextIOBase] = []
-        for f in self.files:
-            fh = open(f, "r", encoding="utf-8")  # pylint: disable-msg=R1732
-            handles.append(fh)
-        self.handles = handles
-
-    def read(self, begin: datetime) -> list[Record]:
-        """Read the log."""
-        records: list[Record] = []
-        for h in self.handles:
-            for line in h:
-                m = line_pat.match(line.rstrip("\n"))
-                if m is None:
+        """Prepare to read the log file(s). The files are opened on the first read."""
+        self.tails = [Tail(f) for f in self.files]
+        self.fresh = True
+
+    def __open(self, from_end: bool) -> None:
+        """Open the files, continuing from their checkpoints.
+
+        Files without a checkpoint start at the beginning, or at the end
+        if from_end is True.
+        """
+        for t in self.tails:
+            cp = None if self.checkpoints is None else self.checkpoints.get(t.path)
+            if cp is not None:
+                t.open(cp["inode"], cp["offset"])
+            else:
+                t.open(from_end=from_end)
+
+    def __read(self, from_end: bool, size: int) -> Iterator[list[Record]]:
+        """Yield the new Records from all files, at most size at a time."""
+        if self.fresh:
+            self.__open(from_end)
+            self.fresh = False
+        for t in self.tails:
+            while (records := t.read(size)) is not None:
+                if records:
+                    yield records
+
+    def __save(self) -> None:
+        """Save the position in each file."""
+        if self.checkpoints is None:
+            return
+        for t in self.tails:
+            if (cp := t.checkpoint()) is not None:
+                self.checkpoints.set(t.path, cp)
+        self.checkpoints.save()
+
+    def batches(self, begin: datetime, size: int = DEFAULT_BATCH_SIZE) -> Iterator[list[Record]]:
+        """Read the log, from the last checkpoint on.
+
+        Only Records from begin on are returned.
+        """
+        for records in self.__read(False, size):
+            batch: list[Record] = [r for r in records if r.timestamp >= begin]
+            if batch:
+                yield batch
+            self.__save()
+        self.__save()
+
+    def columns(self, begin: datetime, size: int = DEFAULT_BATCH_SIZE) -> Iterator[RecordBatch]:
+        """Read the log like batches(), but into RecordBatches.
+
+        Large backlogs go straight from the file into the batches, without
+        a Record for each line.
+        """
+        if self.fresh:
+            self.__open(False)
+            self.fresh = False
+        stamp: int = int(begin.timestamp())
+        for t in self.tails:
+            while (batch := t.read_batch(size)) is not None:
+                if not batch:
                     continue
-                timestamp, _, source, message = m.groups()
-                r: Record = Record(
-                    timestamp=parser.parse(timestamp),
-                    source=source,
-                    message=message)
-                records.append(r)
-        return records
+                batch = batch.since(stamp)
+                if batch:
+                    yield batch
+                self.__save()
+        self.__save()
+
+    def follow(self,
+               stop: Optional[Event] = None,
+               interval: float = DEFAULT_POLL_INTERVAL,
+               size: int = DEFAULT_BATCH_SIZE) -> Iterator[Record]:
+        """Yield the Records appended to the files, until stop is set.
+
+        Files without a checkpoint are followed from their current end, so
+        only lines written from now on are returned. The checkpoints are
+        saved once the Records read in one go have all been consumed.
+        """
+        if stop is None:
+            stop = Event()
+        while not stop.is_set():
+            cnt: int = 0
+            for records in self.__read(True, size):
+                cnt += len(records)
+                yield from records
+                self.__save()
+            if cnt == 0:
+                stop.wait(interval)
+
+    def stats(self) -> dict[str, ParseStats]:
+        """Return the format detected for each file and the number of lines parsed or not."""
+        return {t.path: t.parser.stats for t in self.tails}
+
+    def close(self) -> None:
+        """Close the log file(s)."""
+        self.__save()
+        for t in self.tails:
+            t.close()
 
 # Local Variables: #
 # python-indent: 4 #
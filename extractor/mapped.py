@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/extractor/mapped.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.mapped
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import mmap
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+from silo.data import Record, RecordBatch
+from silo.extractor.formats import LineParser
+
+
+@contextmanager
+def map_file(fh: BinaryIO) -> Iterator[mmap.mmap]:
+    """Map an open file into memory, read-only.
+
+    The file must not be empty, mmap refuses to map zero bytes.
+    """
+    buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if hasattr(buf, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            buf.madvise(mmap.MADV_SEQUENTIAL)
+        yield buf
+    finally:
+        buf.close()
+
+
+def read_file(path: str,
+              parser: LineParser,
+              begin: int = 0,
+              end: int = -1) -> tuple[list[Record], int]:
+    """Parse the lines of a file between the offsets begin and end, using a memory map.
+
+    If end is negative, the file is parsed up to its end. Returns the same
+    as LineParser.scan().
+    """
+    with open(path, "rb") as fh:
+        size: int = os.fstat(fh.fileno()).st_size
+        if end < 0 or end > size:
+            end = size
+        if begin >= end:
+            return [], begin
+        with map_file(fh) as buf:
+            return parser.scan(buf, begin, end, end == size)
+
+
+def read_file_batch(path: str,
+                    parser: LineParser,
+                    begin: int = 0,
+                    end: int = -1) -> tuple[RecordBatch, int]:
+    """Parse the lines of a file between the offsets begin and end into a RecordBatch.
+
+    This is read_file() using LineParser.scan_batch().
+    """
+    with open(path, "rb") as fh:
+        size: int = os.fstat(fh.fileno()).st_size
+        if end < 0 or end > size:
+            end = size
+        if begin >= end:
+            return RecordBatch(), begin
+        with map_file(fh) as buf:
+            return parser.scan_batch(buf, begin, end, end == size)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:09:50 krylon>
+#
+# /data/code/python/silo/extractor/test_backfill.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_backfill
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime
+
+from krylib import isdir
+
+from silo import common
+from silo.database import Database
+from silo.extractor.backfill import backfill, split_ranges
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class BackfillTest(unittest.TestCase):
+    """Test importing log files in parallel."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_backfill_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_backfill(self) -> None:
+        """Test that every line ends up in the database exactly once."""
+        path: str = os.path.join(self.folder, "messages")
+        cnt: int = 5000
+        with open(path, "w", encoding="utf-8") as fh:
+            for i in range(cnt):
+                fh.write(f"Aug  9 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d} "
+                         f"wintermute named[951]: query {i}\n")
+                if i % 1000 == 0:
+                    fh.write("Aug  9 00:00:00 wintermute last message repeated 2 times\n")
+
+        ranges = split_ranges(path, 4096)
+        self.assertGreater(len(ranges), 10)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(path))
+        with open(path, "rb") as fh:
+            for (_, e1), (b2, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(e1, b2)
+                fh.seek(e1 - 1)
+                self.assertEqual(fh.read(1), b"\n")
+
+        db = Database(os.path.join(self.folder, "backfill.db"))
+        host = db.host_get_or_add("wintermute")
+        stats = backfill(db, host.host_id, [path], workers=2, chunk_size=4096)
+        self.assertEqual(stats.records, cnt)
+        self.assertEqual(stats.unmatched, 5)
+        self.assertEqual(stats.chunks, len(ranges))
+        messages = sorted(int(r.message.split()[1])
+                          for r in db.record_get_by_host(host.host_id))
+        self.assertEqual(messages, list(range(cnt)))
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:28:28 krylon>
+#
+# /data/code/python/silo/extractor/test_formats.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_formats
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import json
+import re
+import unittest
+from datetime import datetime, timezone
+from typing import Final, Optional
+
+from silo.data import Record
+from silo.extractor import formats
+from silo.extractor.formats import LineParser
+
+# One line of each format, and what we expect to get out of it.
+samples: Final[list[tuple[str, str, str, str]]] = [
+    ("bsd",
+     "Jun 22 21:00:17 homer.krylon.net newsyslog[5048]: log file turned over",
+     "newsyslog",
+     "log file turned over"),
+    ("bsd",
+     "Aug  9 00:00:00 lucas /bsd: pckbc: command timeout",
+     "/bsd",
+     "pckbc: command timeout"),
+    ("iso",
+     "2024-08-09T00:00:04.123456+00:00 wintermute.example.org named[951]: lame server",
+     "named",
+     "lame server"),
+    ("rfc5424",
+     '<165>1 2024-08-09T00:00:04.003Z wintermute named 951 - [meta x="1\\]"] lame server',
+     "named",
+     "lame server"),
+    ("rfc5424",
+     "<13>1 2024-08-09T00:00:04Z wintermute cron - - - \ufeffjob done",
+     "cron",
+     "job done"),
+    ("json",
+     json.dumps({"time": "2024-08-09T00:00:04+00:00", "app": "api", "msg": "GET / 200"}),
+     "api",
+     "GET / 200"),
+]
+
+
+class FormatTest(unittest.TestCase):
+    """Test parsing the log formats and detecting them."""
+
+    def test_formats(self) -> None:
+        """Test that each sample is parsed by its format, and no other."""
+        for name, line, source, message in samples:
+            accepted = [f.name for f in formats.registry if f.accepts(line)]
+            self.assertEqual(accepted, [name], msg=line)
+            p = LineParser()
+            r = p.parse(line)
+            self.assertIsNotNone(r, msg=line)
+            assert r is not None
+            self.assertEqual((r.source, r.message), (source, message))
+            if name != "bsd":
+                self.assertEqual(r.timestamp.replace(microsecond=0),
+                                 datetime(2024, 8, 9, 0, 0, 4, tzinfo=timezone.utc)
+                                 .astimezone().replace(tzinfo=None))
+
+    def test_detect(self) -> None:
+        """Test that the format of a file is detected and stray lines are counted."""
+        p = LineParser()
+        line: str = "2024-08-09T00:00:{:02d}+00:00 wintermute named[951]: query {}"
+        for i in range(formats.DETECT_LINES):
+            self.assertIsNotNone(p.parse(line.format(i, i)))
+        self.assertEqual(p.stats.format, "iso")
+        assert p.fmt is not None
+        self.assertEqual(p.fmt.name, "iso")
+
+        self.assertIsNotNone(p.parse(samples[0][1]))
+        self.assertIsNone(p.parse("Aug  9 00:00:00 lucas last message repeated 3 times"))
+        self.assertIsNone(p.parse("{broken json"))
+        self.assertEqual(p.stats.matched, formats.DETECT_LINES + 1)
+        self.assertEqual(p.stats.unmatched, 2)
+
+    def test_json_epoch(self) -> None:
+        """Test numeric timestamps in JSON logs, in seconds and milliseconds, and absurd ones."""
+        p = LineParser()
+        for stamp in (1723161604, 1723161604.5, 1723161604123):
+            r = p.parse(json.dumps({"ts": stamp, "msg": "x"}))
+            self.assertIsNotNone(r, msg=stamp)
+            assert r is not None
+            self.assertEqual(int(r.timestamp.timestamp()), 1723161604)
+        for stamp in (1e20, -1e20, 10**30, True):
+            self.assertIsNone(p.parse(json.dumps({"ts": stamp, "msg": "x"})), msg=stamp)
+        self.assertIsNone(p.parse('{"ts": 1e400, "msg": "x"}'))
+        self.assertEqual(p.stats.unmatched, 5)
+
+    def test_default_bytes(self) -> None:
+        """Test that a format with a bytes pattern but only parse() still works with scan()."""
+        class Tagged(formats.LineFormat):
+            """Tagged is a made-up format: a timestamp in seconds, a tag and the message."""
+
+            name = "tagged"
+            bpat = re.compile(rb"^\d+ \w+: [^\r\n]*\r?$", re.M)
+
+            def accepts(self, line: str) -> bool:
+                return line[:1].isdigit()
+
+            def parse(self, line: str, p: LineParser) -> Optional[Record]:
+                stamp, tag, message = line.split(" ", 2)
+                return Record(timestamp=datetime.fromtimestamp(int(stamp)),
+                              source=tag.rstrip(":"),
+                              message=message)
+
+        data: bytes = b"".join(b"%d cron: job %d done\r\n" % (1723161600 + i, i)
+                               for i in range(40))
+        records, _ = LineParser([Tagged()]).scan(data, 0, len(data))
+        batch, _ = LineParser([Tagged()]).scan_batch(data, 0, len(data))
+        self.assertEqual([(int(r.timestamp.timestamp()), r.source, r.message) for r in records],
+                         [(1723161600 + i, "cron", f"job {i} done") for i in range(40)])
+        self.assertEqual(list(batch.stamps), [1723161600 + i for i in range(40)])
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
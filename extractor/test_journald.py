@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:18:34 krylon>
+#
+# /data/code/python/silo/extractor/test_journald.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_journald
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from queue import Empty, Queue
+from threading import Condition, Event, Thread
+from typing import Any, Optional
+
+from krylib import isdir
+
+from silo import common
+from silo.data import Record
+from silo.extractor.checkpoint import CheckpointStore
+from silo.extractor.journald import JournaldExtractor
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+T0: datetime = datetime(2024, 8, 9)
+
+
+class FakeReader:
+    """FakeReader stands in for systemd.journal.Reader, which needs a running journald.
+
+    Matches work like in journald: Entries must match one of the values
+    given for each field that has matches.
+    """
+
+    def __init__(self) -> None:
+        self.entries: list[dict[str, Any]] = []
+        self.matches: dict[str, set[str]] = {}
+        self.pos: int = 0
+        self.examined: int = 0
+        self.cond = Condition()
+
+    def append(self, unit: str, priority: int, message: str) -> None:
+        """Add an entry to the journal."""
+        with self.cond:
+            idx = len(self.entries)
+            self.entries.append({
+                "__CURSOR": f"s=1;i={idx:x}",
+                "__REALTIME_TIMESTAMP": T0 + timedelta(seconds=idx),
+                "_SYSTEMD_UNIT": unit,
+                "SYSLOG_IDENTIFIER": unit.split(".")[0],
+                "PRIORITY": str(priority),
+                "MESSAGE": message,
+            })
+            self.cond.notify_all()
+
+    def add_match(self, **kwargs: str) -> None:  # noqa: D102
+        for k, v in kwargs.items():
+            self.matches.setdefault(k, set()).add(v)
+
+    def __matches(self, entry: dict[str, Any]) -> bool:
+        return all(entry.get(k) in v for k, v in self.matches.items())
+
+    def seek_realtime(self, stamp: datetime) -> None:  # noqa: D102
+        self.pos = next((i for i, e in enumerate(self.entries)
+                         if e["__REALTIME_TIMESTAMP"] >= stamp),
+                        len(self.entries))
+
+    def seek_cursor(self, cursor: str) -> None:  # noqa: D102
+        self.pos = int(cursor.split("i=")[1], 16)
+
+    def seek_tail(self) -> None:  # noqa: D102
+        self.pos = len(self.entries) + 1
+
+    def get_previous(self) -> dict[str, Any]:  # noqa: D102
+        self.pos -= 1
+        return {}
+
+    def get_next(self) -> dict[str, Any]:  # noqa: D102
+        with self.cond:
+            while self.pos < len(self.entries):
+                entry = self.entries[self.pos]
+                self.pos += 1
+                self.examined += 1
+                if self.__matches(entry):
+                    return entry
+            return {}
+
+    def wait(self, timeout: float) -> int:  # noqa: D102
+        with self.cond:
+            if self.pos < len(self.entries):
+                return 1
+            return 1 if self.cond.wait(timeout) else 0
+
+    def close(self) -> None:  # noqa: D102
+        pass
+
+
+class JournaldTest(unittest.TestCase):
+    """Test reading the journal incrementally."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_journald_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def __read(self,
+               rdr: FakeReader,
+               begin: datetime,
+               cp: Optional[CheckpointStore] = None,
+               **kwargs: Any) -> list[Record]:
+        """Read the journal with a fresh extractor, like an agent after a restart."""
+        rdr.pos = 0
+        rdr.matches = {}
+        ex = JournaldExtractor(cp, reader=rdr, **kwargs)
+        ex.init()
+        records = ex.read(begin)
+        ex.close()
+        return records
+
+    def test_01_seek(self) -> None:
+        """Test starting at a point in time, and continuing from the checkpoint."""
+        rdr = FakeReader()
+        for i in range(100):
+            rdr.append("sshd.service", 6, f"message {i}")
+
+        records = self.__read(rdr, T0 + timedelta(seconds=90))
+        self.assertEqual([r.message for r in records], [f"message {i}" for i in range(90, 100)])
+        self.assertEqual(records[0].source, "sshd")
+        self.assertEqual(rdr.examined, 10)
+
+        cp = CheckpointStore(os.path.join(self.folder, "seek.cp"))
+        self.assertEqual(len(self.__read(rdr, T0, cp)), 100)
+        rdr.append("sshd.service", 6, "message 100")
+        rdr.examined = 0
+        records = self.__read(rdr, T0, CheckpointStore(cp.path))
+        self.assertEqual([r.message for r in records], ["message 100"])
+        self.assertEqual(rdr.examined, 2)
+
+        # The checkpoint is older than what we are asked for.
+        rdr.append("sshd.service", 6, "message 101")
+        records = self.__read(rdr, T0 + timedelta(seconds=150), CheckpointStore(cp.path))
+        self.assertEqual(records, [])
+
+    def test_02_match(self) -> None:
+        """Test that units and priorities are handed to the reader as matches."""
+        rdr = FakeReader()
+        for i in range(30):
+            rdr.append(["sshd.service", "cron.service", "named.service"][i % 3], i % 8, str(i))
+        records = self.__read(rdr,
+                              T0,
+                              units=["sshd.service", "named.service"],
+                              priority=3)
+        self.assertEqual([r.message for r in records],
+                         [str(i) for i in range(30) if i % 3 != 1 and i % 8 <= 3])
+
+    def test_03_follow(self) -> None:
+        """Test following the journal as entries are added."""
+        rdr = FakeReader()
+        for i in range(10):
+            rdr.append("sshd.service", 6, f"old {i}")
+        cp = CheckpointStore(os.path.join(self.folder, "follow.cp"))
+        ex = JournaldExtractor(cp, reader=rdr)
+        ex.init()
+        stop = Event()
+        q: Queue[Record] = Queue()
+
+        def run() -> None:
+            for r in ex.follow(stop, 0.01):
+                q.put(r)
+
+        worker = Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            # Wait for the follower to seek to the end of the journal.
+            while rdr.pos == 0:
+                stop.wait(0.01)
+            for i in range(3):
+                rdr.append("sshd.service", 6, f"new {i}")
+            got = [q.get(timeout=5) for _ in range(3)]
+            with self.assertRaises(Empty):
+                q.get(timeout=0.1)
+        finally:
+            stop.set()
+            worker.join()
+            ex.close()
+        self.assertEqual([r.message for r in got], [f"new {i}" for i in range(3)])
+        self.assertEqual(CheckpointStore(cp.path).get("journald"), {"cursor": "s=1;i=c"})
+
+    def test_04_batches(self) -> None:
+        """Test that the cursor is saved once a batch has been consumed."""
+        rdr = FakeReader()
+        for i in range(25):
+            rdr.append("sshd.service", 6, str(i))
+        cp = CheckpointStore(os.path.join(self.folder, "batches.cp"))
+        ex = JournaldExtractor(cp, reader=rdr)
+        ex.init()
+        it = ex.batches(T0, 10)
+        self.assertEqual(len(next(it)), 10)
+        self.assertEqual(len(next(it)), 10)
+        it.close()
+        records = self.__read(rdr, T0, CheckpointStore(cp.path))
+        self.assertEqual([r.message for r in records], [str(i) for i in range(10, 25)])
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/extractor/test_logfile.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_logfile
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import asyncio
+import os
+import unittest
+from datetime import datetime
+from queue import Empty, Queue
+from threading import Event, Thread
+from typing import Final
+
+from krylib import isdir
+
+from silo import common
+from silo.data import Record
+from silo.extractor.checkpoint import CheckpointStore
+from silo.extractor.logfile import MMAP_THRESHOLD, LogfileExtractor
+from silo.extractor.test_syslog import test_content
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+lines: Final[list[str]] = [line + "\n" for line in test_content.split("\n") if line != ""]
+
+
+class LogfileTest(unittest.TestCase):
+    """Test reading log files incrementally."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_logfile_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def __write(self, path: str, text: str, mode: str = "a") -> None:
+        with open(path, mode, encoding="utf-8") as fh:
+            fh.write(text)
+
+    def __read(self, path: str) -> list[Record]:
+        """Read the new lines with a fresh extractor, like an agent after a restart."""
+        ex = LogfileExtractor(path,
+                              checkpoints=CheckpointStore(os.path.join(self.folder, "cp")))
+        ex.init()
+        records = ex.read(datetime.fromtimestamp(0))
+        ex.close()
+        return records
+
+    def test_01_resume(self) -> None:
+        """Test continuing from the checkpoint, including a line that is still being written."""
+        path: str = os.path.join(self.folder, "resume.log")
+        self.__write(path, "".join(lines[:10]))
+        self.assertEqual(len(self.__read(path)), 10)
+        self.assertEqual(self.__read(path), [])
+
+        self.__write(path, "".join(lines[10:15]) + lines[15][:20])
+        self.assertEqual(len(self.__read(path)), 5)
+        self.__write(path, lines[15][20:])
+        records = self.__read(path)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].message, lines[15].split(": ", 1)[1].rstrip("\n"))
+
+    def test_02_rotate(self) -> None:
+        """Test picking up the rest of a file that was rotated while we were away."""
+        path: str = os.path.join(self.folder, "rotate.log")
+        self.__write(path, "".join(lines[:10]))
+        self.assertEqual(len(self.__read(path)), 10)
+
+        self.__write(path, "".join(lines[10:13]))
+        os.rename(path, path + ".0")
+        self.__write(path, "".join(lines[13:15]))
+        records = self.__read(path)
+        self.assertEqual([r.message for r in records],
+                         [line.split(": ", 1)[1].rstrip("\n") for line in lines[10:15]])
+
+    def test_03_truncate(self) -> None:
+        """Test starting over when a file has been truncated."""
+        path: str = os.path.join(self.folder, "truncate.log")
+        self.__write(path, "".join(lines[:10]))
+        self.assertEqual(len(self.__read(path)), 10)
+        self.__write(path, "".join(lines[:2]), "w")
+        self.assertEqual(len(self.__read(path)), 2)
+
+    def test_04_follow(self) -> None:
+        """Test following a file as it grows and gets rotated."""
+        path: str = os.path.join(self.folder, "follow.log")
+        self.__write(path, "".join(lines[:10]))
+        ex = LogfileExtractor(path)
+        ex.init()
+        stop = Event()
+        q: Queue[Record] = Queue()
+
+        def run() -> None:
+            for r in ex.follow(stop, 0.01):
+                q.put(r)
+
+        worker = Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            # Wait for the follower to open the file, or it would skip what we write.
+            while ex.tails[0].fh is None:
+                stop.wait(0.01)
+            self.__write(path, "".join(lines[10:12]))
+            got = [q.get(timeout=5) for _ in range(2)]
+            os.rename(path, path + ".0")
+            self.__write(path + ".0", lines[12])
+            self.__write(path, lines[13])
+            got.extend(q.get(timeout=5) for _ in range(2))
+            with self.assertRaises(Empty):
+                q.get(timeout=0.1)
+        finally:
+            stop.set()
+            worker.join()
+            ex.close()
+        self.assertEqual([r.message for r in got],
+                         [line.split(": ", 1)[1].rstrip("\n") for line in lines[10:14]])
+
+    def test_05_backlog(self) -> None:
+        """Test reading a backlog large enough to be mapped into memory."""
+        path: str = os.path.join(self.folder, "backlog.log")
+        block: str = "".join(lines)
+        cnt: int = MMAP_THRESHOLD // len(block) + 1
+        self.__write(path, block * cnt + lines[0][:20])
+        records = self.__read(path)
+        self.assertEqual(len(records), len(lines) * cnt)
+        self.assertEqual([r.message for r in records[:len(lines)]],
+                         [line.split(": ", 1)[1].rstrip("\n") for line in lines])
+        self.__write(path, lines[0][20:])
+        self.assertEqual(len(self.__read(path)), 1)
+
+    def test_06_batches(self) -> None:
+        """Test reading in batches, and resuming after the last batch that was consumed."""
+        path: str = os.path.join(self.folder, "batches.log")
+        cp_path: str = os.path.join(self.folder, "batches.cp")
+        self.__write(path, "".join(lines))
+        ex = LogfileExtractor(path, checkpoints=CheckpointStore(cp_path))
+        ex.init()
+        it = ex.batches(datetime.fromtimestamp(0), 7)
+        got = [next(it) for _ in range(3)]
+        self.assertEqual([len(b) for b in got], [7, 7, 7])
+        it.close()
+
+        # The third batch was handed out, but not confirmed by asking for the next.
+        ex = LogfileExtractor(path, checkpoints=CheckpointStore(cp_path))
+        ex.init()
+        rest = list(ex.batches(datetime.fromtimestamp(0), 7))
+        self.assertTrue(all(0 < len(b) <= 7 for b in rest))
+        self.assertEqual([r.message for b in got[:2] + rest for r in b],
+                         [line.split(": ", 1)[1].rstrip("\n") for line in lines])
+
+    def test_07_backlog_batches(self) -> None:
+        """Test that a mapped backlog is handed out in batches, too, also asynchronously."""
+        path: str = os.path.join(self.folder, "abatches.log")
+        block: str = "".join(lines)
+        cnt: int = MMAP_THRESHOLD // len(block) + 1
+        self.__write(path, block * cnt)
+
+        async def collect(ex: LogfileExtractor) -> list[list[Record]]:
+            return [b async for b in ex.abatches(datetime.fromtimestamp(0), 1000)]
+
+        ex = LogfileExtractor(path)
+        ex.init()
+        got = asyncio.run(collect(ex))
+        ex.close()
+        self.assertEqual(sum(len(b) for b in got), len(lines) * cnt)
+        self.assertTrue(all(0 < len(b) <= 1000 for b in got))
+
+    def test_08_columns(self) -> None:
+        """Test reading a backlog into RecordBatches."""
+        path: str = os.path.join(self.folder, "columns.log")
+        cp_path: str = os.path.join(self.folder, "columns.cp")
+        block: str = "".join(lines)
+        cnt: int = MMAP_THRESHOLD // len(block) + 1
+        self.__write(path, block * cnt)
+        ex = LogfileExtractor(path, checkpoints=CheckpointStore(cp_path))
+        ex.init()
+        got = list(ex.columns(datetime.fromtimestamp(0), 1000))
+        ex.close()
+        self.assertEqual(sum(len(b) for b in got), len(lines) * cnt)
+        self.assertTrue(all(0 < len(b) <= 1000 for b in got))
+        self.assertEqual([r.message for r in got[0]][:len(lines)],
+                         [line.split(": ", 1)[1].rstrip("\n") for line in lines])
+
+        # Lines added later are read line by line, but still end up in a batch.
+        self.__write(path, lines[0])
+        ex = LogfileExtractor(path, checkpoints=CheckpointStore(cp_path))
+        ex.init()
+        got = list(ex.columns(datetime.fromtimestamp(0)))
+        ex.close()
+        self.assertEqual([len(b) for b in got], [1])
+        self.assertEqual(got[0].source(0), "newsyslog")
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
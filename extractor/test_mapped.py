@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:32:21 krylon>
+#
+# /data/code/python/silo/extractor/test_mapped.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_mapped
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import unittest
+
+from silo.extractor.formats import LineParser
+from silo.extractor.mapped import read_file
+from silo.extractor.test_syslog import test_content
+
+
+class MappedTest(unittest.TestCase):
+    """Test parsing log files straight from a memory map."""
+
+    def test_scan(self) -> None:
+        """Test that scanning bytes yields the same Records as parsing decoded lines."""
+        data: bytes = test_content.encode("utf-8")
+        expected = [r for r in map(LineParser().parse, test_content.splitlines())
+                    if r is not None]
+        p = LineParser()
+        records, offset = p.scan(data, 0, len(data))
+        self.assertEqual(records, expected)
+        self.assertEqual(offset, len(data))
+        self.assertEqual(p.stats.matched, len(expected))
+        assert p.fmt is not None
+        self.assertEqual(p.fmt.name, "bsd")
+
+    def test_scan_batch(self) -> None:
+        """Test that scanning into a RecordBatch yields the same records as scan()."""
+        data: bytes = (test_content + "garbage\n" + test_content).encode("utf-8")
+        p = LineParser()
+        records, offset = p.scan(data, 0, len(data))
+        q = LineParser()
+        batch, batch_offset = q.scan_batch(data, 0, len(data))
+        self.assertEqual(batch_offset, offset)
+        self.assertEqual(q.stats, p.stats)
+        self.assertEqual(list(batch), records)
+        self.assertEqual(list(batch.stamps),
+                         [int(r.timestamp.timestamp()) for r in records])
+        self.assertEqual(len(batch.sources), len({r.source for r in records}))
+
+    def test_broken(self) -> None:
+        """Test invalid UTF-8, CRLF line breaks, and incomplete lines."""
+        lines: list[bytes] = [
+            b"Aug  9 00:00:0%d wintermute named[951]: query %d\n" % (i, i) for i in range(10)
+        ]
+        lines.append(b"Aug  9 00:00:10 wintermute sshd[42]: user \xff\xfe\r\n")
+        lines.append(b"garbage\n")
+        lines.append(b"Aug  9 00:00:11 wintermute sshd[42]: incomplete")
+        data: bytes = b"".join(lines)
+
+        p = LineParser()
+        records, offset = p.scan(data, 0, len(data))
+        self.assertEqual(len(records), 11)
+        self.assertEqual(records[-1].message, "user \ufffd\ufffd")
+        self.assertEqual(offset, len(data) - len(lines[-1]))
+        self.assertEqual(p.stats.unmatched, 1)
+
+        records, offset = LineParser(errors="backslashreplace").scan(data, 0, len(data),
+                                                                     final=True)
+        self.assertEqual(len(records), 12)
+        self.assertEqual(records[-2].message, "user \\xff\\xfe")
+        self.assertEqual(offset, len(data))
+
+        with self.assertRaises(ValueError):
+            LineParser(errors="strict")
+
+    def test_read_file(self) -> None:
+        """Test reading a file in pieces."""
+        data: bytes = test_content.encode("utf-8")
+        fd, path = tempfile.mkstemp(prefix="silo_test_mapped_")
+        try:
+            os.write(fd, data)
+            os.close(fd)
+            whole, _ = read_file(path, LineParser())
+            middle: int = data.index(b"\n", len(data) // 2) + 1
+            p = LineParser()
+            first, offset = read_file(path, p, 0, middle)
+            self.assertEqual(offset, middle)
+            second, offset = read_file(path, p, offset)
+            self.assertEqual(offset, len(data))
+            self.assertEqual(first + second, whole)
+        finally:
+            os.unlink(path)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 20:13:17 krylon>
+# Time-stamp: <2026-10-18 19:07:27 krylon>
 #
 # /data/code/python/silo/extractor/test_syslog.py
 # created on 12. 08. 2024
@@ -19,7 +19,7 @@ silo.extractor.test_syslog
 import unittest
 from typing import Final
 
-from silo.extractor.logfile import line_pat
+from silo.extractor.formats import line_pat
 
 # noqa: E501
 test_content: Final[str] = """
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:28:56 krylon>
+#
+# /data/code/python/silo/extractor/test_timestamp.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.test_timestamp
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import unittest
+from datetime import datetime
+
+from silo.extractor.test_syslog import test_content
+from silo.extractor.timestamp import SyslogTimestamp
+
+
+class TimestampTest(unittest.TestCase):
+    """Test parsing syslog timestamps."""
+
+    def test_parse(self) -> None:
+        """Test parsing the timestamps of the sample log."""
+        clock = SyslogTimestamp(lambda: datetime(2024, 10, 18))
+        for line in test_content.split("\n"):
+            if line == "":
+                continue
+            raw: str = line[:15]
+            self.assertEqual(clock.parse(raw),
+                             datetime.strptime(f"2024 {raw}", "%Y %b %d %H:%M:%S"))
+        self.assertEqual(clock.fallbacks, 0)
+        first = clock.parse("Aug  9 00:00:00")
+        self.assertIs(clock.parse("Aug  9 00:00:00"), first)
+
+    def test_rollover(self) -> None:
+        """Test guessing the year around new year's eve."""
+        clock = SyslogTimestamp(lambda: datetime(2025, 1, 2))
+        self.assertEqual(clock.parse("Dec 31 23:59:58"), datetime(2024, 12, 31, 23, 59, 58))
+        self.assertEqual(clock.parse("Jan  1 00:00:01"), datetime(2025, 1, 1, 0, 0, 1))
+        self.assertEqual(clock.parse("Dec 31 23:59:59"), datetime(2024, 12, 31, 23, 59, 59))
+        self.assertEqual(clock.parse("Jan  1 00:00:02"), datetime(2025, 1, 1, 0, 0, 2))
+
+    def test_rollover_gap(self) -> None:
+        """Test guessing the year when the lines around new year's eve are missing."""
+        clock = SyslogTimestamp(lambda: datetime(2025, 3, 2))
+        self.assertEqual(clock.parse("Nov 28 10:00:00"), datetime(2024, 11, 28, 10, 0, 0))
+        self.assertEqual(clock.parse("Mar  1 08:00:00"), datetime(2025, 3, 1, 8, 0, 0))
+        self.assertEqual(clock.parse("Nov 30 10:00:00"), datetime(2024, 11, 30, 10, 0, 0))
+        self.assertEqual(clock.parse("Mar  2 08:00:00"), datetime(2025, 3, 2, 8, 0, 0))
+
+    def test_out_of_order(self) -> None:
+        """Test that lines that go back a little stay in the same year."""
+        clock = SyslogTimestamp(lambda: datetime(2024, 10, 18))
+        self.assertEqual(clock.parse("Aug  9 00:00:04"), datetime(2024, 8, 9, 0, 0, 4))
+        self.assertEqual(clock.parse("Aug  8 23:59:58"), datetime(2024, 8, 8, 23, 59, 58))
+        self.assertEqual(clock.parse("Jul 30 12:00:00"), datetime(2024, 7, 30, 12, 0, 0))
+        self.assertEqual(clock.parse("Aug  9 00:00:05"), datetime(2024, 8, 9, 0, 0, 5))
+
+    def test_fallback(self) -> None:
+        """Test that other formats are handed to dateutil."""
+        clock = SyslogTimestamp(lambda: datetime(2024, 10, 18))
+        self.assertEqual(clock.parse("2024-08-09T00:00:04"), datetime(2024, 8, 9, 0, 0, 4))
+        self.assertEqual(clock.fallbacks, 1)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
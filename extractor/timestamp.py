@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:28:56 krylon>
+#
+# /data/code/python/silo/extractor/timestamp.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.extractor.timestamp
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Final, Optional
+
+from dateutil import parser
+
+months: Final[dict[str, int]] = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
+# How far in the future a timestamp may be before we assume it belongs
+# to the previous year. Clocks are not always in sync.
+FUTURE_SLACK: Final[timedelta] = timedelta(days=1)
+
+# How many months a timestamp may jump from the last one before we assume
+# it crossed into another year. Smaller jumps backwards are lines that
+# arrive out of order.
+YEAR_JUMP: Final[int] = 6
+
+
+class SyslogTimestamp:
+    """SyslogTimestamp parses the classic syslog timestamp, e.g. "Aug  9 00:00:04".
+
+    Since the timestamp lacks the year, we have to guess it: We start with
+    the current year, unless that puts the first timestamp in the future,
+    in which case the log is from last year. From then on, we move to the
+    next year when a timestamp goes back to an earlier (month, day) by
+    at least YEAR_JUMP months, e.g. from December to January. A timestamp
+    that goes back less than that is a line out of order and stays in the
+    current year, one that goes forward by more than that is a straggler
+    from the previous year. Neither moves the year for the lines after it.
+
+    Consecutive lines often share a timestamp, so the last one is remembered.
+    Anything that does not look like a syslog timestamp is handed to dateutil.
+
+    One SyslogTimestamp should be used per file, since it relies on seeing
+    the timestamps in order.
+    """
+
+    __slots__ = [
+        "now",
+        "year",
+        "month",
+        "day",
+        "last_raw",
+        "last",
+        "epoch_raw",
+        "last_epoch",
+        "fallbacks",
+    ]
+
+    now: Callable[[], datetime]
+    year: int
+    month: int
+    day: int
+    last_raw: str
+    last: datetime
+    epoch_raw: Optional[str]
+    last_epoch: int
+    fallbacks: int
+
+    def __init__(self, now: Callable[[], datetime] = datetime.now) -> None:
+        self.now = now
+        self.year = 0
+        self.month = 0
+        self.day = 0
+        self.last_raw = ""
+        self.last = datetime.fromtimestamp(0)
+        self.epoch_raw = None
+        self.last_epoch = 0
+        self.fallbacks = 0
+
+    def parse(self, raw: str) -> datetime:
+        """Parse a timestamp."""
+        if raw == self.last_raw:
+            return self.last
+        stamp = self.__parse_fast(raw)
+        if stamp is None:
+            self.fallbacks += 1
+            year: int = self.year or self.now().year
+            stamp = parser.parse(raw, default=datetime(year, 1, 1))
+        self.last_raw = raw
+        self.last = stamp
+        return stamp
+
+    def epoch(self, raw: str) -> int:
+        """Parse a timestamp, return it in seconds since the epoch."""
+        if raw != self.epoch_raw:
+            self.last_epoch = int(self.parse(raw).timestamp())
+            self.epoch_raw = raw
+        return self.last_epoch
+
+    def __parse_fast(self, raw: str) -> Optional[datetime]:
+        """Parse a timestamp of the form "Mon DD HH:MM:SS", or return None if it isn't one."""
+        fields = raw.split()
+        if len(fields) != 3:
+            return None
+        month = months.get(fields[0])
+        hms = fields[2]
+        if month is None or len(hms) != 8 or hms[2] != ":" or hms[5] != ":":
+            return None
+        try:
+            day = int(fields[1])
+            hour = int(hms[0:2])
+            minute = int(hms[3:5])
+            second = int(hms[6:8])
+        except ValueError:
+            return None
+
+        year: int = self.year
+        if year == 0:
+            year = self.now().year
+            first = self.__make(year, month, day, hour, minute, second)
+            if first is not None and first > self.now() + FUTURE_SLACK:
+                year -= 1
+        elif (month, day) < (self.month, self.day):
+            if self.month - month < YEAR_JUMP:
+                # Out of order, that does not take us back for good.
+                return self.__make(year, month, day, hour, minute, second)
+            year += 1
+        elif month - self.month > YEAR_JUMP:
+            # A straggler from last year, that does not take us back for good.
+            return self.__make(year - 1, month, day, hour, minute, second)
+
+        stamp = self.__make(year, month, day, hour, minute, second)
+        if stamp is not None:
+            self.year = year
+            self.month = month
+            self.day = day
+        return stamp
+
+    @staticmethod
+    def __make(year: int,
+               month: int,
+               day: int,
+               hour: int,
+               minute: int,
+               second: int) -> Optional[datetime]:
+        """Return the datetime for the given fields, or None if they make no sense."""
+        try:
+            return datetime(year, month, day, hour, minute, second)
+        except ValueError:
+            # E.g. Feb 29 in the wrong year, or 25:00:00
+            return None
+
+
+class IsoTimestamp:
+    """IsoTimestamp parses ISO 8601 timestamps, remembering the last one.
+
+    Timestamps with a time zone are converted to local time, so they
+    compare to the ones SyslogTimestamp returns.
+    """
+
+    __slots__ = [
+        "last_raw",
+        "last",
+        "epoch_raw",
+        "last_epoch",
+    ]
+
+    last_raw: str
+    last: datetime
+    epoch_raw: Optional[str]
+    last_epoch: int
+
+    def __init__(self) -> None:
+        self.last_raw = ""
+        self.last = datetime.fromtimestamp(0)
+        self.epoch_raw = None
+        self.last_epoch = 0
+
+    def parse(self, raw: str) -> datetime:
+        """Parse a timestamp. Raises ValueError if it is not a valid ISO 8601 timestamp."""
+        if raw == self.last_raw:
+            return self.last
+        stamp: datetime = datetime.fromisoformat(raw)
+        if stamp.tzinfo is not None:
+            stamp = stamp.astimezone().replace(tzinfo=None)
+        self.last_raw = raw
+        self.last = stamp
+        return stamp
+
+    def epoch(self, raw: str) -> int:
+        """Parse a timestamp, return it in seconds since the epoch."""
+        if raw != self.epoch_raw:
+            self.last_epoch = int(self.parse(raw).timestamp())
+            self.epoch_raw = raw
+        return self.last_epoch
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
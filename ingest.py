@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:31:15 krylon>
+#
+# /data/code/python/silo/ingest.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.ingest
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import logging
+import queue
+import time
+from collections import deque
+from dataclasses import dataclass
+from threading import Condition, Event, Lock, Thread
+from typing import Final, Iterable, Optional
+
+from silo import common
+from silo.alert import RuleEngine
+from silo.data import Record, RecordRow
+from silo.database import DEFAULT_BATCH_SIZE, Database, DBPool, PoolTimeout
+from silo.dedup import Deduplicator
+from silo.tail import TailHub
+
+# The default number of batches the queue holds before producers block.
+DEFAULT_QUEUE_SIZE: Final[int] = 1000
+
+# How many times we try to write a batch before we split it up.
+WRITE_ATTEMPTS: Final[int] = 2
+
+# Seconds to wait before trying to write a batch again.
+RETRY_DELAY: Final[float] = 0.1
+
+# How many of the records the database refused we keep around for inspection.
+DEFAULT_DEAD_LETTERS: Final[int] = 1000
+
+# Seconds between checks if the writer is still alive while waiting for room in the queue.
+LIVENESS_INTERVAL: Final[float] = 0.5
+
+
+class ShutdownError(Exception):
+    """Raised when Records are submitted to an IngestQueue that has been stopped,
+    or whose writer could not open the database or has died."""
+
+
+@dataclass(slots=True, kw_only=True)
+class IngestStats:
+    """IngestStats is a snapshot of an IngestQueue's counters."""
+
+    depth: int = 0
+    max_depth: int = 0
+    received: int = 0
+    written: int = 0
+    commits: int = 0
+    errors: int = 0
+    dead: int = 0
+    commit_last: float = 0.0
+    commit_max: float = 0.0
+    commit_total: float = 0.0
+
+    @property
+    def commit_avg(self) -> float:
+        """Return the average time spent per commit in seconds."""
+        if self.commits == 0:
+            return 0.0
+        return self.commit_total / self.commits
+
+
+class IngestQueue:
+    """IngestQueue funnels Records from any number of producers to a single writer thread.
+
+    Records are queued in batches, as they come in from a producer, and
+    producers block when the queue holds maxsize batches, so a slow database
+    slows down ingest instead of eating all our memory. The writer drains the
+    queue in group commits: whatever has piled up while the previous commit
+    was running, up to about batch_size Records, goes into the next one. So under light load,
+    Records hit the disk right away, and under heavy load, the batches grow.
+    stop() writes everything that has been queued before it returns.
+
+    If writing a batch fails, it is tried again. If it still fails, it is
+    split up until the records the database refuses are isolated, so one bad
+    record does not take the rest of the batch with it. Those records are
+    counted, logged and kept in dead_letters, the rest is stored.
+
+    If pool is given, the writer checks out the DBPool's read-write connection
+    for each commit, so the pool's bound on writers holds for ingest, too,
+    and path and compact are ignored. Otherwise, the writer opens a Database
+    of its own.
+
+    If alerts is given, each batch is checked against its Rules once it has
+    been written. Likewise, if tail is given, each batch is published to it
+    once it has been written. Both see every record that has been stored,
+    even if dedup is given and collapses repeated ones.
+    """
+
+    __slots__ = [
+        "log",
+        "path",
+        "batch_size",
+        "compact",
+        "pool",
+        "alerts",
+        "tail",
+        "dedup",
+        "q",
+        "lock",
+        "counters",
+        "dead_letters",
+        "worker",
+        "ready",
+        "failure",
+        "closed",
+        "producers",
+        "idle",
+    ]
+
+    log: logging.Logger
+    path: str
+    batch_size: int
+    compact: bool
+    pool: Optional[DBPool]
+    alerts: Optional[RuleEngine]
+    tail: Optional[TailHub]
+    dedup: Optional[Deduplicator]
+    q: queue.Queue
+    lock: Lock
+    counters: IngestStats
+    dead_letters: deque[RecordRow]
+    worker: Optional[Thread]
+    ready: Event
+    failure: Optional[Exception]
+    closed: bool
+    producers: int
+    idle: Condition
+
+    def __init__(self,
+                 path: str = "",
+                 maxsize: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 compact: bool = False,
+                 alerts: Optional[RuleEngine] = None,
+                 tail: Optional[TailHub] = None,
+                 dedup: Optional[Deduplicator] = None,
+                 pool: Optional[DBPool] = None) -> None:
+        self.log = common.get_logger("ingest")
+        self.path = path if pool is None else pool.path
+        self.batch_size = batch_size
+        self.compact = compact
+        self.pool = pool
+        self.alerts = alerts
+        self.tail = tail
+        self.dedup = dedup
+        self.q = queue.Queue(maxsize)
+        self.lock = Lock()
+        self.counters = IngestStats()
+        self.dead_letters = deque(maxlen=DEFAULT_DEAD_LETTERS)
+        self.worker = None
+        self.ready = Event()
+        self.failure = None
+        self.closed = False
+        self.producers = 0
+        self.idle = Condition(self.lock)
+
+    def __enter__(self) -> "IngestQueue":
+        self.start()
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        self.stop()
+        return False
+
+    def start(self) -> None:
+        """Start the writer thread and wait until it has opened the database.
+
+        Raises ShutdownError if it cannot.
+        """
+        if self.worker is not None:
+            return
+        self.worker = Thread(target=self.__run, name="IngestWriter", daemon=True)
+        self.worker.start()
+        self.ready.wait()
+        if self.failure is not None:
+            with self.lock:
+                self.closed = True
+            raise ShutdownError(f"Cannot open database {self.path}: {self.failure}") \
+                from self.failure
+
+    def stop(self) -> None:
+        """Stop accepting Records, write out the queue and wait for the writer to finish."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.worker is None:
+            self.start()
+        assert self.worker is not None
+        # Producers that got in before we closed the queue go first.
+        with self.lock:
+            while self.producers > 0:
+                self.idle.wait()
+        try:
+            self.__put(None, None)
+        except ShutdownError:
+            self.log.error("Ingest writer has died, %d batches are lost", self.q.qsize())
+        self.worker.join()
+
+    def put(self, rec: Record, timeout: Optional[float] = None) -> None:
+        """Queue a Record for writing.
+
+        Blocks while the queue is full. If timeout is given and the queue is
+        still full after that many seconds, queue.Full is raised.
+        """
+        self.put_rows([(rec.host_id, int(rec.timestamp.timestamp()), rec.source, rec.message)],
+                      timeout)
+
+    def put_many(self, records: Iterable[Record], timeout: Optional[float] = None) -> None:
+        """Queue several Records for writing as one batch."""
+        self.put_rows([(rec.host_id, int(rec.timestamp.timestamp()), rec.source, rec.message)
+                       for rec in records],
+                      timeout)
+
+    def put_row(self, row: RecordRow, timeout: Optional[float] = None) -> None:
+        """Queue a record given as (host_id, timestamp, source, message), see put()."""
+        self.put_rows([row], timeout)
+
+    def put_rows(self, rows: Iterable[RecordRow], timeout: Optional[float] = None) -> None:
+        """Queue several records given as (host_id, timestamp, source, message) as one batch."""
+        batch: list[RecordRow] = list(rows)
+        with self.lock:
+            if self.closed:
+                raise ShutdownError("IngestQueue has been stopped")
+            if self.worker is not None and not self.worker.is_alive():
+                raise ShutdownError("Ingest writer has died")
+            if not batch:
+                return
+            self.producers += 1
+        try:
+            self.__put(batch, timeout)
+        finally:
+            with self.lock:
+                self.producers -= 1
+                if self.producers == 0:
+                    self.idle.notify_all()
+        with self.lock:
+            self.counters.received += len(batch)
+            self.counters.max_depth = max(self.counters.max_depth, self.q.qsize())
+
+    def __put(self, item: Optional[list[RecordRow]], timeout: Optional[float]) -> None:
+        """Put item into the queue, give up if the writer dies while we wait for room.
+
+        If timeout is given and there is still no room after that many
+        seconds, queue.Full is raised.
+        """
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait: float = LIVENESS_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0.0))
+            try:
+                self.q.put(item, True, wait)
+                return
+            except queue.Full:
+                if self.worker is not None and not self.worker.is_alive():
+                    raise ShutdownError("Ingest writer has died") from None
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def stats(self) -> IngestStats:
+        """Return a snapshot of the queue's counters."""
+        with self.lock:
+            return IngestStats(
+                depth=self.q.qsize(),
+                max_depth=self.counters.max_depth,
+                received=self.counters.received,
+                written=self.counters.written,
+                commits=self.counters.commits,
+                errors=self.counters.errors,
+                dead=self.counters.dead,
+                commit_last=self.counters.commit_last,
+                commit_max=self.counters.commit_max,
+                commit_total=self.counters.commit_total,
+            )
+
+    def __collect(self, first: list[RecordRow]) -> tuple[list[RecordRow], bool]:
+        """Gather queued batches without blocking until we have batch_size records.
+
+        Returns the records and a flag indicating if we found the shutdown marker.
+        """
+        batch: list[RecordRow] = first
+        while len(batch) < self.batch_size:
+            try:
+                item = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.extend(item)
+        return batch, False
+
+    def __store(self, db: Database, batch: list[RecordRow], attempts: int) -> list[RecordRow]:
+        """Write a batch of records, try attempts times before splitting it up.
+
+        Returns the records that could not be stored.
+        """
+        for attempt in range(attempts):
+            if attempt > 0:
+                time.sleep(RETRY_DELAY)
+            try:
+                db.record_add_rows(batch, self.batch_size, self.dedup)
+                return []
+            except Exception as err:  # pylint: disable-msg=W0718
+                self.log.error("Failed to write batch of %d records: %s",
+                               len(batch),
+                               err)
+                with self.lock:
+                    self.counters.errors += 1
+        if len(batch) == 1:
+            return batch
+        mid: int = len(batch) // 2
+        return self.__store(db, batch[:mid], 1) + self.__store(db, batch[mid:], 1)
+
+    def __write(self, db: Optional[Database], batch: list[RecordRow]) -> list[RecordRow]:
+        """Write a batch of records with db, or with the DBPool's writer if db is None.
+
+        We wait for the DBPool's writer as long as it takes, the producers
+        block in the meantime. Returns the records that could not be stored.
+        """
+        if db is not None:
+            return self.__store(db, batch, WRITE_ATTEMPTS)
+        assert self.pool is not None
+        while True:
+            try:
+                with self.pool.writer() as conn:
+                    return self.__store(conn, batch, WRITE_ATTEMPTS)
+            except PoolTimeout as err:
+                self.log.warning("Still waiting for the database writer: %s", err)
+
+    def __commit(self, db: Optional[Database], batch: list[RecordRow]) -> None:
+        """Write a batch of records, then check it for Alerts and publish it to the viewers."""
+        t0: float = time.perf_counter()
+        dead: list[RecordRow] = self.__write(db, batch)
+        elapsed: float = time.perf_counter() - t0
+        if dead:
+            for row in dead:
+                self.log.error("Dropping record the database refuses: %r", row)
+            rejected = {id(row) for row in dead}
+            batch = [row for row in batch if id(row) not in rejected]
+        with self.lock:
+            self.dead_letters.extend(dead)
+            self.counters.dead += len(dead)
+            self.counters.written += len(batch)
+            self.counters.commits += 1
+            self.counters.commit_last = elapsed
+            self.counters.commit_total += elapsed
+            self.counters.commit_max = max(self.counters.commit_max, elapsed)
+        if not batch:
+            return
+        if self.alerts is not None:
+            try:
+                self.alerts.check_rows(batch)
+            except Exception as err:  # pylint: disable-msg=W0718
+                self.log.error("Failed to check batch of %d records for alerts: %s",
+                               len(batch),
+                               err)
+        if self.tail is not None:
+            self.tail.publish(batch)
+
+    def __run(self) -> None:
+        """Drain the queue until we find the shutdown marker.
+
+        stop() waits for all producers before it queues the marker, so
+        nothing comes in behind it.
+        """
+        db: Optional[Database] = None
+        try:
+            if self.pool is None:
+                db = Database(self.path, compact=self.compact)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.error("Cannot open database %s: %s", self.path, err)
+            self.failure = err
+            self.ready.set()
+            return
+        self.ready.set()
+        try:
+            done: bool = False
+            while not done:
+                item = self.q.get()
+                if item is None:
+                    break
+                batch, done = self.__collect(item)
+                self.__commit(db, batch)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.critical("Ingest writer has died: %s", err)
+            return
+        self.log.debug("Ingest writer is finished.")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
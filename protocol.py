@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:26:16 krylon>
+#
+# /data/code/python/silo/protocol.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.protocol
+
+The wire protocol spoken between agents and the server.
+
+Every message is a frame consisting of a five byte header - the length of
+the payload as an unsigned 32 bit big endian integer, followed by one byte
+for the frame type - and the payload.
+
+An agent opens a connection by sending a Hello frame carrying its host name.
+After that, it may send any number of Batch frames, each carrying a sequence
+number and many records. The server answers each Batch with an Ack carrying
+the same sequence number, in the order the Batches arrived, so an agent does
+not need to wait for an Ack before sending the next Batch. If the server
+does not like what it receives, it sends an Error frame and hangs up.
+
+An Ack means the server has checked the records and queued them for
+writing, not that they are on disk yet: they are written in the next group
+commit, usually a few milliseconds later. Records that have been
+acknowledged may still be lost if the server dies before that, so an agent
+that cannot afford to lose any should keep them around for a while.
+
+Instead of a Batch, an agent may send a Packed frame, which carries the same
+records in the binary encoding of silo.encoding, compressed. Packed frames
+are acknowledged just like Batches.
+
+A viewer opens a connection by sending a Subscribe frame instead of a Hello,
+carrying a filter - a host name, a source and a substring, any of which may
+be empty - and the number of recent records it would like to see first.
+From then on, the server sends it Tail frames with the records that match,
+as they come in, and an empty Tail frame every now and then when nothing
+does. A Tail frame carries the number of records the server has dropped so
+far because the viewer did not keep up, and the records in the binary
+encoding of silo.encoding, with host names, compressed with zlib.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import asyncio
+import json
+import lzma
+import struct
+import zlib
+from datetime import datetime
+from enum import IntEnum
+from typing import BinaryIO, Callable, Final, Optional
+
+from silo import encoding
+from silo.data import STAMP_MAX, STAMP_MIN, Record, RecordRow
+from silo.encoding import NamedRow
+
+MAX_FRAME: Final[int] = 16 * 2**20
+
+# The longest host name we accept, as in DNS.
+MAX_HOST_NAME: Final[int] = 253
+
+header: Final[struct.Struct] = struct.Struct(">IB")
+ack_body: Final[struct.Struct] = struct.Struct(">QI")
+packed_head: Final[struct.Struct] = struct.Struct(">QB")
+
+# A record on the wire is the tuple (timestamp, source, message), the
+# timestamp given in seconds since the epoch.
+WireRecord = tuple[int, str, str]
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends something that does not follow the protocol."""
+
+
+class FrameType(IntEnum):
+    """FrameType identifies the kind of a frame."""
+
+    Hello = 1
+    Batch = 2
+    Ack = 3
+    Error = 4
+    Packed = 5
+    Subscribe = 6
+    Tail = 7
+
+
+class Codec(IntEnum):
+    """Codec identifies how the records in a Packed frame are compressed."""
+
+    Zlib = 1
+    LZMA = 2
+
+
+def frame(ftype: FrameType, payload: bytes) -> bytes:
+    """Assemble a complete frame."""
+    return header.pack(len(payload), ftype) + payload
+
+
+def read_frame(rfile: BinaryIO) -> Optional[tuple[FrameType, bytes]]:
+    """Read one frame from rfile.
+
+    Returns None if the peer closed the connection cleanly between frames.
+    """
+    head: bytes = rfile.read(header.size)
+    if not head:
+        return None
+    if len(head) < header.size:
+        raise ProtocolError("Connection closed in the middle of a frame header")
+    length, ftype = header.unpack(head)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"Frame of {length} bytes exceeds limit of {MAX_FRAME}")
+    try:
+        kind = FrameType(ftype)
+    except ValueError as err:
+        raise ProtocolError(f"Invalid frame type {ftype}") from err
+    payload: bytes = rfile.read(length)
+    if len(payload) < length:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return kind, payload
+
+
+async def read_frame_async(reader: asyncio.StreamReader) -> Optional[tuple[FrameType, bytes]]:
+    """Read one frame from an asyncio stream, see read_frame."""
+    try:
+        head: bytes = await reader.readexactly(header.size)
+    except asyncio.IncompleteReadError as err:
+        if not err.partial:
+            return None
+        raise ProtocolError("Connection closed in the middle of a frame header") from err
+    length, ftype = header.unpack(head)
+    if length > MAX_FRAME:
+        raise ProtocolError(f"Frame of {length} bytes exceeds limit of {MAX_FRAME}")
+    try:
+        kind = FrameType(ftype)
+    except ValueError as err:
+        raise ProtocolError(f"Invalid frame type {ftype}") from err
+    try:
+        payload: bytes = await reader.readexactly(length)
+    except asyncio.IncompleteReadError as err:
+        raise ProtocolError("Connection closed in the middle of a frame") from err
+    return kind, payload
+
+
+def encode_hello(name: str) -> bytes:
+    """Encode a Hello frame."""
+    return frame(FrameType.Hello, name.encode("utf-8"))
+
+
+def check_host_name(name: str) -> str:
+    """Check a host name sent by a peer, return it without surrounding blanks.
+
+    Hosts are added to the database the first time they are named, so we
+    only take names that look like one: not empty, not too long, and
+    without control characters.
+    """
+    name = name.strip()
+    if name == "":
+        raise ProtocolError("Empty host name")
+    if len(name) > MAX_HOST_NAME:
+        raise ProtocolError(f"Host name of {len(name)} characters is too long")
+    if not name.isprintable():
+        raise ProtocolError(f"Host name {name!r} contains control characters")
+    return name
+
+
+def decode_hello(payload: bytes) -> str:
+    """Decode the payload of a Hello frame, i.e. the agent's host name."""
+    try:
+        return check_host_name(payload.decode("utf-8"))
+    except UnicodeDecodeError as err:
+        raise ProtocolError(f"Host name is not valid UTF-8: {err}") from err
+
+
+def encode_batch(seq: int, records: list[Record]) -> bytes:
+    """Encode a Batch frame."""
+    rows: list[WireRecord] = [(int(r.timestamp.timestamp()), r.source, r.message)
+                              for r in records]
+    payload: bytes = json.dumps({"seq": seq, "records": rows},
+                                ensure_ascii=False,
+                                separators=(",", ":")).encode("utf-8")
+    return frame(FrameType.Batch, payload)
+
+
+def decode_batch(payload: bytes) -> tuple[int, list[WireRecord]]:
+    """Decode the payload of a Batch frame."""
+    try:
+        doc = json.loads(payload)
+        return int(doc["seq"]), doc["records"]
+    except (ValueError, KeyError, TypeError) as err:
+        raise ProtocolError(f"Malformed batch: {err}") from err
+
+
+def pack_records(records: list[Record], codec: Codec = Codec.Zlib) -> bytes:
+    """Encode and compress records for a Packed frame.
+
+    The result does not depend on the sequence number, so it can be kept,
+    e.g. in a spool, and sent later on any connection.
+    """
+    raw: bytes = encoding.encode(records)
+    if codec == Codec.LZMA:
+        return lzma.compress(raw, preset=1)
+    return zlib.compress(raw)
+
+
+def encode_packed(seq: int, codec: Codec, blob: bytes) -> bytes:
+    """Encode a Packed frame from the output of pack_records."""
+    return frame(FrameType.Packed, packed_head.pack(seq, codec) + blob)
+
+
+def _unpack(payload: bytes) -> tuple[int, bytes]:
+    """Split the payload of a Packed or Tail frame into its number and the decompressed data.
+
+    Like frames, the decompressed data is limited to MAX_FRAME bytes,
+    so a small frame cannot blow up into something huge.
+    """
+    if len(payload) < packed_head.size:
+        raise ProtocolError(f"Packed frame has invalid length {len(payload)}")
+    num, codec = packed_head.unpack_from(payload)
+    blob: bytes = payload[packed_head.size:]
+    try:
+        raw: bytes
+        if codec == Codec.Zlib:
+            zd = zlib.decompressobj()
+            raw = zd.decompress(blob, MAX_FRAME)
+            complete: bool = zd.eof and not zd.unconsumed_tail
+        elif codec == Codec.LZMA:
+            ld = lzma.LZMADecompressor()
+            raw = ld.decompress(blob, MAX_FRAME)
+            complete = ld.eof
+        else:
+            raise ProtocolError(f"Invalid codec {codec}")
+    except (zlib.error, lzma.LZMAError) as err:
+        raise ProtocolError(f"Malformed packed batch: {err}") from err
+    if not complete:
+        raise ProtocolError("Packed records are truncated or exceed the limit of "
+                            f"{MAX_FRAME} bytes")
+    return num, raw
+
+
+def decode_packed(payload: bytes,
+                  host_id: int = 0,
+                  resolve: Optional[Callable[[str], int]] = None) -> tuple[int, list[RecordRow]]:
+    """Decode the payload of a Packed frame into rows for the database.
+
+    The records belong to the Host given by host_id, unless they name
+    another Host, see encoding.decode.
+    """
+    seq, raw = _unpack(payload)
+    try:
+        rows = encoding.decode(raw, host_id, resolve)
+    except ValueError as err:
+        raise ProtocolError(f"Malformed packed batch: {err}") from err
+    return seq, rows
+
+
+def wire_to_records(rows: list[WireRecord], host_id: int) -> list[Record]:
+    """Turn the records of a Batch into Records belonging to the given Host."""
+    return [Record(host_id=host_id,
+                   timestamp=datetime.fromtimestamp(row[0]),
+                   source=row[1],
+                   message=row[2]) for row in rows]
+
+
+def wire_to_rows(rows: list[WireRecord], host_id: int) -> list[RecordRow]:
+    """Turn the records of a Batch into rows for the database belonging to the given Host.
+
+    Since the rows go to the database as they are, they are checked here:
+    the timestamp must fit into 64 bits, source and message must be strings
+    that can be encoded as UTF-8, which rules out lone surrogates.
+    """
+    result: list[RecordRow] = []
+    try:
+        for ts, source, message in rows:
+            if not isinstance(source, str) or not isinstance(message, str):
+                raise TypeError("source and message must be strings")
+            stamp: int = int(ts)
+            if not STAMP_MIN <= stamp <= STAMP_MAX:
+                raise ValueError(f"timestamp {stamp} is out of range")
+            source.encode("utf-8")
+            message.encode("utf-8")
+            result.append((host_id, stamp, source, message))
+    except (ValueError, TypeError, OverflowError) as err:
+        raise ProtocolError(f"Malformed record in batch: {err}") from err
+    return result
+
+
+def encode_ack(seq: int, count: int) -> bytes:
+    """Encode an Ack frame."""
+    return frame(FrameType.Ack, ack_body.pack(seq, count))
+
+
+def decode_ack(payload: bytes) -> tuple[int, int]:
+    """Decode the payload of an Ack frame into the sequence number and record count."""
+    if len(payload) != ack_body.size:
+        raise ProtocolError(f"Ack has invalid length {len(payload)}")
+    return ack_body.unpack(payload)
+
+
+def encode_error(msg: str) -> bytes:
+    """Encode an Error frame."""
+    return frame(FrameType.Error, msg.encode("utf-8"))
+
+
+def encode_subscribe(host: str = "", source: str = "", substring: str = "",
+                     backlog: int = 0) -> bytes:
+    """Encode a Subscribe frame."""
+    payload: bytes = json.dumps({"host": host,
+                                 "source": source,
+                                 "substring": substring,
+                                 "backlog": backlog},
+                                ensure_ascii=False,
+                                separators=(",", ":")).encode("utf-8")
+    return frame(FrameType.Subscribe, payload)
+
+
+def decode_subscribe(payload: bytes) -> tuple[str, str, str, int]:
+    """Decode the payload of a Subscribe frame into host, source, substring and backlog."""
+    try:
+        doc = json.loads(payload)
+        fields = (doc.get("host", ""), doc.get("source", ""), doc.get("substring", ""))
+        if not all(isinstance(f, str) for f in fields):
+            raise TypeError("host, source and substring must be strings")
+        return fields[0], fields[1], fields[2], max(int(doc.get("backlog", 0)), 0)
+    except (ValueError, AttributeError, TypeError) as err:
+        raise ProtocolError(f"Malformed subscription: {err}") from err
+
+
+def encode_tail(dropped: int, rows: list[NamedRow]) -> bytes:
+    """Encode a Tail frame carrying records as (host name, timestamp, source, message)."""
+    blob: bytes = zlib.compress(encoding.encode_rows(rows), 1)
+    return frame(FrameType.Tail, packed_head.pack(dropped, Codec.Zlib) + blob)
+
+
+def decode_tail(payload: bytes) -> tuple[int, list[NamedRow]]:
+    """Decode the payload of a Tail frame into the number of dropped records and the records."""
+    dropped, raw = _unpack(payload)
+    # decode() looks up each host name once, we number them and map them back.
+    names: list[str] = [""]
+
+    def number(name: str) -> int:
+        names.append(name)
+        return len(names) - 1
+
+    try:
+        rows = encoding.decode(raw, 0, number)
+    except ValueError as err:
+        raise ProtocolError(f"Malformed tail: {err}") from err
+    return dropped, [(names[r[0]], r[1], r[2], r[3]) for r in rows]
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:14:03 krylon>
+#
+# /data/code/python/silo/registry.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.registry
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import Final, Optional
+
+from silo import common
+from silo.data import Host
+from silo.database import DBPool
+
+# Default number of seconds between writing last_contact updates to the database.
+DEFAULT_CONTACT_INTERVAL: Final[float] = 30.0
+
+
+@dataclass(slots=True, kw_only=True)
+class RegistryStats:
+    """RegistryStats is a snapshot of a HostRegistry's counters."""
+
+    hosts: int = 0
+    hits: int = 0
+    misses: int = 0
+    pending: int = 0
+    flushes: int = 0
+
+
+class HostRegistry:
+    """HostRegistry caches Hosts in memory, so we don't have to ask the database for every record.
+
+    The host table is small and changes rarely, so after a Host has been
+    seen once, it is served from memory. Contact timestamps are only kept in
+    memory as well, and written to the database every interval seconds or
+    when flush() is called.
+
+    One HostRegistry is meant to be shared by all threads of a process. The
+    database queries run on connections checked out from the DBPool, lookups
+    on read-only ones, so they do not queue up behind the writers. The lock
+    only guards the cache, it is never held while talking to the database, so
+    a miss does not hold up lookups of Hosts we already know.
+    """
+
+    __slots__ = [
+        "log",
+        "pool",
+        "interval",
+        "lock",
+        "by_name",
+        "by_id",
+        "contacts",
+        "last_flush",
+        "counters",
+    ]
+
+    log: logging.Logger
+    pool: DBPool
+    interval: float
+    lock: Lock
+    by_name: dict[str, Host]
+    by_id: dict[int, Host]
+    contacts: dict[int, datetime]
+    last_flush: float
+    counters: RegistryStats
+
+    def __init__(self, pool: DBPool, interval: float = DEFAULT_CONTACT_INTERVAL) -> None:
+        self.log = common.get_logger("registry")
+        self.pool = pool
+        self.interval = interval
+        self.lock = Lock()
+        self.by_name = {}
+        self.by_id = {}
+        self.contacts = {}
+        self.last_flush = time.monotonic()
+        self.counters = RegistryStats()
+
+    def get(self, name: str) -> Host:
+        """Return the Host with the given name, adding it to the database if needed."""
+        with self.lock:
+            host = self.by_name.get(name)
+            if host is not None:
+                self.counters.hits += 1
+                return host
+        with self.pool.reader() as db:
+            host = db.host_get_by_name(name)
+        if host is None:
+            with self.pool.writer() as db:
+                host = db.host_get_or_add(name)
+        return self.__remember(host)
+
+    def find(self, name: str) -> Optional[Host]:
+        """Return the Host with the given name, or None if there is no such Host."""
+        with self.lock:
+            host = self.by_name.get(name)
+            if host is not None:
+                self.counters.hits += 1
+                return host
+        with self.pool.reader() as db:
+            host = db.host_get_by_name(name)
+        if host is None:
+            with self.lock:
+                self.counters.misses += 1
+            return None
+        return self.__remember(host)
+
+    def get_by_id(self, host_id: int) -> Optional[Host]:
+        """Return the Host with the given ID, or None if there is no such Host."""
+        with self.lock:
+            host = self.by_id.get(host_id)
+            if host is not None:
+                self.counters.hits += 1
+                return host
+        with self.pool.reader() as db:
+            host = db.host_get_by_id(host_id)
+        if host is None:
+            with self.lock:
+                self.counters.misses += 1
+            return None
+        return self.__remember(host)
+
+    def __remember(self, host: Host) -> Host:
+        """Add a Host we got from the database to the cache.
+
+        The database is asked without holding the lock, so another thread may
+        have cached the same Host meanwhile. In that case, we return the
+        cached one, so every thread touches the same object, and count a hit.
+        """
+        with self.lock:
+            cached = self.by_id.get(host.host_id)
+            if cached is not None:
+                self.counters.hits += 1
+                return cached
+            self.counters.misses += 1
+            self.by_name[host.name] = host
+            self.by_id[host.host_id] = host
+            return host
+
+    def touch(self, host: Host, stamp: Optional[datetime] = None) -> None:
+        """Note that we just heard from host.
+
+        The database is updated once the interval has passed.
+        """
+        if stamp is None:
+            stamp = datetime.now()
+        due: bool = False
+        with self.lock:
+            host.last_contact = stamp
+            self.contacts[host.host_id] = stamp
+            due = time.monotonic() - self.last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def resolve(self, name: str) -> Host:
+        """Look up a Host by name and record that we just heard from it."""
+        host = self.get(name)
+        self.touch(host)
+        return host
+
+    def flush(self) -> None:
+        """Write the pending contact timestamps to the database."""
+        with self.lock:
+            pending = self.contacts
+            self.contacts = {}
+            self.last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with self.pool.writer() as db:
+                db.host_update_contact_many(pending.items())
+        except Exception:
+            # Put them back, unless a newer contact came in meanwhile.
+            with self.lock:
+                for hid, stamp in pending.items():
+                    self.contacts.setdefault(hid, stamp)
+            raise
+        with self.lock:
+            self.counters.flushes += 1
+
+    def stats(self) -> RegistryStats:
+        """Return a snapshot of the registry's counters."""
+        with self.lock:
+            return RegistryStats(
+                hosts=len(self.by_name),
+                hits=self.counters.hits,
+                misses=self.counters.misses,
+                pending=len(self.contacts),
+                flushes=self.counters.flushes,
+            )
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
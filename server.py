@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-13 20:18:51 krylon>
+# Time-stamp: <2026-10-18 20:31:15 krylon>
 #
 # /data/code/python/silo/server.py
 # created on 12. 08. 2024
@@ -16,18 +16,445 @@ silo.server
 (c) 2024 Benjamin Walkenhorst
 """
 
+import argparse
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from socketserver import StreamRequestHandler, ThreadingTCPServer
+from typing import Final, Optional
 
-from silo.database import Database, DBPool
+from silo import common, protocol
+from silo.alert import RuleEngine
+from silo.data import Host, RecordRow
+from silo.database import DBPool
+from silo.dedup import Deduplicator
+from silo.encoding import NamedRow
+from silo.ingest import IngestQueue, ShutdownError
+from silo.protocol import FrameType, ProtocolError
+from silo.registry import HostRegistry
+from silo.tail import TailFilter, TailHub
+
+# The number of threads the asyncio server uses for blocking work, i.e.
+# looking up Hosts and handing records to the IngestQueue.
+EXECUTOR_THREADS: Final[int] = 4
+
+# The number of seconds after which a viewer gets an empty Tail frame if
+# nothing matched its filter, so we notice when it hangs up.
+TAIL_KEEPALIVE: Final[float] = 5.0
+
+# The maximum number of records we put into one Tail frame.
+TAIL_BATCH: Final[int] = 1000
+
+# What we tell a peer before hanging up because of our own problems. The
+# details go to the log, not to the peer.
+SHUTDOWN_MESSAGE: Final[str] = "Server is shutting down"
+INTERNAL_ERROR_MESSAGE: Final[str] = "Internal server error"
+
+
+def decode_frame(hosts: HostRegistry,
+                 host: Host,
+                 ftype: FrameType,
+                 payload: bytes) -> tuple[int, list[RecordRow]]:
+    """Decode a Batch or Packed frame sent by host into its sequence number and rows.
+
+    Records in a Packed frame that name another Host are filed under that
+    Host, which is looked up in hosts, or added if its name passes the same
+    checks as the one in a Hello.
+    """
+    if ftype == FrameType.Batch:
+        seq, wire = protocol.decode_batch(payload)
+        return seq, protocol.wire_to_rows(wire, host.host_id)
+    if ftype == FrameType.Packed:
+        return protocol.decode_packed(
+            payload,
+            host.host_id,
+            lambda name: hosts.resolve(protocol.check_host_name(name)).host_id)
+    raise ProtocolError(f"Unexpected {ftype.name} frame")
+
+
+def tail_filter(hosts: HostRegistry, payload: bytes) -> tuple[TailFilter, int]:
+    """Decode a Subscribe frame into a TailFilter and the backlog the viewer wants."""
+    name, source, substring, backlog = protocol.decode_subscribe(payload)
+    host_id: int = 0
+    if name != "":
+        host = hosts.find(name)
+        if host is None:
+            raise ProtocolError(f"Unknown host {name}")
+        host_id = host.host_id
+    return TailFilter(host=host_id, source=source, substring=substring), backlog
+
+
+def encode_tail(hosts: HostRegistry, dropped: int, rows: list[RecordRow]) -> list[bytes]:
+    """Encode records for a viewer as Tail frames, replacing host IDs with names.
+
+    An empty list of rows gives a single empty frame.
+    """
+    names: dict[int, str] = {}
+    for hid in {r[0] for r in rows}:
+        host = hosts.get_by_id(hid)
+        names[hid] = host.name if host is not None else ""
+    named: list[NamedRow] = [(names[r[0]], r[1], r[2], r[3]) for r in rows]
+    return [protocol.encode_tail(dropped, named[i:i + TAIL_BATCH])
+            for i in range(0, max(len(named), 1), TAIL_BATCH)]
 
 
 class RequestHandler(StreamRequestHandler):
     """RequestHandler implements the actual protocol."""
 
-    pool = DBPool()
+    server: "Server"
+    host: Optional[Host] = None
 
     def handle(self) -> None:
-        data = self.request[0].strip()
+        try:
+            self.__serve()
+        except ProtocolError as err:
+            self.server.log.error("Protocol error from %s: %s",
+                                  self.client_address,
+                                  err)
+            self.__refuse(str(err))
+        except ConnectionError as err:
+            self.server.log.info("Lost connection to %s: %s",
+                                 self.client_address,
+                                 err)
+        except ShutdownError as err:
+            self.server.log.info("Turning away %s: %s",
+                                 self.client_address,
+                                 err)
+            self.__refuse(SHUTDOWN_MESSAGE)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.server.log.error("Error serving %s: %s",
+                                  self.client_address,
+                                  err)
+            self.__refuse(INTERNAL_ERROR_MESSAGE)
+
+    def __refuse(self, message: str) -> None:
+        """Send the peer an Error frame before we hang up, if it is still listening."""
+        try:
+            self.wfile.write(protocol.encode_error(message))
+        except OSError:
+            pass
+
+    def __serve(self) -> None:
+        """Talk to the agent until it hangs up."""
+        fr = protocol.read_frame(self.rfile)
+        if fr is None:
+            return
+        if fr[0] == FrameType.Subscribe:
+            self.__tail(fr[1])
+            return
+        if fr[0] != FrameType.Hello:
+            raise ProtocolError(f"Expected Hello, got {fr[0].name}")
+        self.host = self.server.hosts.resolve(protocol.decode_hello(fr[1]))
+
+        while (fr := protocol.read_frame(self.rfile)) is not None:
+            seq, rows = decode_frame(self.server.hosts, self.host, *fr)
+            self.server.hosts.touch(self.host)
+            self.server.ingest.put_rows(rows)
+            self.wfile.write(protocol.encode_ack(seq, len(rows)))
+
+    def __tail(self, payload: bytes) -> None:
+        """Send new records matching the viewer's filter until it hangs up or we shut down."""
+        flt, backlog = tail_filter(self.server.hosts, payload)
+        with self.server.tail.subscribe(flt, backlog) as sub:
+            while True:
+                rows, dropped = sub.get(TAIL_KEEPALIVE)
+                if not rows and sub.closed:
+                    return
+                for data in encode_tail(self.server.hosts, dropped, rows):
+                    self.wfile.write(data)
+
+
+class Server(ThreadingTCPServer):
+    """Server accepts connections from agents and feeds their records into the database.
+
+    Each connection is handled by its own thread, but they all hand their
+    records to a single IngestQueue, so only one thread ever writes records
+    to the database, and it does so with the DBPool's read-write connection.
+    A Batch is acknowledged as soon as it has been queued.
+    If alerts is given, the IngestQueue checks the records against its Rules,
+    if dedup is given, it collapses repeated records with it.
+    Viewers that subscribe get new records from the TailHub the IngestQueue
+    publishes them to.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    log: logging.Logger
+    pool: DBPool
+    hosts: HostRegistry
+    tail: TailHub
+    ingest: IngestQueue
+
+    def __init__(self,
+                 addr: tuple[str, int] = ("", common.DEFAULT_PORT),
+                 path: str = "",
+                 compact: bool = False,
+                 alerts: Optional[RuleEngine] = None,
+                 dedup: Optional[Deduplicator] = None) -> None:
+        self.log = common.get_logger("server")
+        self.pool = DBPool(path, compact=compact)
+        self.hosts = HostRegistry(self.pool)
+        self.tail = TailHub()
+        self.ingest = IngestQueue(alerts=alerts,
+                                  tail=self.tail,
+                                  dedup=dedup,
+                                  pool=self.pool)
+        super().__init__(addr, RequestHandler)
+        self.tail.start()
+        self.ingest.start()
+
+    def server_close(self) -> None:
+        """Close the listening socket, write out all queued records and close the DBPool."""
+        super().server_close()
+        self.ingest.stop()
+        self.tail.stop()
+        self.hosts.flush()
+        self.pool.close()
+
+
+@dataclass(slots=True, kw_only=True)
+class ConnStats:
+    """ConnStats counts the connections and traffic handled by an AsyncServer."""
+
+    current: int = 0
+    peak: int = 0
+    total: int = 0
+    batches: int = 0
+    records: int = 0
+
+
+class AsyncServer:
+    """AsyncServer speaks the same protocol as Server, but on a single event loop.
+
+    That way, thousands of mostly idle agents cost a few kilobytes each
+    instead of a thread each. Everything that might block - looking up Hosts
+    and handing records to the IngestQueue, which pushes back when the
+    database falls behind - runs on a small thread pool, so a slow commit
+    never holds up reading from the sockets.
+    """
+
+    __slots__ = [
+        "log",
+        "addr",
+        "pool",
+        "hosts",
+        "tail",
+        "ingest",
+        "executor",
+        "srv",
+        "stats",
+    ]
+
+    log: logging.Logger
+    addr: tuple[str, int]
+    pool: DBPool
+    hosts: HostRegistry
+    tail: TailHub
+    ingest: IngestQueue
+    executor: ThreadPoolExecutor
+    srv: Optional[asyncio.Server]
+    stats: ConnStats
+
+    def __init__(self,
+                 addr: tuple[str, int] = ("", common.DEFAULT_PORT),
+                 path: str = "",
+                 compact: bool = False,
+                 alerts: Optional[RuleEngine] = None,
+                 dedup: Optional[Deduplicator] = None) -> None:
+        self.log = common.get_logger("server")
+        self.addr = addr
+        self.pool = DBPool(path, compact=compact)
+        self.hosts = HostRegistry(self.pool)
+        self.tail = TailHub()
+        self.ingest = IngestQueue(alerts=alerts,
+                                  tail=self.tail,
+                                  dedup=dedup,
+                                  pool=self.pool)
+        self.executor = ThreadPoolExecutor(EXECUTOR_THREADS, "AsyncServer")
+        self.srv = None
+        self.stats = ConnStats()
+
+    @property
+    def port(self) -> int:
+        """Return the port the server is listening on."""
+        assert self.srv is not None
+        return self.srv.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        """Start listening for connections."""
+        self.tail.start()
+        self.ingest.start()
+        self.srv = await asyncio.start_server(self.__handle,
+                                              self.addr[0] or None,
+                                              self.addr[1],
+                                              reuse_address=True)
+
+    async def serve_forever(self) -> None:
+        """Start the server if necessary and handle connections until cancelled."""
+        if self.srv is None:
+            await self.start()
+        assert self.srv is not None
+        await self.srv.serve_forever()
+
+    async def close(self) -> None:
+        """Stop listening, write out all queued records and close the DBPool."""
+        if self.srv is not None:
+            self.srv.close()
+            await self.srv.wait_closed()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.ingest.stop)
+        await loop.run_in_executor(self.executor, self.tail.stop)
+        await loop.run_in_executor(self.executor, self.hosts.flush)
+        self.executor.shutdown()
+        self.pool.close()
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Talk to one agent until it hangs up."""
+        peer = writer.get_extra_info("peername")
+        self.stats.current += 1
+        self.stats.total += 1
+        self.stats.peak = max(self.stats.peak, self.stats.current)
+        try:
+            await self.__serve(reader, writer)
+        except ProtocolError as err:
+            self.log.error("Protocol error from %s: %s", peer, err)
+            self.__refuse(writer, str(err))
+        except ConnectionError as err:
+            self.log.info("Lost connection to %s: %s", peer, err)
+        except ShutdownError as err:
+            self.log.info("Turning away %s: %s", peer, err)
+            self.__refuse(writer, SHUTDOWN_MESSAGE)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.error("Error serving %s: %s", peer, err)
+            self.__refuse(writer, INTERNAL_ERROR_MESSAGE)
+        finally:
+            self.stats.current -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def __refuse(writer: asyncio.StreamWriter, message: str) -> None:
+        """Send the peer an Error frame before we hang up, if it is still listening."""
+        if writer.is_closing():
+            return
+        try:
+            writer.write(protocol.encode_error(message))
+        except OSError:
+            pass
+
+    async def __serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        fr = await protocol.read_frame_async(reader)
+        if fr is None:
+            return
+        if fr[0] == FrameType.Subscribe:
+            await self.__tail(fr[1], writer)
+            return
+        if fr[0] != FrameType.Hello:
+            raise ProtocolError(f"Expected Hello, got {fr[0].name}")
+        host: Host = await loop.run_in_executor(self.executor,
+                                                self.hosts.resolve,
+                                                protocol.decode_hello(fr[1]))
+
+        while (fr := await protocol.read_frame_async(reader)) is not None:
+            seq, cnt = await loop.run_in_executor(self.executor, self.__accept, host, *fr)
+            self.stats.batches += 1
+            self.stats.records += cnt
+            writer.write(protocol.encode_ack(seq, cnt))
+            await writer.drain()
+
+    async def __tail(self, payload: bytes, writer: asyncio.StreamWriter) -> None:
+        """Send new records matching the viewer's filter until it hangs up or we shut down.
+
+        Instead of tying up a thread of the executor, the Subscription wakes
+        us up through the event loop when records arrive.
+        """
+        loop = asyncio.get_running_loop()
+        flt, backlog = await loop.run_in_executor(self.executor,
+                                                  tail_filter,
+                                                  self.hosts,
+                                                  payload)
+        ready = asyncio.Event()
+        wakeup = partial(loop.call_soon_threadsafe, ready.set)
+        with self.tail.subscribe(flt, backlog, wakeup=wakeup) as sub:
+            while True:
+                try:
+                    await asyncio.wait_for(ready.wait(), TAIL_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    pass
+                ready.clear()
+                rows, dropped = sub.take()
+                if not rows and sub.closed:
+                    return
+                frames = await loop.run_in_executor(self.executor,
+                                                    encode_tail,
+                                                    self.hosts,
+                                                    dropped,
+                                                    rows)
+                for data in frames:
+                    writer.write(data)
+                await writer.drain()
+
+    def __accept(self, host: Host, ftype: FrameType, payload: bytes) -> tuple[int, int]:
+        """Decode a frame and hand its records to the IngestQueue.
+
+        This may block, so it runs on the executor. Returns the sequence
+        number and the number of records.
+        """
+        seq, rows = decode_frame(self.hosts, host, ftype, payload)
+        self.hosts.touch(host)
+        self.ingest.put_rows(rows)
+        return seq, len(rows)
+
+
+def main() -> None:
+    """Run the server."""
+    argp = argparse.ArgumentParser()
+    argp.add_argument("-p", "--port", type=int, default=common.DEFAULT_PORT,
+                      help="The TCP port to listen on")
+    argp.add_argument("-d", "--db", default="",
+                      help="The path of the database")
+    argp.add_argument("-a", "--async", action="store_true", dest="use_async",
+                      help="Handle all connections on a single asyncio event loop")
+    argp.add_argument("-c", "--compact", action="store_true",
+                      help="Store messages as templates and parameters")
+    argp.add_argument("-r", "--repeats", type=int, default=0, metavar="SECONDS",
+                      help="Collapse identical records within this many seconds into one")
+    args = argp.parse_args()
+
+    dedup: Optional[Deduplicator] = None
+    if args.repeats > 0:
+        dedup = Deduplicator(args.repeats)
+
+    if args.use_async:
+        asrv = AsyncServer(("", args.port), args.db, args.compact, dedup=dedup)
+
+        async def run() -> None:
+            try:
+                await asrv.serve_forever()
+            finally:
+                await asrv.close()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    else:
+        with Server(("", args.port), args.db, args.compact, dedup=dedup) as srv:
+            try:
+                srv.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
 
 
 # Local Variables: #
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:32:57 krylon>
+#
+# /data/code/python/silo/tail.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.tail
+
+Hand newly ingested records to any number of live viewers, like tail -f.
+
+The IngestQueue publishes each batch to a TailHub before writing it. All the
+ingest path does is to append the records to a ring buffer, which never
+blocks and never grows. A thread of the TailHub picks them up from there,
+and hands each Subscription the records that match its filter. Each
+Subscription has a bounded queue of its own; if a viewer does not keep up,
+the oldest records in its queue are dropped, and it is told how many.
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from threading import Condition, Lock, Thread
+from typing import Callable, Final, Optional
+
+from silo import common
+from silo.data import RecordRow
+
+# The number of records the ring buffer holds.
+DEFAULT_RING_SIZE: Final[int] = 65536
+
+# The number of records a Subscription holds before it drops the oldest.
+DEFAULT_QUEUE_SIZE: Final[int] = 4096
+
+
+@dataclass(slots=True, kw_only=True)
+class TailFilter:
+    """TailFilter selects the records a Subscription gets.
+
+    A record matches if it comes from the Host with the ID host, its source
+    equals source, and its message contains substring. Empty values and a
+    host of 0 match anything.
+    """
+
+    host: int = 0
+    source: str = ""
+    substring: str = ""
+
+    def matches(self, row: RecordRow) -> bool:
+        """Return True if a record given as (host_id, timestamp, source, message) matches."""
+        return (self.host in (0, row[0]) and
+                self.source in ("", row[2]) and
+                self.substring in row[3])
+
+
+@dataclass(slots=True, kw_only=True)
+class TailStats:
+    """TailStats is a snapshot of a TailHub's counters.
+
+    lost counts records that fell out of the ring buffer before they were
+    handed to the Subscriptions, dropped those that fell out of the queue of
+    a Subscription before its viewer picked them up.
+    """
+
+    subscribers: int = 0
+    published: int = 0
+    lost: int = 0
+    delivered: int = 0
+    dropped: int = 0
+
+
+class Subscription:
+    """Subscription is a viewer's queue of records matching its filter.
+
+    The viewer either waits for records with get(), or has the TailHub call
+    wakeup whenever records arrive and picks them up with take(), e.g. from
+    an event loop.
+    """
+
+    __slots__ = [
+        "hub",
+        "flt",
+        "cond",
+        "q",
+        "dropped",
+        "delivered",
+        "closed",
+        "wakeup",
+    ]
+
+    hub: "TailHub"
+    flt: TailFilter
+    cond: Condition
+    q: deque[RecordRow]
+    dropped: int
+    delivered: int
+    closed: bool
+    wakeup: Optional[Callable[[], None]]
+
+    def __init__(self,
+                 hub: "TailHub",
+                 flt: TailFilter,
+                 maxsize: int,
+                 wakeup: Optional[Callable[[], None]]) -> None:
+        self.hub = hub
+        self.flt = flt
+        self.cond = Condition()
+        self.q = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+        self.wakeup = wakeup
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, ex_type, ex_val, traceback):
+        self.close()
+        return False
+
+    def push(self, rows: list[RecordRow]) -> None:
+        """Queue records, dropping the oldest ones if the queue overflows."""
+        if not rows:
+            return
+        with self.cond:
+            if self.closed:
+                return
+            overflow: int = len(self.q) + len(rows) - (self.q.maxlen or 0)
+            if overflow > 0:
+                self.dropped += overflow
+            self.q.extend(rows)
+            self.delivered += len(rows)
+            self.cond.notify_all()
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def take(self) -> tuple[list[RecordRow], int]:
+        """Return the queued records without waiting, and the number dropped so far."""
+        with self.cond:
+            rows = list(self.q)
+            self.q.clear()
+            return rows, self.dropped
+
+    def get(self, timeout: Optional[float] = None) -> tuple[list[RecordRow], int]:
+        """Wait up to timeout seconds for records, see take().
+
+        Returns right away, with whatever is queued, once the Subscription
+        has been closed.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.q or self.closed, timeout)
+            rows = list(self.q)
+            self.q.clear()
+            return rows, self.dropped
+
+    def close(self) -> None:
+        """Stop receiving records."""
+        self.hub.unsubscribe(self)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.wakeup is not None:
+            self.wakeup()
+
+
+class TailHub:
+    """TailHub fans out published records to Subscriptions.
+
+    It keeps the most recent ring_size records, so new Subscriptions can
+    start out with a backlog, and the fan-out thread has some slack.
+    """
+
+    __slots__ = [
+        "log",
+        "lock",
+        "cond",
+        "ring",
+        "published",
+        "fanned",
+        "subs",
+        "counters",
+        "worker",
+        "closed",
+    ]
+
+    log: logging.Logger
+    lock: Lock
+    cond: Condition
+    ring: deque[RecordRow]
+    published: int
+    fanned: int
+    subs: list[Subscription]
+    counters: TailStats
+    worker: Optional[Thread]
+    closed: bool
+
+    def __init__(self, ring_size: int = DEFAULT_RING_SIZE) -> None:
+        self.log = common.get_logger("tail")
+        self.lock = Lock()
+        self.cond = Condition(self.lock)
+        self.ring = deque(maxlen=ring_size)
+        # The number of records published and handed to the Subscriptions so far.
+        self.published = 0
+        self.fanned = 0
+        self.subs = []
+        self.counters = TailStats()
+        self.worker = None
+        self.closed = False
+
+    def start(self) -> None:
+        """Start the fan-out thread."""
+        if self.worker is not None:
+            return
+        self.worker = Thread(target=self.__run, name="TailHub", daemon=True)
+        self.worker.start()
+
+    def stop(self) -> None:
+        """Hand out what has been published and stop the fan-out thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.worker is not None:
+            self.worker.join()
+        for sub in list(self.subs):
+            sub.close()
+
+    def publish(self, rows: list[RecordRow]) -> None:
+        """Add records to the ring buffer. This never blocks for long."""
+        with self.cond:
+            self.ring.extend(rows)
+            self.published += len(rows)
+            if self.subs:
+                self.cond.notify()
+            else:
+                # Nobody to hand them to, they are only kept for the backlog.
+                self.fanned = self.published
+
+    def subscribe(self,
+                  flt: TailFilter,
+                  backlog: int = 0,
+                  maxsize: int = DEFAULT_QUEUE_SIZE,
+                  wakeup: Optional[Callable[[], None]] = None) -> Subscription:
+        """Register a viewer for the records matching flt.
+
+        The Subscription starts out with up to backlog of the most recent
+        matching records. wakeup, if given, is called from the fan-out
+        thread whenever records were queued for the Subscription.
+        """
+        sub = Subscription(self, flt, maxsize, wakeup)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("TailHub has been stopped")
+            rows: list[RecordRow] = []
+            if backlog > 0:
+                # Records not handed out yet will reach the new Subscription
+                # through the fan-out thread.
+                end: int = len(self.ring) - (self.published - self.fanned)
+                for row in islice(reversed(self.ring), len(self.ring) - max(end, 0), None):
+                    if flt.matches(row):
+                        rows.append(row)
+                        if len(rows) == backlog:
+                            break
+                rows.reverse()
+            self.subs.append(sub)
+            self.counters.subscribers += 1
+        sub.push(rows)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        """Forget a Subscription. Subscription.close() does this."""
+        with self.cond:
+            if sub in self.subs:
+                self.subs.remove(sub)
+                self.counters.subscribers -= 1
+                self.counters.delivered += sub.delivered
+                self.counters.dropped += sub.dropped
+
+    def stats(self) -> TailStats:
+        """Return a snapshot of the hub's counters, including those of current Subscriptions."""
+        with self.cond:
+            c = self.counters
+            return TailStats(subscribers=c.subscribers,
+                             published=self.published,
+                             lost=c.lost,
+                             delivered=c.delivered + sum(s.delivered for s in self.subs),
+                             dropped=c.dropped + sum(s.dropped for s in self.subs))
+
+    def __run(self) -> None:
+        """Hand the records in the ring buffer to the Subscriptions as they come in."""
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.closed or
+                                   (self.subs and self.published > self.fanned))
+                pending: int = self.published - self.fanned
+                if pending == 0 and self.closed:
+                    break
+                lost: int = max(pending - len(self.ring), 0)
+                rows: list[RecordRow] = list(islice(self.ring,
+                                                    len(self.ring) - (pending - lost),
+                                                    None))
+                self.fanned = self.published
+                self.counters.lost += lost
+                subs: list[Subscription] = list(self.subs)
+            if lost > 0:
+                self.log.warning("Tail fell behind, %d records were not handed out", lost)
+            for sub in subs:
+                flt = sub.flt
+                try:
+                    sub.push([row for row in rows if flt.matches(row)])
+                except Exception as err:  # pylint: disable-msg=W0718
+                    self.log.error("Failed to hand records to subscriber: %s", err)
+        self.log.debug("TailHub is finished.")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
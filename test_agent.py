@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:30:03 krylon>
+#
+# /data/code/python/silo/test_agent.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_agent
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import socket
+import unittest
+from datetime import datetime
+from threading import Thread
+
+from krylib import isdir
+
+from silo import common
+from silo.agent import Agent, Batcher, Spool
+from silo.data import Record
+from silo.database import Database
+from silo.extractor.logfile import LogfileExtractor
+from silo.extractor.test_syslog import test_content
+from silo.protocol import Codec
+from silo.server import Server
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+lines: list[str] = [line + "\n" for line in test_content.split("\n") if line != ""]
+
+
+def free_port() -> int:
+    """Return a port nobody listens on, most likely."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AgentTest(unittest.TestCase):
+    """Test shipping records from an agent to a server."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_agent_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def __start(self, port: int, name: str) -> tuple[Server, Thread]:
+        srv = Server(("127.0.0.1", port), os.path.join(self.folder, f"{name}.db"))
+        worker = Thread(target=srv.serve_forever, daemon=True)
+        worker.start()
+        return srv, worker
+
+    def __stop(self, srv: Server, worker: Thread) -> None:
+        srv.shutdown()
+        srv.server_close()
+        worker.join()
+
+    def __count(self, name: str, host: str) -> int:
+        db = Database(os.path.join(self.folder, f"{name}.db"))
+        h = db.host_get_by_name(host)
+        return 0 if h is None else len(db.record_get_by_host(h.host_id))
+
+    def __logfile(self, name: str) -> LogfileExtractor:
+        path: str = os.path.join(self.folder, f"{name}.log")
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("".join(lines))
+        return LogfileExtractor(path)
+
+    def test_01_ship(self) -> None:
+        """Test batching and shipping records to a server that is up."""
+        srv, worker = self.__start(0, "ship")
+        agent = Agent("127.0.0.1",
+                      srv.server_address[1],
+                      [self.__logfile("ship")],
+                      name="agent01",
+                      codec=Codec.LZMA,
+                      batcher=Batcher(max_records=50),
+                      spool=Spool(os.path.join(self.folder, "ship.spool")))
+        self.assertEqual(agent.step(), len(lines))
+        agent.close()
+        self.__stop(srv, worker)
+
+        self.assertEqual(agent.stats.records, len(lines))
+        self.assertEqual(agent.stats.batches, (len(lines) + 49) // 50)
+        self.assertEqual(agent.stats.spooled, 0)
+        self.assertLess(agent.stats.sent_bytes, agent.stats.raw_bytes / 2)
+        self.assertEqual(self.__count("ship", "agent01"), len(lines))
+
+    def test_02_spool(self) -> None:
+        """Test spooling while the server is down, and draining the spool once it is back."""
+        port: int = free_port()
+        spool_dir: str = os.path.join(self.folder, "offline.spool")
+        agent = Agent("127.0.0.1",
+                      port,
+                      [self.__logfile("offline")],
+                      name="agent02",
+                      batcher=Batcher(max_records=20, max_age=0),
+                      spool=Spool(spool_dir))
+        self.assertEqual(agent.step(), len(lines))
+        agent.close()
+        self.assertEqual(len(agent.spool), (len(lines) + 19) // 20)
+        self.assertGreater(agent.stats.failures, 0)
+
+        # A new agent picks up the spool left behind by the old one.
+        srv, worker = self.__start(port, "offline")
+        try:
+            agent = Agent("127.0.0.1",
+                          port,
+                          name="agent02",
+                          window=2,
+                          spool=Spool(spool_dir))
+            self.assertGreater(len(agent.spool), 0)
+            agent.step()
+            self.assertEqual(len(agent.spool), 0)
+            agent.close()
+        finally:
+            self.__stop(srv, worker)
+        self.assertEqual(os.listdir(spool_dir), [])
+        self.assertEqual(self.__count("offline", "agent02"), len(lines))
+
+    def test_03_spool_limit(self) -> None:
+        """Test that a full spool drops the oldest batches."""
+        spool = Spool(os.path.join(self.folder, "limit.spool"), limit=100)
+        agent = Agent("127.0.0.1", free_port(), name="agent03", spool=spool)
+        for i in range(10):
+            agent.batcher.add(Record(timestamp=datetime.fromtimestamp(i),
+                                     source="test",
+                                     message=f"message {i}"))
+            agent.flush()
+        self.assertLessEqual(spool.size, 100)
+        self.assertGreater(spool.dropped, 0)
+        self.assertEqual(len(spool) + spool.dropped, 10)
+
+    def test_04_spool_damaged(self) -> None:
+        """Test that stray and damaged files in the spool are skipped."""
+        folder: str = os.path.join(self.folder, "damaged.spool")
+        spool = Spool(folder)
+        agent = Agent("127.0.0.1", free_port(), name="agent04", spool=spool)
+        for i in range(3):
+            agent.batcher.add(Record(timestamp=datetime.fromtimestamp(i),
+                                     source="test",
+                                     message=f"message {i}"))
+            agent.flush()
+        names: list[str] = list(spool.names)
+        with open(os.path.join(folder, names[1]), "r+b") as fh:
+            fh.truncate(2)
+        with open(os.path.join(folder, "notes.txt"), "w", encoding="utf-8") as fh:
+            fh.write("Not a batch\n")
+
+        spool = Spool(folder)
+        self.assertEqual(list(spool.names), names)
+        self.assertIsNotNone(spool.load(names[0]))
+        self.assertIsNone(spool.load(names[1]))
+        self.assertEqual(list(spool.names), [names[0], names[2]])
+        self.assertIn(names[1] + ".bad", os.listdir(folder))
+        self.assertEqual(Spool(folder).serial, spool.serial)
+
+    def test_05_stalled(self) -> None:
+        """Test that a server that accepts the connection, but never answers, is given up on."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            sock.listen()
+            spool = Spool(os.path.join(self.folder, "stalled.spool"))
+            agent = Agent("127.0.0.1",
+                          sock.getsockname()[1],
+                          name="agent05",
+                          window=1,
+                          timeout=0.2,
+                          spool=spool)
+            agent.batcher.add(Record(timestamp=datetime.fromtimestamp(0),
+                                     source="test",
+                                     message="Is anybody out there?"))
+            agent.close()
+        self.assertEqual(agent.stats.failures, 1)
+        self.assertEqual(len(spool), 1)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
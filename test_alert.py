@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:17:35 krylon>
+#
+# /data/code/python/silo/test_alert.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_alert
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import random
+import re
+import unittest
+
+from silo import alert
+from silo.alert import Alert, Rule, RuleEngine, RuleError, WindowCounter
+
+WORDS: list[str] = ["error", "Error", "failed", "timeout", "disk", "sda1", "login",
+                    "root", "named", "lame", "server", "resolving", "ÄÖÜ", "x"]
+
+
+class AlertTest(unittest.TestCase):
+    """Test the alert rule engine."""
+
+    def test_01_window(self) -> None:
+        """Test counting events over a sliding window."""
+        w = WindowCounter(60, 6)
+        self.assertEqual(w.add(0), 1)
+        self.assertEqual(w.add(5), 2)
+        self.assertEqual(w.add(59), 3)
+        # The slot of 0 and 5 has left the window.
+        self.assertEqual(w.add(60), 2)
+        # Too old to count.
+        self.assertEqual(w.add(0), 2)
+        self.assertEqual(w.add(1000), 1)
+        w.clear()
+        self.assertEqual(w.add(1001), 1)
+
+    def test_02_literal(self) -> None:
+        """Test finding the literals a regular expression cannot match without."""
+        cases = [
+            (r"disk \w+ failed", 0, [" failed"]),
+            (r"(sda|sdb)\d+: I/O error", 0, [": I/O error"]),
+            (r"error|warn(ing)?", 0, ["error", "warn"]),
+            (r"(?:connection) reset", 0, ["connection reset"]),
+            (r"(?:lost|dropped) \d+ packets?", 0, [" packet"]),
+            (r"(?:lost|dropped)\s+\d+", 0, ["lost", "dropped"]),
+            (r"(?:lost|\d+)\s+\d+", 0, []),
+            (r"(?i)timeout", 0, []),
+            (r"Timeout", re.IGNORECASE, ["Timeout"]),
+            (r"(?:ab)+c", 0, ["ab"]),
+            (r"[", 0, []),
+        ]
+        for pattern, flags, lits in cases:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(alert.required_literals(pattern, flags), lits)
+        self.assertTrue(alert.combinable(r"foo(bar)?", re.compile(r"foo(bar)?")))
+        self.assertFalse(alert.combinable(r"(a)\1", re.compile(r"(a)\1")))
+        self.assertFalse(alert.combinable(r"(?P<x>a)", re.compile(r"(?P<x>a)")))
+        self.assertFalse(alert.combinable(r"(?s)a.b", re.compile(r"(?s)a.b")))
+
+    def test_03_fuzz(self) -> None:
+        """Test that the index finds exactly the matches trying every Rule would find."""
+        rng = random.Random(42)
+        rules: list[Rule] = []
+        for i in range(300):
+            w1, w2 = rng.choice(WORDS), rng.choice(WORDS)
+            kind = i % 8
+            rules.append(Rule(
+                name=f"rule{i:03d}",
+                substring=w1 if kind in (0, 1) else "",
+                pattern={2: f"{w1} .*{w2}",
+                         3: f"{w1}|{w2}",
+                         4: f"(?i){w1}",
+                         5: f"^{w1}",
+                         6: r"(\w)\1"}.get(kind, ""),
+                source=rng.choice(["", "", "kernel", "sshd"]),
+                host=rng.choice([0, 0, 0, 1, 2]),
+                ignore_case=kind in (1, 2),
+            ))
+        engine = RuleEngine(rules)
+        naive = RuleEngine(rules)
+        for _ in range(1000):
+            msg = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 8)))
+            row = (rng.randint(1, 3), 100, rng.choice(["kernel", "sshd", "cron"]), msg)
+            got = sorted(a.rule for a in engine.check(*row))
+            lower = msg.lower()
+            want = sorted(m.rule.name for m in naive.index.matchers
+                          if m.matches(row[0], row[2], msg, lower))
+            self.assertEqual(got, want, msg)
+        stats = engine.stats()
+        self.assertEqual(stats.records, 1000)
+        self.assertEqual(stats.matches, sum(r.matches for r in stats.rules.values()))
+        self.assertLess(stats.candidates, 1000 * len(rules) // 2)
+
+    def test_04_threshold(self) -> None:
+        """Test rate thresholds, counting per Host and delivery of Alerts."""
+        delivered: list[Alert] = []
+        engine = RuleEngine([Rule(name="auth", substring="authentication failure",
+                                  threshold=3, window=60),
+                             Rule(name="disk", pattern=r"I/O error", source="kernel",
+                                  threshold=2, window=10, per_host=True)],
+                            notify=delivered.append)
+        msg = "pam_unix(sshd:auth): authentication failure; rhost=10.0.0.1"
+        self.assertEqual(engine.check(1, 0, "sshd", msg), [])
+        self.assertEqual(engine.check(2, 10, "sshd", msg), [])
+        fired = engine.check(1, 20, "sshd", msg)
+        self.assertEqual([(a.rule, a.count, a.host_id) for a in fired], [("auth", 3, 1)])
+        # The count starts over after firing.
+        self.assertEqual(engine.check(1, 21, "sshd", msg), [])
+        # Too far apart.
+        engine.check(1, 200, "sshd", msg)
+        self.assertEqual(engine.check(1, 300, "sshd", msg), [])
+
+        io = "blk_update_request: I/O error, dev sda, sector 42"
+        rows = [(1, 1000, "kernel", io), (2, 1001, "kernel", io), (1, 1002, "cron", io),
+                (2, 1005, "kernel", io), (1, 1020, "kernel", io)]
+        fired = engine.check_rows(rows)
+        self.assertEqual([(a.rule, a.host_id, a.timestamp) for a in fired],
+                         [("disk", 2, 1005)])
+        self.assertEqual(delivered, [engine.alerts()[0], fired[0]])
+        stats = engine.stats()
+        self.assertEqual(stats.rules["auth"].matches, 6)
+        self.assertEqual(stats.rules["auth"].alerts, 1)
+        self.assertEqual(stats.rules["disk"].matches, 4)
+        self.assertEqual(stats.alerts, 2)
+
+    def test_05_load(self) -> None:
+        """Test replacing the Rules, and rejecting invalid ones."""
+        engine = RuleEngine([Rule(name="old", substring="oops")])
+        for rules in ([Rule(name="bad", pattern="(")],
+                      [Rule(name="", substring="x")],
+                      [Rule(name="zero", substring="x", threshold=0)],
+                      [Rule(name="twice", substring="x"), Rule(name="twice", substring="y")]):
+            with self.assertRaises(RuleError):
+                engine.load(rules)
+        self.assertEqual(len(engine), 1)
+        engine.load([Rule(name="new", substring="oops"), Rule(name="newer", source="cron")])
+        self.assertEqual(len(engine), 2)
+        self.assertEqual(sorted(a.rule for a in engine.check(1, 0, "cron", "oops")),
+                         ["new", "newer"])
+
+    def test_06_no_parser(self) -> None:
+        """Test that Rules are still evaluated when the parser of the re module lets us down."""
+        class BrokenParser:
+            """BrokenParser stands in for a re._parser that works differently."""
+
+            @staticmethod
+            def parse(pattern: str, flags: int = 0) -> None:
+                """Fail like a parser with a different signature would."""
+                raise TypeError(f"parse() cannot handle {pattern!r} with flags {flags}")
+
+        rules = [Rule(name="io", pattern=r"(sda|sdb)\d+: I/O error"),
+                 Rule(name="lost", pattern=r"(?:lost|dropped)\s+\d+"),
+                 Rule(name="digits", pattern=r"\d{4}"),
+                 Rule(name="twice", pattern=r"(\w+) \1")]
+        messages = ["sda1: I/O error", "lost 42 packets", "port 8080", "again again", "nothing"]
+        expected = [["io"], ["lost"], ["digits"], ["twice"], []]
+        saved = alert.sre_parse
+        try:
+            for parser in (BrokenParser, None):
+                alert.sre_parse = parser
+                with self.subTest(parser=parser):
+                    self.assertEqual(alert.required_literals(r"disk \w+ failed"), [])
+                    self.assertFalse(alert.combinable(r"foo(bar)?", re.compile(r"foo(bar)?")))
+                    engine = RuleEngine(rules)
+                    self.assertEqual([sorted(a.rule for a in engine.check(1, i, "kernel", msg))
+                                      for i, msg in enumerate(messages)],
+                                     expected)
+        finally:
+            alert.sre_parse = saved
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
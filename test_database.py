@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-08-12 18:00:49 krylon>
+# Time-stamp: <2026-10-18 20:32:03 krylon>
 #
 # /data/code/python/silo/test_database.py
 # created on 10. 08. 2024
@@ -24,7 +24,8 @@ from datetime import datetime
 from krylib import isdir
 
 from silo import common, database
-from silo.data import Host, Record
+from silo.data import Host, Record, RecordBatch, RecordRow
+from silo.dedup import Deduplicator
 
 TEST_ROOT: str = "/tmp"
 
@@ -122,6 +123,498 @@ class DatbaseTest(unittest.TestCase):
             else:
                 self.assertNotEqual(c[0].record_id, 0)
 
+    def test_05_record_add_batch(self) -> None:
+        """Test adding log records in batches."""
+        db = self.__get_db()
+        records: list[Record] = [
+            Record(host_id=2,
+                   timestamp=datetime.fromtimestamp(100 + i),
+                   source="named",
+                   message=f"Batch {i:03d}")
+            for i in range(250)
+        ]
+
+        cnt = db.record_add_batch(records, True, 64)
+        self.assertEqual(cnt, len(records))
+        stored = db.record_get_by_host(2)
+        self.assertEqual(len(stored), len(records))
+        by_id = {r.record_id: r for r in stored}
+        for r in records:
+            self.assertIn(r.record_id, by_id)
+            self.assertEqual(by_id[r.record_id].message, r.message)
+
+        anon: list[Record] = [
+            Record(host_id=3,
+                   timestamp=datetime.fromtimestamp(500 + i),
+                   source="smartd",
+                   message=f"Anon {i}")
+            for i in range(10)
+        ]
+        with database.BatchWriter(db, batch_size=4, interval=3600) as w:
+            for r in anon:
+                w.add(r)
+            self.assertEqual(len(w), 2)
+        self.assertEqual(len(db.record_get_by_host(3)), len(anon))
+        for r in anon:
+            self.assertEqual(r.record_id, 0)
+
+    def test_06_record_iter(self) -> None:
+        """Test iterating over records page by page."""
+        db = self.__get_db()
+        everything = db.record_get_by_host(2)
+        self.assertEqual(len(everything), 250)
+
+        pages: list[list[Record]] = []
+        after = None
+        while True:
+            page = list(db.record_iter_by_host(2, limit=100, after=after, chunk=7))
+            if not page:
+                break
+            pages.append(page)
+            after = database.page_key(page[-1])
+        self.assertEqual([len(p) for p in pages], [100, 100, 50])
+        paged = [r.record_id for p in pages for r in p]
+        self.assertEqual(paged, [r.record_id for r in everything])
+
+        begin = datetime.fromtimestamp(0)
+        end = datetime.fromtimestamp(1000)
+        stamps = [r.timestamp for r in db.record_iter_by_period(begin, end, chunk=16)]
+        self.assertEqual(stamps, sorted(stamps))
+        self.assertEqual(len(stamps), len(db.record_get_by_period(begin, end)))
+        first = list(db.record_iter_by_period(begin, end, limit=5))
+        rest = list(db.record_iter_by_period(begin, end, after=database.page_key(first[-1])))
+        self.assertEqual(len(first) + len(rest), len(stamps))
+
+    def test_07_record_search(self) -> None:
+        """Test full text search over records."""
+        db = self.__get_db()
+        records = [
+            Record(host_id=1,
+                   timestamp=datetime.fromtimestamp(2000),
+                   source="named",
+                   message="validating omny.fm/A: no valid signature found"),
+            Record(host_id=2,
+                   timestamp=datetime.fromtimestamp(2100),
+                   source="named",
+                   message="validating omny.fm/AAAA: no valid signature found"),
+            Record(host_id=2,
+                   timestamp=datetime.fromtimestamp(2200),
+                   source="smartd",
+                   message="Device: /dev/ada0, SMART Usage Attribute: 194 Temperature_Celsius"),
+        ]
+        db.record_add_batch(records)
+
+        hits = db.record_search('"no valid signature"')
+        self.assertEqual({r.record_id for r in hits},
+                         {records[0].record_id, records[1].record_id})
+        hits = db.record_search("signature", by_rank=False)
+        self.assertEqual([r.record_id for r in hits],
+                         [records[1].record_id, records[0].record_id])
+        hits = db.record_search("signature", host=2)
+        self.assertEqual([r.record_id for r in hits], [records[1].record_id])
+        hits = db.record_search("signature",
+                                begin=datetime.fromtimestamp(1900),
+                                end=datetime.fromtimestamp(2050))
+        self.assertEqual([r.record_id for r in hits], [records[0].record_id])
+        hits = db.record_search("source: smartd AND temperature_celsius")
+        self.assertEqual([r.message for r in hits], [records[2].message])
+        self.assertEqual(db.record_search("nosuchword"), [])
+
+    def test_08_query_plan(self) -> None:
+        """Test that queries by Host and period are served from the composite index."""
+        db = self.__get_db()
+        part: str = db.partition_list()[0].name
+        cases: list[tuple[database.QueryID, tuple]] = [
+            (database.QueryID.RecordGetByHost, (1, -1)),
+            (database.QueryID.RecordGetByHostPeriod, (1, 0, 5000, -1)),
+            (database.QueryID.RecordGetByHostPeriodAfter, (1, 0, 5000, 10, 1, -1)),
+            (database.QueryID.RecordGetMostRecentByHost, (1, )),
+        ]
+        for qid, args in cases:
+            plan = db.query_plan(qid, args, part)
+            self.assertTrue(any(f"{part}_host_time_idx" in step for step in plan),
+                            msg=f"{qid.name} does not use {part}_host_time_idx: {plan}")
+            self.assertFalse(any("TEMP B-TREE" in step for step in plan),
+                             msg=f"{qid.name} needs to sort its results: {plan}")
+
+        plan = db.query_plan(database.QueryID.RecordGetByPeriod, (0, 5000, -1), part)
+        self.assertTrue(any(f"{part}_time_idx" in step for step in plan),
+                        msg=f"RecordGetByPeriod does not use {part}_time_idx: {plan}")
+
+        recs = db.record_get_by_host_period(2,
+                                            datetime.fromtimestamp(150),
+                                            datetime.fromtimestamp(199))
+        self.assertEqual([int(r.timestamp.timestamp()) for r in recs], list(range(150, 200)))
+        self.assertEqual(db.record_get_most_recent_by_host(2), datetime.fromtimestamp(2200))
+        self.assertIsNone(db.record_get_most_recent_by_host(4711))
+
+    def test_09_migrate(self) -> None:
+        """Test upgrading a database created with the initial schema."""
+        path: str = os.path.join(self.folder, "migrate.db")
+        conn = sqlite3.connect(path)
+        for q in database.InitQueries:
+            conn.execute(q)
+        conn.execute("INSERT INTO host (id, name) VALUES (1, 'oldtimer')")
+        conn.execute("""INSERT INTO record (host_id, timestamp, source, message)
+                        VALUES (1, 100, 'named', 'lame server resolving example.com')""")
+        conn.commit()
+        conn.close()
+
+        db = database.Database(path)
+        self.assertEqual(db.schema_version(), database.SchemaVersion)
+        hits = db.record_search("lame")
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].source, "named")
+        self.assertEqual(hits[0].record_id >> 32, 0)
+        self.assertEqual(hits[0].repeats, 0)
+        cur = db.db.execute("SELECT type, name FROM sqlite_master")
+        objects = {(row[0], row[1]) for row in cur}
+        self.assertIn(("index", "record_19700101_host_time_idx"), objects)
+        self.assertNotIn(("table", "record"), objects)
+        self.assertNotIn(("index", "record_host_time_idx"), objects)
+
+        # Records that were there before are counted in the rollups.
+        self.assertEqual(db.rollup_top(database.RollupKey.Host,
+                                       datetime.fromtimestamp(0),
+                                       datetime.fromtimestamp(3600)),
+                         [("oldtimer", 1)])
+
+        # Opening it again must not try to migrate again.
+        database.Database(path)
+
+    def test_10_partition_expire(self) -> None:
+        """Test that records are spread over partitions and expire with them."""
+        path: str = os.path.join(self.folder, "partition.db")
+        db = database.Database(path, span=database.DAY)
+        host = db.host_get_or_add("partitioned")
+        day0: int = 1723161600  # 2024-08-09 00:00 UTC
+        records = [Record(host_id=host.host_id,
+                          timestamp=datetime.fromtimestamp(day0 + d * database.DAY + i * 60),
+                          source="cron",
+                          message=f"Day {d}, job {i}")
+                   for d in (2, 0, 1) for i in range(10)]
+        db.record_add_batch(records)
+        parts = db.partition_list()
+        self.assertEqual([p.name for p in parts],
+                         ["record_20240809", "record_20240810", "record_20240811"])
+        for r in records:
+            self.assertEqual(r.record_id >> 32, int(r.timestamp.timestamp()) // database.DAY)
+
+        # Paging across partition boundaries
+        stamps: list[int] = []
+        after = None
+        while page := list(db.record_iter_by_host(host.host_id, limit=7, after=after)):
+            stamps.extend(int(r.timestamp.timestamp()) for r in page)
+            after = database.page_key(page[-1])
+        self.assertEqual(stamps, sorted(int(r.timestamp.timestamp()) for r in records))
+
+        recs = db.record_get_by_period(datetime.fromtimestamp(day0 + database.DAY),
+                                       datetime.fromtimestamp(day0 + database.DAY + 300))
+        self.assertEqual([r.message for r in recs], [f"Day 1, job {i}" for i in range(6)])
+
+        # Another connection notices the partitions going away.
+        other = database.Database(path, span=database.DAY)
+        self.assertEqual(len(other.partition_list()), 3)
+        self.assertEqual(db.partition_expire(datetime.fromtimestamp(day0 + 2 * database.DAY)), 2)
+        self.assertEqual([p.name for p in other.partition_list()], ["record_20240811"])
+        self.assertEqual(len(other.record_get_by_host(host.host_id)), 10)
+        self.assertEqual(len(other.record_search("job")), 10)
+
+    def test_11_compact(self) -> None:
+        """Test that compact storage gives back the exact messages."""
+        messages: list[str] = [
+            "success resolving 'host42.example.com/A' after disabling qname minimization",
+            "success resolving 'host43.example.com/A' after disabling qname minimization",
+            "pms0: not in sync yet, discard input (state = 1, fe fc | 00 00)",
+            "pckbc: command timeout",
+            "battery life 0%, 17 \"quoted\" bits and 'a half",
+            "control\x1fcharacter 42",
+            "  1 leading and trailing blanks 2  ",
+            "",
+            "Ünïcödé 12µs",
+        ]
+        path: str = os.path.join(self.folder, "compact.db")
+        db = database.Database(path, compact=True)
+        host = db.host_get_or_add("compact")
+        records = [Record(host_id=host.host_id,
+                          timestamp=datetime.fromtimestamp(1723161600 + i),
+                          source="named" if i % 2 else "kernel",
+                          message=m)
+                   for i, m in enumerate(messages)]
+        db.record_add_batch(records[:-1])
+        db.record_add(records[-1])
+
+        # A fresh connection has to look up the sources and templates.
+        db = database.Database(path)
+        self.assertEqual([(r.record_id, r.source, r.message)
+                          for r in db.record_get_by_host(host.host_id)],
+                         [(r.record_id, r.source, r.message) for r in records])
+        # Two messages share a template, three have no parameters or cannot be split.
+        cur = db.db.execute("SELECT COUNT(*) FROM template")
+        self.assertEqual(cur.fetchone()[0], len(messages) - 4)
+        hits = db.record_search("qname AND host43")
+        self.assertEqual([r.message for r in hits], [messages[1]])
+
+    def test_12_record_add_rows(self) -> None:
+        """Test adding records given as rows, across partitions."""
+        path: str = os.path.join(self.folder, "rows.db")
+        db = database.Database(path, span=database.DAY)
+        host = db.host_get_or_add("rows")
+        day0: int = 1723161600
+        rows = [(host.host_id, day0 + (i % 3) * database.DAY + i, "cron", f"Row {i}")
+                for i in range(30)]
+        self.assertEqual(db.record_add_rows(rows, 7), len(rows))
+        self.assertEqual(len(db.partition_list()), 3)
+        stored = db.record_get_by_host(host.host_id)
+        self.assertEqual(sorted((int(r.timestamp.timestamp()), r.message) for r in stored),
+                         sorted((row[1], row[3]) for row in rows))
+        hits = db.record_search('"Row 17"')
+        self.assertEqual([r.message for r in hits], ["Row 17"])
+
+    def test_13_columns(self) -> None:
+        """Test adding and fetching records as RecordBatches."""
+        path: str = os.path.join(self.folder, "columns.db")
+        db = database.Database(path, span=database.DAY, compact=True)
+        host = db.host_get_or_add("columns")
+        day0: int = 1723161600
+        batch = RecordBatch.from_rows(
+            (host.host_id, day0 + i * 3600, "cron" if i % 2 else "named", f"Job {i} done")
+            for i in range(50))
+        self.assertEqual(db.record_add_columns(batch, True, 16), len(batch))
+        self.assertNotIn(0, batch.ids)
+
+        got = db.record_batch_by_host(host.host_id, limit=20)
+        self.assertEqual(list(got.ids), list(batch.ids[:20]))
+        rest = db.record_batch_by_host(host.host_id, after=database.batch_page_key(got))
+        self.assertEqual(len(got) + len(rest), len(batch))
+        got.extend(rest)
+        self.assertEqual(list(got.rows()), list(batch.rows()))
+        self.assertEqual(sorted(got.sources), ["cron", "named"])
+        self.assertEqual(list(got), db.record_get_by_host(host.host_id))
+
+        begin = datetime.fromtimestamp(day0 + database.DAY)
+        end = datetime.fromtimestamp(day0 + 2 * database.DAY)
+        got = db.record_batch_by_host_period(host.host_id, begin, end)
+        self.assertEqual([r.message for r in got], [f"Job {i} done" for i in range(24, 49)])
+        self.assertEqual(list(db.record_batch_by_period(begin, end).ids), list(got.ids))
+        self.assertEqual(list(got.since(day0 + database.DAY + 10 * 3600).ids), list(got.ids[10:]))
+
+    def test_14_pool(self) -> None:
+        """Test the bounds, read-only connections and idle eviction of DBPool."""
+        path: str = os.path.join(self.folder, "pool.db")
+        pool = database.DBPool(path, readers=2, writers=1, idle=3600, timeout=0.05)
+        with pool.writer() as db:
+            db.host_get_or_add("pooled")
+            # Only one writer, so a second checkout times out.
+            with self.assertRaises(database.PoolTimeout):
+                with pool.writer():
+                    pass
+        with pool.reader() as r1, pool.reader() as r2:
+            self.assertIsNot(r1, r2)
+            self.assertIsNotNone(r1.host_get_by_name("pooled"))
+            with self.assertRaises(sqlite3.OperationalError):
+                r2.host_add(Host(name="readonly"))
+            with self.assertRaises(database.PoolTimeout):
+                with pool.reader():
+                    pass
+        # Connections are reused, not opened anew.
+        with pool.reader() as r3:
+            self.assertIn(r3, (r1, r2))
+
+        # A transaction left open is rolled back on return.
+        with pool.writer() as db:
+            db.db.execute("BEGIN")
+            db.db.execute("INSERT INTO host (name) VALUES ('uncommitted')")
+        with pool.reader() as db:
+            self.assertIsNone(db.host_get_by_name("uncommitted"))
+
+        # ... and so is what the connection learned during it.
+        with pool.writer() as db:
+            host = db.host_get_or_add("pooled")
+            db.__enter__()  # pylint: disable-msg=C2801
+            db.record_add(Record(host_id=host.host_id,
+                                 timestamp=datetime.fromtimestamp(1723161600),
+                                 source="leaked",
+                                 message="Lost"))
+        with pool.writer() as db:
+            db.record_add(Record(host_id=host.host_id,
+                                 timestamp=datetime.fromtimestamp(1723161600),
+                                 source="leaked",
+                                 message="Kept"))
+        with pool.reader() as db:
+            self.assertEqual([(r.source, r.message) for r in db.record_get_by_host(host.host_id)],
+                             [("leaked", "Kept")])
+
+        stats = pool.stats()
+        self.assertEqual(stats["write"].timeouts, 1)
+        self.assertEqual(stats["read"].timeouts, 1)
+        self.assertEqual(stats["read"].created, 2)
+        self.assertEqual(stats["read"].peak, 2)
+        self.assertEqual(stats["read"].in_use, 0)
+        self.assertEqual(stats["read"].checkouts, 5)
+        self.assertGreaterEqual(stats["read"].checkout_max, stats["read"].checkout_avg)
+
+        self.assertEqual(pool.evict(), 0)
+        pool.readers.idle_time = 0
+        self.assertEqual(pool.evict(), 2)
+        self.assertEqual(pool.stats()["read"].open, 0)
+        pool.close()
+        with self.assertRaises(database.PoolError):
+            with pool.reader():
+                pass
+
+    def test_15_rollups(self) -> None:
+        """Test counting records per minute and hour, Host and source."""
+        path: str = os.path.join(self.folder, "rollup.db")
+        db = database.Database(path, span=database.DAY)
+        h1 = db.host_get_or_add("busy")
+        h2 = db.host_get_or_add("quiet")
+        hour0: int = 1723161600
+        # busy logs one record per 10 seconds for two hours, quiet once a minute.
+        db.record_add_batch(
+            [Record(host_id=h1.host_id,
+                    timestamp=datetime.fromtimestamp(hour0 + i * 10),
+                    source="named" if i % 3 else "cron",
+                    message=f"Message {i}") for i in range(720)], False, 100)
+        db.record_add_columns(RecordBatch.from_rows(
+            (h2.host_id, hour0 + i * 60, "sshd", f"Login {i}") for i in range(120)), False)
+        db.record_add(Record(host_id=h2.host_id,
+                             timestamp=datetime.fromtimestamp(hour0 + 2 * 3600),
+                             source="cron",
+                             message="Late"))
+
+        begin = datetime.fromtimestamp(hour0)
+        end = datetime.fromtimestamp(hour0 + 2 * 3600)
+        hist = db.rollup_histogram(begin, end)
+        self.assertEqual(len(hist), 121)
+        self.assertEqual(hist[0], (hour0, 7))
+        self.assertEqual(hist[-1], (hour0 + 2 * 3600, 1))
+        self.assertEqual(sum(cnt for _, cnt in hist), 841)
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR),
+                         [(hour0, 420), (hour0 + 3600, 420), (hour0 + 7200, 1)])
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR, host=h2.host_id),
+                         [(hour0, 60), (hour0 + 3600, 60), (hour0 + 7200, 1)])
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR, source="cron"),
+                         [(hour0, 120), (hour0 + 3600, 120), (hour0 + 7200, 1)])
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR, source="nonesuch"),
+                         [(hour0, 0), (hour0 + 3600, 0), (hour0 + 7200, 0)])
+        with self.assertRaises(ValueError):
+            db.rollup_histogram(begin, end, 300)
+
+        top = db.rollup_top(database.RollupKey.Host, begin, end)
+        self.assertEqual(top, [("busy", 720), ("quiet", 121)])
+        top = db.rollup_top(database.RollupKey.Source, begin, end, limit=2)
+        self.assertEqual(top, [("named", 480), ("cron", 241)])
+        top = db.rollup_top(database.RollupKey.Source, begin, end, host=h2.host_id)
+        self.assertEqual(top, [("sshd", 120), ("cron", 1)])
+        top = db.rollup_top(database.RollupKey.Host, begin, end, source="sshd")
+        self.assertEqual(top, [("quiet", 120)])
+
+        # The hourly counts outlive the records, the per-minute ones do not.
+        db.partition_expire(datetime.fromtimestamp(hour0 + database.DAY))
+        self.assertEqual(sum(cnt for _, cnt in db.rollup_histogram(begin, end)), 0)
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR)[0], (hour0, 420))
+        self.assertEqual(db.rollup_expire(datetime.fromtimestamp(hour0 + 3600)), 3)
+        self.assertEqual(db.rollup_histogram(begin, end, database.HOUR)[0], (hour0, 0))
+
+    def test_16_repeats(self) -> None:
+        """Test collapsing repeated records on ingest and expanding them again."""
+        path: str = os.path.join(self.folder, "repeats.db")
+        db = database.Database(path, span=database.DAY)
+        hid: int = db.host_get_or_add("noisy").host_id
+        t0: int = 1723161600
+        omny: str = "validating omny.fm/A: no valid signature found"
+        rows = [(hid, t0 + i * 300, "named", omny) for i in range(13)]
+        rows += [(hid, t0 + i * 100, "named", f"query {i % 7}") for i in range(37)]
+        rows += [(hid, t0 + 60, "unbound", omny)]
+        rows.sort(key=lambda r: r[1])
+        dedup = Deduplicator(window=600)
+        self.assertEqual(db.record_add_rows(rows, 5, dedup), len(rows))
+
+        stored = db.record_get_by_host(hid)
+        self.assertEqual([(int(r.timestamp.timestamp()) - t0, r.repeats)
+                          for r in stored if r.message == omny and r.source == "named"],
+                         [(0, 2), (900, 2), (1800, 2), (2700, 2), (3600, 0)])
+        self.assertEqual(len(stored), len(rows) - dedup.stats().collapsed)
+        self.assertEqual(sum(r.repeats for r in stored), dedup.stats().collapsed)
+
+        def key(rec: Record) -> tuple[int, str, str]:
+            return (int(rec.timestamp.timestamp()), rec.source, rec.message)
+
+        expanded = db.record_get_by_host(hid, expand=True)
+        self.assertEqual(sorted(key(r) for r in expanded), sorted(r[1:] for r in rows))
+        self.assertEqual([key(r) for r in expanded], sorted((key(r) for r in expanded),
+                                                            key=lambda k: k[0]))
+        self.assertTrue(all(r.repeats == 0 for r in expanded))
+        self.assertEqual(len(list(db.record_iter_by_host(hid, limit=10, expand=True))), 10)
+        with self.assertRaises(ValueError):
+            db.record_iter_by_host(hid, after=(t0, 0), expand=True)
+
+        # Repeats of a record from before the period show up.
+        begin = datetime.fromtimestamp(t0 + 1000)
+        end = datetime.fromtimestamp(t0 + 2000)
+        got = db.record_get_by_period(begin, end, expand=True)
+        self.assertEqual(sorted(key(r) for r in got),
+                         sorted(r[1:] for r in rows if t0 + 1000 <= r[1] <= t0 + 2000))
+        got = db.record_get_by_host_period(hid, begin, end, expand=True)
+        self.assertEqual([int(r.timestamp.timestamp()) - t0 for r in got if r.message == omny],
+                         [1200, 1500, 1800])
+
+        # The rollups count every record, collapsed or not.
+        hist = db.rollup_histogram(datetime.fromtimestamp(t0), datetime.fromtimestamp(t0 + 3600),
+                                   database.HOUR)
+        self.assertEqual(sum(cnt for _, cnt in hist), len(rows))
+
+        # A later batch still finds the record it repeats.
+        db.record_add_rows([(hid, t0 + 3700, "named", omny)], dedup=dedup)
+        last = [r for r in db.record_get_by_host(hid) if r.message == omny][-1]
+        self.assertEqual((int(last.timestamp.timestamp()) - t0, last.repeats), (3600, 1))
+
+    def test_17_lexicon(self) -> None:
+        """Test that compact storage keeps a bounded cache and no templates without parameters."""
+        path: str = os.path.join(self.folder, "lexicon.db")
+        db = database.Database(path, compact=True)
+        db.sources.maxsize = 8
+        db.templates.maxsize = 8
+        hid: int = db.host_get_or_add("lexicon").host_id
+        words: list[str] = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+        rows: list[RecordRow] = [(hid, 1723161600 + i, f"src{i % 20}",
+                                  f"{words[i % 6]} {words[i // 6 % 6]} {words[i // 36 % 6]}"
+                                  + (f" took {i}ms" if i % 2 else ""))
+                                 for i in range(216)]
+        db.record_add_rows(rows, 50)
+        self.assertLessEqual(len(db.sources.ids), 8)
+        self.assertLessEqual(len(db.templates.ids), 8)
+        self.assertEqual([(r.source, r.message) for r in db.record_get_by_host(hid)],
+                         [(r[2], r[3]) for r in rows])
+        self.assertLessEqual(len(db.templates.strings), 8)
+        cur = db.db.execute("SELECT COUNT(*) FROM template")
+        self.assertEqual(cur.fetchone()[0], 108)
+
+    def test_18_repeats_expired(self) -> None:
+        """Test that repeats of a record whose partition expired do not bring it back."""
+        path: str = os.path.join(self.folder, "repeats_expired.db")
+        db = database.Database(path, span=database.DAY)
+        hid: int = db.host_get_or_add("stale").host_id
+        t0: int = 1723161600
+        msg: str = "named: lame server resolving example.com"
+        dedup = Deduplicator(window=600)
+        db.record_add_rows([(hid, t0, "named", msg)], dedup=dedup)
+        self.assertEqual(len(db.partition_list()), 1)
+
+        # Another connection expires the partition while dedup still remembers the record.
+        self.assertEqual(database.Database(path).partition_expire(
+            datetime.fromtimestamp(t0 + 2 * database.DAY)), 1)
+        db.record_add_rows([(hid, t0 + 10, "named", msg)], dedup=dedup)
+        self.assertEqual(db.partition_list(), [])
+        self.assertEqual(dedup.stats().keys, 0)
+
+        # The next one is stored again, as any late record would be.
+        db.record_add_rows([(hid, t0 + 20, "named", msg)], dedup=dedup)
+        stored = db.record_get_by_host(hid)
+        self.assertEqual([(int(r.timestamp.timestamp()) - t0, r.repeats) for r in stored],
+                         [(20, 0)])
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:00:52 krylon>
+#
+# /data/code/python/silo/test_dedup.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_dedup
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import unittest
+
+from silo.dedup import MAX_WINDOW, Deduplicator
+
+
+class DedupTest(unittest.TestCase):
+    """Test sorting out repeated records."""
+
+    def test_01_window(self) -> None:
+        """Test that only repeats within the window are collapsed."""
+        d = Deduplicator(window=60)
+        rows = [(1, 0, "cron", "tick"), (1, 30, "cron", "tick"), (2, 30, "cron", "tick"),
+                (1, 60, "cron", "tick"), (1, 61, "cron", "tick"), (1, 62, "cron", "tock"),
+                (1, 90, "cron", "tick")]
+        fresh, entries = d.split(rows)
+        self.assertEqual(fresh, [rows[0], rows[2], rows[4], rows[5]])
+        for n, entry in enumerate(entries):
+            entry.record_id = n + 1
+        repeats = sorted((e.record_id, offsets) for _, e, offsets in d.take_repeats())
+        self.assertEqual(repeats, [(1, [30, 60]), (3, [29])])
+        self.assertEqual(d.take_repeats(), [])
+        stats = d.stats()
+        self.assertEqual((stats.records, stats.collapsed, stats.keys), (7, 3, 3))
+        with self.assertRaises(ValueError):
+            Deduplicator(window=MAX_WINDOW + 1)
+
+    def test_02_lru(self) -> None:
+        """Test that the Deduplicator forgets the records it has not seen for longest."""
+        d = Deduplicator(window=600, max_keys=3)
+        fresh, _ = d.split([(1, 0, "a", "x"), (1, 0, "b", "x"), (1, 0, "c", "x"),
+                            (1, 1, "a", "x"), (1, 2, "d", "x"), (1, 3, "b", "x"),
+                            (1, 4, "a", "x")])
+        # b was pushed out by d, a was kept because it came in again.
+        self.assertEqual([r[2] for r in fresh], ["a", "b", "c", "d", "b"])
+        stats = d.stats()
+        self.assertEqual((stats.keys, stats.evicted, stats.collapsed), (3, 2, 2))
+        d.clear()
+        self.assertEqual(len(d.split([(1, 5, "a", "x")])[0]), 1)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:30:13 krylon>
+#
+# /data/code/python/silo/test_encoding.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_encoding
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from datetime import datetime
+
+from silo import encoding, protocol
+from silo.data import Record
+from silo.database import Database
+from silo.encoding import EncodingError, NamedRow
+from silo.protocol import Codec, ProtocolError
+
+# Characters to build random strings from, including some that take more
+# than one byte in UTF-8, and a lone surrogate.
+ALPHABET: str = "abc xyz:[]/\x00\x1f\n\"'\\äöüß€µ漢字🙂\udcff"
+
+
+def random_string(rng: random.Random, maxlen: int) -> str:
+    """Return a random string of up to maxlen characters."""
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, maxlen)))
+
+
+def random_rows(rng: random.Random, cnt: int) -> list[NamedRow]:
+    """Return cnt random rows, with a few hosts and sources and timestamps all over the place."""
+    hosts = [""] + [random_string(rng, 8) or "h" for _ in range(3)]
+    sources = [random_string(rng, 12) for _ in range(5)]
+    stamp: int = rng.randint(-2**40, 2**40)
+    rows: list[NamedRow] = []
+    for _ in range(cnt):
+        match rng.randint(0, 5):
+            case 0:
+                stamp = rng.randint(-2**62, 2**62)
+            case 1:
+                stamp -= rng.randint(0, 3600)
+            case _:
+                stamp += rng.randint(0, 2)
+        rows.append((rng.choice(hosts), stamp, rng.choice(sources), random_string(rng, 200)))
+    return rows
+
+
+class EncodingTest(unittest.TestCase):
+    """Test the binary encoding of record batches."""
+
+    def test_01_varint(self) -> None:
+        """Test that integers survive the trip through varints and zigzag."""
+        values = [0, 1, 127, 128, 255, 300, 16383, 16384, 2**32, 2**63 - 1, 2**64 - 1]
+        out = bytearray()
+        encoding.write_varints(out, values)
+        self.assertEqual(encoding.read_varints(bytes(out), 0, len(values)),
+                         (values, len(out)))
+        for n in (0, 1, -1, 2, -2, 63, -64, 2**62, -2**63):
+            self.assertEqual(encoding.unzigzag(encoding.zigzag(n)), n)
+        self.assertEqual([encoding.zigzag(n) for n in (0, -1, 1, -2)], [0, 1, 2, 3])
+        with self.assertRaises(EncodingError):
+            encoding.read_varints(b"\xff" * 11, 0, 1)
+        with self.assertRaises(EncodingError):
+            encoding.read_varints(b"\x80", 0, 1)
+
+    def test_02_records(self) -> None:
+        """Test encoding Records, with and without host names."""
+        records = [Record(host_id=1 + i % 2,
+                          timestamp=datetime.fromtimestamp(1723161600 + i // 3),
+                          source="named" if i % 3 else "kernel",
+                          message=f"Bäääh {i}") for i in range(100)]
+        data = encoding.encode(records)
+        self.assertEqual(data[0], encoding.SCHEMA_VERSION)
+        self.assertEqual(encoding.decode(data, 7),
+                         [(7, int(r.timestamp.timestamp()), r.source, r.message)
+                          for r in records])
+
+        data = encoding.encode(records, {1: "", 2: "wintermute"})
+        with self.assertRaises(EncodingError):
+            encoding.decode(data, 7)
+        looked_up: list[str] = []
+
+        def resolve(name: str) -> int:
+            looked_up.append(name)
+            return 42
+
+        rows = encoding.decode(data, 7, resolve)
+        self.assertEqual(looked_up, ["wintermute"])
+        self.assertEqual([r[0] for r in rows], [7 if i % 2 == 0 else 42 for i in range(100)])
+        self.assertEqual(encoding.decode(encoding.encode([])), [])
+
+    def test_03_fuzz_roundtrip(self) -> None:
+        """Test that random batches come back as they went in."""
+        rng = random.Random(19)
+        for _ in range(200):
+            rows = random_rows(rng, rng.randint(0, 50))
+            ids: dict[str, int] = {}
+            decoded = encoding.decode(encoding.encode_rows(rows),
+                                      1,
+                                      lambda name, ids=ids: ids.setdefault(name, len(ids) + 2))
+            self.assertEqual(len(decoded), len(rows))
+            for (host, stamp, source, message), row in zip(rows, decoded):
+                # Lone surrogates cannot be stored, the encoder replaces them.
+                self.assertEqual(row, (ids[host.replace("\udcff", "?")] if host else 1,
+                                       stamp,
+                                       source.replace("\udcff", "?"),
+                                       message.replace("\udcff", "?")))
+
+    def test_04_fuzz_broken(self) -> None:
+        """Test that truncated or garbled batches raise EncodingError and nothing else."""
+        rng = random.Random(23)
+        for _ in range(50):
+            data = encoding.encode_rows(random_rows(rng, rng.randint(1, 20)))
+            for end in range(len(data)):
+                with self.assertRaises(EncodingError):
+                    encoding.decode(data[:end], 1, lambda name: 2)
+            with self.assertRaises(EncodingError):
+                encoding.decode(data + b"\x00", 1, lambda name: 2)
+            for _ in range(50):
+                garbled = bytearray(data)
+                for _ in range(rng.randint(1, 4)):
+                    garbled[rng.randrange(len(garbled))] = rng.randrange(256)
+                try:
+                    encoding.decode(bytes(garbled), 1, lambda name: 2)
+                except EncodingError:
+                    pass
+        with self.assertRaises(EncodingError):
+            encoding.decode(bytes((encoding.SCHEMA_VERSION + 1,)) + data[1:])
+
+    def test_05_fuzz_unstorable(self) -> None:
+        """Test that Packed frames carrying what the database cannot store are rejected."""
+        rng = random.Random(29)
+        with tempfile.TemporaryDirectory(prefix="silo_test_encoding_") as folder:
+            db = Database(os.path.join(folder, "unstorable.db"))
+            hid: int = db.host_get_or_add("fuzzy").host_id
+            stored: int = 0
+            for n in range(100):
+                rows = [("", stamp, source, message)
+                        for _, stamp, source, message in random_rows(rng, rng.randint(1, 10))]
+                if n % 10 == 0:
+                    rows.append(("", 2**63 + n, "clock", "from the future"))
+                # This is what a client that does not use our encoder might send.
+                blob: bytes = encoding.encode_rows(rows, "surrogatepass")
+                payload: bytes = protocol.packed_head.pack(n, Codec.Zlib) + zlib.compress(blob)
+                if n % 10 == 0 or any("\udcff" in f"{r[2]}{r[3]}" for r in rows):
+                    with self.assertRaises(ProtocolError):
+                        protocol.decode_packed(payload, hid)
+                    continue
+                _, decoded = protocol.decode_packed(payload, hid)
+                stored += db.record_add_rows(decoded)
+            self.assertGreater(stored, 0)
+            self.assertEqual(len(db.record_get_by_host(hid)), stored)
+            db.close()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:31:15 krylon>
+#
+# /data/code/python/silo/test_ingest.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_ingest
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import queue
+import unittest
+from datetime import datetime
+from threading import Thread
+
+from krylib import isdir
+
+from silo import common
+from silo.alert import Rule, RuleEngine
+from silo.data import Host, Record, RecordRow
+from silo.database import Database, DBPool
+from silo.dedup import Deduplicator
+from silo.ingest import IngestQueue, ShutdownError
+from silo.tail import TailFilter, TailHub
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class IngestTest(unittest.TestCase):
+    """Test the write-behind ingest queue."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_ingest_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_flush_on_stop(self) -> None:
+        """Test that everything queued by several producers ends up in the database."""
+        path: str = os.path.join(self.folder, "ingest01.db")
+        db = Database(path)
+        host = Host(name="producer")
+        db.host_add(host)
+
+        def produce(n: int) -> None:
+            iq.put_many(Record(host_id=host.host_id,
+                               timestamp=datetime.fromtimestamp(1000 + i),
+                               source=f"prod{n}",
+                               message=f"Message {i}")
+                        for i in range(500))
+
+        iq = IngestQueue(path, maxsize=64, batch_size=50)
+        iq.start()
+        producers = [Thread(target=produce, args=(n, )) for n in range(4)]
+        for p in producers:
+            p.start()
+        for p in producers:
+            p.join()
+        iq.stop()
+
+        stats = iq.stats()
+        self.assertEqual(stats.received, 2000)
+        self.assertEqual(stats.written, 2000)
+        self.assertEqual(stats.errors, 0)
+        self.assertGreater(stats.commits, 0)
+        self.assertLessEqual(stats.max_depth, 64)
+        self.assertEqual(len(db.record_get_by_host(host.host_id)), 2000)
+
+        with self.assertRaises(ShutdownError):
+            iq.put(Record(timestamp=datetime.now(), source="late", message="Too late"))
+
+    def test_02_backpressure(self) -> None:
+        """Test that producers are held up when the queue is full."""
+        path: str = os.path.join(self.folder, "ingest02.db")
+        db = Database(path)
+        host = Host(name="slowpoke")
+        db.host_add(host)
+        iq = IngestQueue(path, maxsize=2)
+        for i in range(3):
+            rec = Record(host_id=host.host_id,
+                         timestamp=datetime.fromtimestamp(i),
+                         source="test",
+                         message=f"Message {i}")
+            if i < 2:
+                iq.put(rec)
+            else:
+                with self.assertRaises(queue.Full):
+                    iq.put(rec, timeout=0.05)
+        self.assertEqual(iq.stats().depth, 2)
+        iq.stop()
+        stats = iq.stats()
+        self.assertEqual(stats.depth, 0)
+        self.assertEqual(stats.written, 2)
+
+    def test_03_alerts(self) -> None:
+        """Test that records are checked for Alerts on their way to the database."""
+        path: str = os.path.join(self.folder, "ingest03.db")
+        db = Database(path)
+        host = db.host_get_or_add("alarming")
+        engine = RuleEngine([Rule(name="oom", substring="Out of memory", threshold=2)])
+        with IngestQueue(path, alerts=engine) as iq:
+            iq.put_rows((host.host_id, 100 + i, "kernel",
+                         "Out of memory: Killed process 42" if i % 5 == 0 else "All is well")
+                        for i in range(20))
+        self.assertEqual(iq.stats().written, 20)
+        self.assertEqual(engine.stats().rules["oom"].matches, 4)
+        self.assertEqual([a.timestamp for a in engine.alerts()], [105, 115])
+
+    def test_04_dedup(self) -> None:
+        """Test that repeated records are collapsed, but still counted as written."""
+        path: str = os.path.join(self.folder, "ingest04.db")
+        db = Database(path)
+        host = db.host_get_or_add("chatty")
+        dedup = Deduplicator(window=60)
+        with IngestQueue(path, dedup=dedup) as iq:
+            iq.put_rows((host.host_id, 100 + i, "named", f"lame server {i % 2}")
+                        for i in range(100))
+        self.assertEqual(iq.stats().written, 100)
+        stored = db.record_get_by_host(host.host_id)
+        self.assertEqual(len(stored), 4)
+        self.assertEqual(sum(r.repeats for r in stored), 96)
+        self.assertEqual(len(db.record_get_by_host(host.host_id, expand=True)), 100)
+
+    def test_05_bad_record(self) -> None:
+        """Test that a record the database refuses does not take its batch with it."""
+        path: str = os.path.join(self.folder, "ingest05.db")
+        db = Database(path)
+        host = db.host_get_or_add("careless")
+        engine = RuleEngine([Rule(name="any", substring="Message")])
+        hub = TailHub()
+        hub.start()
+        sub = hub.subscribe(TailFilter())
+        bad: RecordRow = (host.host_id, 10**30, "test", "Message from the future")
+        rows: list[RecordRow] = [(host.host_id, 100 + i, "test", f"Message {i}")
+                                 for i in range(20)]
+        with IngestQueue(path, alerts=engine, tail=hub) as iq:
+            iq.put_rows(rows[:13] + [bad] + rows[13:])
+        hub.stop()
+        stats = iq.stats()
+        self.assertEqual(stats.written, 20)
+        self.assertEqual(stats.dead, 1)
+        self.assertGreater(stats.errors, 0)
+        self.assertEqual(list(iq.dead_letters), [bad])
+        self.assertEqual(len(db.record_get_by_host(host.host_id)), 20)
+        self.assertEqual(engine.stats().rules["any"].matches, 20)
+        self.assertEqual(sub.get(0)[0], rows)
+
+    def test_06_stop_race(self) -> None:
+        """Test that every batch is either written or refused while stop() is running."""
+        path: str = os.path.join(self.folder, "ingest06.db")
+        db = Database(path)
+        host = db.host_get_or_add("racy")
+        iq = IngestQueue(path, maxsize=4, batch_size=10)
+        iq.start()
+        accepted: list[int] = []
+
+        def produce(n: int) -> None:
+            for i in range(200):
+                try:
+                    iq.put_rows([(host.host_id, i, f"prod{n}", f"Message {i}")] * 5)
+                except ShutdownError:
+                    return
+                accepted.append(5)
+
+        producers = [Thread(target=produce, args=(n, )) for n in range(4)]
+        for p in producers:
+            p.start()
+        iq.stop()
+        for p in producers:
+            p.join()
+        self.assertEqual(iq.stats().written, sum(accepted))
+        self.assertEqual(len(db.record_get_by_host(host.host_id)), sum(accepted))
+
+    def test_07_no_database(self) -> None:
+        """Test that a writer that cannot open the database is reported, not waited for."""
+        iq = IngestQueue(os.path.join(self.folder, "missing", "folder", "ingest07.db"),
+                         maxsize=1)
+        with self.assertRaises(ShutdownError):
+            iq.start()
+        with self.assertRaises(ShutdownError):
+            iq.put_rows([(1, 0, "test", "Nowhere to go")])
+        iq.stop()
+
+    def test_08_pool(self) -> None:
+        """Test that the writer uses the DBPool's read-write connection."""
+        pool = DBPool(os.path.join(self.folder, "ingest08.db"))
+        with pool.writer() as db:
+            host = Host(name="pooled")
+            db.host_add(host)
+        with IngestQueue(pool=pool, maxsize=4, batch_size=10) as iq:
+            for i in range(10):
+                iq.put_rows([(host.host_id, 1000 + i, "test", f"Message {i}")] * 10)
+        stats = pool.stats()["write"]
+        self.assertEqual(stats.created, 1)
+        self.assertGreater(stats.checkouts, 2)
+        self.assertEqual(stats.in_use, 0)
+        with pool.reader() as db:
+            self.assertEqual(len(db.record_get_by_host(host.host_id)), 100)
+        pool.close()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:14:03 krylon>
+#
+# /data/code/python/silo/test_registry.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_registry
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import time
+import unittest
+from datetime import datetime
+from threading import Thread
+
+from krylib import isdir
+
+from silo import common
+from silo.database import Database, DBPool
+from silo.registry import HostRegistry
+
+TEST_ROOT: str = "/tmp"
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class RegistryTest(unittest.TestCase):
+    """Test the Host cache."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_registry_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_concurrent_first_sight(self) -> None:
+        """Test that many threads seeing a new Host at once get the same one."""
+        path: str = os.path.join(self.folder, "registry01.db")
+        reg = HostRegistry(DBPool(path), interval=3600)
+        ids: list[int] = []
+
+        def lookup() -> None:
+            for n in range(10):
+                ids.append(reg.get(f"host{n:02d}").host_id)
+
+        workers = [Thread(target=lookup) for _ in range(8)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        stats = reg.stats()
+        self.assertEqual(stats.hosts, 10)
+        self.assertEqual(stats.misses, 10)
+        self.assertEqual(stats.hits, 70)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(len(Database(path).host_get_all()), 10)
+
+    def test_02_coalesce_contacts(self) -> None:
+        """Test that contact timestamps are only written on flush."""
+        path: str = os.path.join(self.folder, "registry02.db")
+        reg = HostRegistry(DBPool(path), interval=3600)
+        host = reg.get("chatty")
+        for sec in range(100):
+            reg.touch(host, datetime.fromtimestamp(1723161600 + sec))
+        self.assertEqual(reg.stats().pending, 1)
+
+        db = Database(path)
+        stored = db.host_get_by_name("chatty")
+        assert stored is not None
+        self.assertEqual(stored.last_contact, datetime.fromtimestamp(0))
+
+        reg.flush()
+        stored = db.host_get_by_name("chatty")
+        assert stored is not None
+        self.assertEqual(stored.last_contact, datetime.fromtimestamp(1723161699))
+        stats = reg.stats()
+        self.assertEqual(stats.pending, 0)
+        self.assertEqual(stats.flushes, 1)
+        self.assertIs(reg.get_by_id(host.host_id), host)
+
+    def test_03_lookup_while_busy(self) -> None:
+        """Test that looking up a known Host does not wait for a miss that waits for the writer."""
+        path: str = os.path.join(self.folder, "registry03.db")
+        pool = DBPool(path, writers=1, timeout=30)
+        reg = HostRegistry(pool, interval=3600)
+        known = reg.get("known")
+        added: list[int] = []
+        with pool.writer():
+            worker = Thread(target=lambda: added.append(reg.get("newcomer").host_id))
+            worker.start()
+            time.sleep(0.2)
+            self.assertTrue(worker.is_alive())
+            t0 = time.perf_counter()
+            self.assertIs(reg.get("known"), known)
+            self.assertIs(reg.find("known"), known)
+            self.assertIs(reg.get_by_id(known.host_id), known)
+            self.assertLess(time.perf_counter() - t0, 0.1)
+        worker.join()
+        self.assertEqual(len(added), 1)
+        self.assertIs(reg.find("newcomer"), reg.get_by_id(added[0]))
+        self.assertIsNone(reg.find("stranger"))
+        stats = reg.stats()
+        self.assertEqual(stats.hosts, 2)
+        self.assertEqual(stats.misses, 3)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 20:26:16 krylon>
+#
+# /data/code/python/silo/test_server.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_server
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import asyncio
+import io
+import os
+import socket
+import unittest
+import zlib
+from datetime import datetime
+from threading import Thread
+
+from krylib import isdir
+
+from silo import common, encoding, protocol, server
+from silo.client import Client, TailClient
+from silo.data import Record
+from silo.database import Database
+from silo.protocol import Codec, FrameType, ProtocolError
+from silo.server import AsyncServer, Server
+
+TEST_ROOT: str = "/tmp"
+
+header_size: int = protocol.header.size
+
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class ProtocolTest(unittest.TestCase):
+    """Test encoding and decoding frames."""
+
+    def test_batch_roundtrip(self) -> None:
+        """Test that a Batch survives the trip through the encoder and decoder."""
+        records = [Record(timestamp=datetime.fromtimestamp(1723161600 + i),
+                          source="named",
+                          message=f"Bäääh {i}") for i in range(10)]
+        fr = protocol.read_frame(io.BytesIO(protocol.encode_batch(42, records)))
+        self.assertIsNotNone(fr)
+        assert fr is not None
+        self.assertEqual(fr[0], FrameType.Batch)
+        seq, rows = protocol.decode_batch(fr[1])
+        self.assertEqual(seq, 42)
+        decoded = protocol.wire_to_records(rows, 7)
+        self.assertEqual(len(decoded), len(records))
+        for a, b in zip(records, decoded):
+            self.assertEqual(a.timestamp, b.timestamp)
+            self.assertEqual(a.message, b.message)
+            self.assertEqual(b.host_id, 7)
+
+    def test_packed_roundtrip(self) -> None:
+        """Test that compressed records survive the trip, and broken ones are rejected."""
+        records = [Record(timestamp=datetime.fromtimestamp(1723161600 + i),
+                          source="named",
+                          message=f"Bäääh {i}") for i in range(100)]
+        for codec in Codec:
+            blob = protocol.pack_records(records, codec)
+            fr = protocol.read_frame(io.BytesIO(protocol.encode_packed(23, codec, blob)))
+            assert fr is not None
+            self.assertEqual(fr[0], FrameType.Packed)
+            seq, rows = protocol.decode_packed(fr[1], 1)
+            self.assertEqual(seq, 23)
+            self.assertEqual(rows,
+                             [(1, int(r.timestamp.timestamp()), r.source, r.message)
+                              for r in records])
+            with self.assertRaises(ProtocolError):
+                protocol.decode_packed(protocol.packed_head.pack(1, codec) + blob[:-4])
+        with self.assertRaises(ProtocolError):
+            protocol.decode_packed(protocol.packed_head.pack(1, 99) + blob)
+
+    def test_malformed_batch(self) -> None:
+        """Test that records the database could not store are rejected."""
+        for payload in (b'{"seq": 1, "records": [[100, "sshd", "\\udcff"]]}',
+                        b'{"seq": 1, "records": [[100, "\\ud800", "x"]]}',
+                        b'{"seq": 1, "records": [[1000000000000000000000000000000, "a", "b"]]}',
+                        b'{"seq": 1, "records": [[-1e400, "a", "b"]]}',
+                        b'{"seq": 1, "records": [[100, 1, "b"]]}'):
+            with self.subTest(payload=payload):
+                _, rows = protocol.decode_batch(payload)
+                with self.assertRaises(ProtocolError):
+                    protocol.wire_to_rows(rows, 1)
+        _, rows = protocol.decode_batch(b'{"seq": 1, "records": [[100, "a", "\\ud83d\\ude00"]]}')
+        self.assertEqual(protocol.wire_to_rows(rows, 1), [(1, 100, "a", "\U0001f600")])
+
+    def test_tail_roundtrip(self) -> None:
+        """Test that Subscribe and Tail frames survive the trip."""
+        fr = protocol.read_frame(io.BytesIO(protocol.encode_subscribe("", "sshd", "root", 10)))
+        assert fr is not None
+        self.assertEqual(fr[0], FrameType.Subscribe)
+        self.assertEqual(protocol.decode_subscribe(fr[1]), ("", "sshd", "root", 10))
+        with self.assertRaises(ProtocolError):
+            protocol.decode_subscribe(b'{"host": 1}')
+        rows = [("alpha", 100, "sshd", "Bäääh"), ("beta", 100, "cron", ""),
+                ("alpha", 99, "sshd", "x")]
+        fr = protocol.read_frame(io.BytesIO(protocol.encode_tail(3, rows)))
+        assert fr is not None
+        self.assertEqual(fr[0], FrameType.Tail)
+        self.assertEqual(protocol.decode_tail(fr[1]), (3, rows))
+        self.assertEqual(protocol.decode_tail(protocol.encode_tail(0, [])[header_size:]),
+                         (0, []))
+
+    def test_host_names(self) -> None:
+        """Test that host names are checked before we add them to the database."""
+        self.assertEqual(protocol.check_host_name(" wintermute.example.com\n"),
+                         "wintermute.example.com")
+        for name in ("", "  ", "a" * 254, "bad\x00name", "two\nlines"):
+            with self.subTest(name=name):
+                with self.assertRaises(ProtocolError):
+                    protocol.check_host_name(name)
+        with self.assertRaises(ProtocolError):
+            protocol.decode_hello(b"\xffhost")
+
+    def test_truncated(self) -> None:
+        """Test that truncated frames are reported."""
+        raw = protocol.encode_ack(1, 100)
+        with self.assertRaises(ProtocolError):
+            protocol.read_frame(io.BytesIO(raw[:-2]))
+        self.assertIsNone(protocol.read_frame(io.BytesIO(b"")))
+
+
+class ServerTest(unittest.TestCase):
+    """Test talking to the server over the loopback interface."""
+
+    folder: str
+    srv: Server
+    worker: Thread
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_server_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+        cls.srv = Server(("127.0.0.1", 0), os.path.join(cls.folder, "server.db"))
+        cls.worker = Thread(target=cls.srv.serve_forever, daemon=True)
+        cls.worker.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        cls.srv.shutdown()
+        cls.srv.server_close()
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_send(self) -> None:
+        """Test sending several pipelined batches."""
+        port: int = self.srv.server_address[1]
+        with Client("127.0.0.1", port, "agent01", window=4) as c:
+            for b in range(10):
+                c.send([Record(timestamp=datetime.fromtimestamp(1000 * b + i),
+                               source="kernel",
+                               message=f"Batch {b}, record {i}") for i in range(100)])
+        self.assertEqual(c.acked, 1000)
+
+        self.srv.ingest.stop()
+        db = Database(os.path.join(self.folder, "server.db"))
+        host = db.host_get_by_name("agent01")
+        self.assertIsNotNone(host)
+        assert host is not None
+        self.assertEqual(len(db.record_get_by_host(host.host_id)), 1000)
+
+    def test_02_no_hello(self) -> None:
+        """Test that the server rejects agents that do not introduce themselves."""
+        port: int = self.srv.server_address[1]
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+            sock.sendall(protocol.encode_batch(1, []))
+            fr = protocol.read_frame(sock.makefile("rb"))
+        self.assertIsNotNone(fr)
+        assert fr is not None
+        self.assertEqual(fr[0], FrameType.Error)
+
+    def test_03_tail(self) -> None:
+        """Test a viewer subscribing to one Host's records."""
+        port: int = self.srv.server_address[1]
+        host = self.srv.hosts.find("agent01")
+        assert host is not None
+        with TailClient("127.0.0.1", port, host="agent01", backlog=1) as viewer:
+            batches = viewer.batches()
+            # The last record of test_01.
+            self.assertEqual(next(batches), [("agent01", 9099, "kernel", "Batch 9, record 99")])
+            self.srv.tail.publish([(host.host_id + 1, 1, "cron", "other"),
+                                   (host.host_id, 2, "cron", "mine")])
+            self.assertEqual(next(batches), [("agent01", 2, "cron", "mine")])
+
+    def test_04_refused(self) -> None:
+        """Test that agents get an Error frame for bad host names and after shutdown."""
+        port: int = self.srv.server_address[1]
+        records = [Record(host_id=1,
+                          timestamp=datetime.fromtimestamp(1000 + i),
+                          source="relay",
+                          message=f"Relayed {i}") for i in range(10)]
+        blob: bytes = zlib.compress(encoding.encode(records, {1: "bad\nname"}))
+        with self.assertRaisesRegex(ProtocolError, "control characters"):
+            with Client("127.0.0.1", port, "relay01") as c:
+                c.send_packed(Codec.Zlib, blob, len(records))
+        # test_01 stopped the IngestQueue.
+        with self.assertRaisesRegex(ProtocolError, server.SHUTDOWN_MESSAGE):
+            with Client("127.0.0.1", port, "latecomer") as c:
+                c.send(records)
+        self.assertIsNone(self.srv.hosts.find("bad\nname"))
+
+
+class AsyncServerTest(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio flavor of the server."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:  # noqa: D102
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("silo_test_async_server_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:  # noqa: D102
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    async def test_send(self) -> None:
+        """Test several agents sending at the same time, with some idle connections on the side."""
+        path: str = os.path.join(self.folder, "async.db")
+        srv = AsyncServer(("127.0.0.1", 0), path)
+        await srv.start()
+        loop = asyncio.get_running_loop()
+
+        def send(name: str) -> int:
+            with Client("127.0.0.1", srv.port, name, window=4) as c:
+                for b in range(5):
+                    c.send([Record(timestamp=datetime.fromtimestamp(1000 * b + i),
+                                   source="kernel",
+                                   message=f"Batch {b}, record {i}") for i in range(100)])
+            return c.acked
+
+        idle = [socket.create_connection(("127.0.0.1", srv.port)) for _ in range(20)]
+        for n, sock in enumerate(idle):
+            sock.sendall(protocol.encode_hello(f"idle{n:02d}"))
+        acked = await asyncio.gather(*[loop.run_in_executor(None, send, f"agent{n:02d}")
+                                       for n in range(3)])
+        self.assertEqual(acked, [500, 500, 500])
+        self.assertGreaterEqual(srv.stats.peak, 20)
+        self.assertEqual(srv.stats.records, 1500)
+        for sock in idle:
+            sock.close()
+        await srv.close()
+
+        db = Database(path)
+        for n in range(3):
+            host = db.host_get_by_name(f"agent{n:02d}")
+            assert host is not None
+            self.assertEqual(len(db.record_get_by_host(host.host_id)), 500)
+
+    async def test_tail(self) -> None:
+        """Test viewers following the records as they come in."""
+        path: str = os.path.join(self.folder, "tail.db")
+        srv = AsyncServer(("127.0.0.1", 0), path)
+        await srv.start()
+        loop = asyncio.get_running_loop()
+
+        def send(name: str, start: int) -> None:
+            with Client("127.0.0.1", srv.port, name) as c:
+                c.send([Record(timestamp=datetime.fromtimestamp(start + i),
+                               source="kernel" if i % 2 else "sshd",
+                               message=f"Record {start + i}") for i in range(100)])
+
+        def follow(viewer: TailClient, cnt: int) -> list:
+            got: list = []
+            for rows in viewer.batches():
+                got.extend(rows)
+                if len(got) >= cnt:
+                    break
+            return got
+
+        await loop.run_in_executor(None, send, "agent01", 0)
+        with TailClient("127.0.0.1", srv.port, host="agent01", source="sshd",
+                        backlog=3) as viewer, \
+                TailClient("127.0.0.1", srv.port, substring="Record 1") as every:
+            backlog = await loop.run_in_executor(None, follow, viewer, 3)
+            self.assertEqual([r[3] for r in backlog], ["Record 94", "Record 96", "Record 98"])
+            await asyncio.sleep(0.2)
+            await loop.run_in_executor(None, send, "agent02", 1000)
+            await loop.run_in_executor(None, send, "agent01", 100)
+            got = await loop.run_in_executor(None, follow, viewer, 50)
+            self.assertEqual(got, [("agent01", 100 + i, "sshd", f"Record {100 + i}")
+                                   for i in range(0, 100, 2)])
+            got = await loop.run_in_executor(None, follow, every, 200)
+            self.assertEqual(sorted(r[0] for r in got), ["agent01"] * 100 + ["agent02"] * 100)
+            self.assertEqual(viewer.dropped, 0)
+
+        with TailClient("127.0.0.1", srv.port, host="nobody") as nobody:
+            with self.assertRaises(ProtocolError):
+                await loop.run_in_executor(None, follow, nobody, 1)
+        await srv.close()
+
+    async def test_refused(self) -> None:
+        """Test that agents get an Error frame when the IngestQueue is gone."""
+        path: str = os.path.join(self.folder, "refused.db")
+        srv = AsyncServer(("127.0.0.1", 0), path)
+        await srv.start()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, srv.ingest.stop)
+
+        def send() -> None:
+            with Client("127.0.0.1", srv.port, "latecomer") as c:
+                c.send([Record(timestamp=datetime.fromtimestamp(1000),
+                               source="kernel",
+                               message="Too late")])
+
+        with self.assertRaisesRegex(ProtocolError, server.SHUTDOWN_MESSAGE):
+            await loop.run_in_executor(None, send)
+        await srv.close()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 19:56:13 krylon>
+#
+# /data/code/python/silo/test_tail.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Vox audiobook reader. It is distributed under the
+# terms of the GNU General Public License 3. See the file LICENSE for details
+# or find a copy online at https://www.gnu.org/licenses/gpl-3.0
+
+"""
+silo.test_tail
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import time
+import unittest
+
+from silo.data import RecordRow
+from silo.tail import TailFilter, TailHub
+
+
+def rows(cnt: int, start: int = 0) -> list[RecordRow]:
+    """Make some records from two Hosts and sources."""
+    return [(1 + i % 2, i, "kernel" if i % 3 else "sshd", f"message {i}")
+            for i in range(start, start + cnt)]
+
+
+class TailTest(unittest.TestCase):
+    """Test fanning out records to Subscriptions."""
+
+    def test_01_filter(self) -> None:
+        """Test selecting records."""
+        row: RecordRow = (2, 100, "sshd", "Accepted publickey for root")
+        self.assertTrue(TailFilter().matches(row))
+        self.assertTrue(TailFilter(host=2, source="sshd", substring="root").matches(row))
+        self.assertFalse(TailFilter(host=1).matches(row))
+        self.assertFalse(TailFilter(source="kernel").matches(row))
+        self.assertFalse(TailFilter(substring="Root").matches(row))
+
+    def test_02_fanout(self) -> None:
+        """Test that each Subscription gets the matching records, in order."""
+        hub = TailHub(ring_size=1000)
+        hub.start()
+        hub.publish(rows(10))
+        every = hub.subscribe(TailFilter())
+        sshd = hub.subscribe(TailFilter(source="sshd"), backlog=2)
+        self.assertEqual([r[1] for r in sshd.get(1)[0]], [6, 9])
+        data = rows(90, 10)
+        for i in range(0, 90, 7):
+            hub.publish(data[i:i + 7])
+        got: list[RecordRow] = []
+        while len(got) < 90:
+            batch, dropped = every.get(1)
+            self.assertTrue(batch)
+            self.assertEqual(dropped, 0)
+            got.extend(batch)
+        self.assertEqual(got, data)
+        got = []
+        while len(got) < 30:
+            got.extend(sshd.get(1)[0])
+        self.assertEqual(got, [r for r in data if r[2] == "sshd"])
+        every.close()
+        hub.publish(rows(5, 100))
+        self.assertEqual(every.get(0), ([], 0))
+        hub.stop()
+        self.assertEqual(sshd.get(0), ([(1, 102, "sshd", "message 102")], 0))
+        self.assertTrue(sshd.closed)
+        stats = hub.stats()
+        self.assertEqual(stats.subscribers, 0)
+        self.assertEqual(stats.published, 105)
+        self.assertEqual(stats.delivered, 90 + 2 + 31)
+
+    def test_03_slow(self) -> None:
+        """Test that a viewer that never looks does not hold up publishing."""
+        hub = TailHub(ring_size=100)
+        hub.start()
+        slow = hub.subscribe(TailFilter(), maxsize=50)
+        t0 = time.perf_counter()
+        for i in range(0, 10000, 10):
+            hub.publish(rows(10, i))
+        hub.stop()
+        self.assertLess(time.perf_counter() - t0, 5)
+        batch, dropped = slow.get(0)
+        # The newest records survive.
+        self.assertEqual(batch[-1][1], 9999)
+        self.assertEqual(len(batch), 50)
+        stats = hub.stats()
+        self.assertEqual(dropped + len(batch) + stats.lost, 10000)
+        self.assertEqual(stats.dropped, dropped)
+
+    def test_04_wakeup(self) -> None:
+        """Test being woken up instead of waiting."""
+        hub = TailHub()
+        hub.start()
+        calls: list[int] = []
+        sub = hub.subscribe(TailFilter(host=1), wakeup=lambda: calls.append(1))
+        hub.publish(rows(4))
+        deadline = time.monotonic() + 5
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([r[1] for r in sub.take()[0]], [0, 2])
+        hub.stop()
+        self.assertEqual(len(calls), 2)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #